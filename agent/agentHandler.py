@@ -5,11 +5,12 @@ from typing import Annotated
 from typing_extensions import TypedDict
 
 # Dependencies for Graph Tools
-from langgraph.graph import StateGraph, START
-from langgraph.prebuilt import ToolNode, tools_condition
+from langgraph.graph import StateGraph, START, END
+from langgraph.prebuilt import tools_condition
+from agent.parallel_tools import ParallelToolNode
 
 # Dependencies for LLM Chat
-from langchain_anthropic import ChatAnthropic
+from agent.prompt_cache import CachingChatAnthropic
 from langgraph.graph.message import add_messages
 from langchain_core.messages import BaseMessage
 
@@ -19,25 +20,49 @@ from IPython.display import Image, display
 import io
 
 # Dependencies for Memory Management
-from langgraph.checkpoint.sqlite import SqliteSaver
+from agent.checkpointer import ThreadedSqliteSaver
+from agent.context import ContextManager, message_text
+from agent.tool_router import ToolRouter
+from agent.model_router import ModelRouter, estimate_cost, should_fall_back
+
+# Dependencies for the async API
+from agent.scheduler import TurnScheduler
+
+# Dependencies for Logging and Metrics
+import asyncio
+import logging
+from time import perf_counter
+from agent.metrics import REGISTRY, TOKEN_BUCKETS
+from langgraph.utils import RunnableCallable
 
 # Dependencies for Messages Management (Human Node Depedend on this)
-from langchain_core.messages import AIMessage, ToolMessage
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage, ToolMessage, message_chunk_to_message
+from langchain_core.runnables import RunnableConfig
 
 #Dependencies for Text To Spech
-import subprocess
+from agent.speech_stream import SpeechStream
+from agent.tts import SpeechWorker, ProcessBackend, Pyttsx3Backend, NaoBackend
+from agent.registry import LazyResource
 
 # /////////////////// PROJECT-SPECIFIC DEPENDENCIES ///////////////////////////////
 from dotenv import load_dotenv
 import os
 
+logger = logging.getLogger(__name__)
+
 # Define la clase AgentHandler que maneja la lógica principal del agente conversacional
 class AgentHandler:
     # Define una clase anidada State para tipar el estado del agente
     class State(TypedDict):
         messages: Annotated[list, add_messages]
+        # Resumen de los turnos antiguos que ya no están en messages
+        summary: str
 
-    def __init__(self, api_key, tools, model_name, thread_id, memory=True, lang="en"):
+    def __init__(self, api_key, tools, model_name, thread_id, memory=True, lang="en", max_concurrency=8,
+                 tool_concurrency=4, tool_timeout=30, tool_timeouts=None, metrics=None,
+                 keep_turns=6, max_context_tokens=8000, system_prompt=None, prompt_cache=True, response_cache=None,
+                 checkpoint_path=None, checkpoint_keep=20, tool_groups=None, fast_model_name=None, fast_timeout=10,
+                 capable_timeout=30, llm=None, tts_backend=None):
         """
         Inicializa el AgentHandler con los parámetros necesarios.
         
@@ -47,14 +72,68 @@ class AgentHandler:
         :param thread_id: ID único para el hilo de conversación
         :param memory: Si es True, se habilita la memoria persistente
         :param lang: Idioma para la síntesis de voz
+        :param max_concurrency: Máximo de turnos ejecutándose a la vez, de la API async y de voz (un turno por hilo)
+        :param tool_concurrency: Máximo de herramientas ejecutándose a la vez en un mismo paso
+        :param tool_timeout: Segundos que se espera a cada herramienta antes de responder con un error
+        :param tool_timeouts: Timeouts particulares por nombre de herramienta
+        :param metrics: MetricsRegistry para los tiempos y tokens, por defecto el registro global
+        :param keep_turns: Turnos recientes que se mandan textuales al modelo, los anteriores se resumen
+        :param max_context_tokens: Presupuesto de tokens de la historia que se manda al modelo
+        :param system_prompt: Instrucciones / personalidad que se mandan como mensaje de sistema
+        :param prompt_cache: Si es True, se cachean en Anthropic las herramientas, el sistema y la historia previa
+        :param response_cache: ResponseCache opcional para contestar al instante preguntas repetidas
+        :param checkpoint_path: Archivo SQLite de la memoria, por defecto CHECKPOINT_DB o "checkpoints.sqlite"
+        :param checkpoint_keep: Checkpoints que se conservan por hilo de conversación
+        :param tool_groups: Grupos de herramientas con palabras clave (ver ToolRouter); si se pasan, en cada
+                            turno solo se enlazan al modelo las herramientas relevantes
+        :param fast_model_name: Modelo rápido para la charla simple; model_name queda para los pedidos con
+                                herramientas o de varios pasos, y cada uno es el respaldo del otro
+        :param fast_timeout: Segundos que se espera al modelo rápido antes de pasar al capaz
+        :param capable_timeout: Segundos que se espera al modelo capaz antes de pasar al rápido (solo con fast_model_name)
+        :param llm: Modelo de chat ya construido en lugar de CachingChatAnthropic (por ejemplo el falso del benchmark)
+        :param tts_backend: Síntesis de voz: "pyttsx3" (por defecto, un motor persistente en el proceso), "nao",
+                            "exe" (un proceso speak_{lang}_arg.exe por frase) o un backend propio con
+                            say / stop / close (ver agent.tts)
         """
         self.set_cons(tools=tools, lang=lang, memory=memory)
-        self.llm = ChatAnthropic(model_name=model_name, api_key=api_key)
+        self.max_concurrency = max_concurrency
+        self.tool_concurrency = tool_concurrency
+        self.tool_timeout = tool_timeout
+        self.tool_timeouts = tool_timeouts
+        self.metrics = metrics if metrics is not None else REGISTRY
+        self.scheduler = TurnScheduler(max_concurrency, metrics=self.metrics)
+        # Turnos de aprompt que ya respondieron y siguen resumiendo la historia.
+        self.background = set()
+        self.model_name = model_name
+        self.system_prompt = system_prompt
+        self.response_cache = response_cache
+        routed = bool(fast_model_name) and fast_model_name != model_name
+        # Con un modelo de respaldo no se espera el timeout del SDK (600s) ni sus reintentos.
+        capable_options = {"default_request_timeout": capable_timeout, "max_retries": 1} if routed else {}
+        self.llm = llm if llm is not None else CachingChatAnthropic(model_name=model_name, api_key=api_key,
+                                                                    prompt_cache=prompt_cache, **capable_options)
         self.llm_with_tools = self.llm.bind_tools(self.tools)
+        self.tool_router = ToolRouter(self.tools, tool_groups, metrics=self.metrics) if tool_groups else None
+        self.models = {model_name: (self.llm, self.llm_with_tools)}
+        self.model_router = None
+        if routed:
+            fast_llm = CachingChatAnthropic(model_name=fast_model_name, api_key=api_key, prompt_cache=prompt_cache,
+                                            default_request_timeout=fast_timeout, max_retries=1)
+            self.models[fast_model_name] = (fast_llm, fast_llm.bind_tools(self.tools))
+            self.model_router = ModelRouter(fast_model_name, model_name, tool_router=self.tool_router, metrics=self.metrics)
+        # Los resúmenes de la historia los hace el modelo más barato disponible.
+        summary_llm = self.models[fast_model_name][0] if self.model_router else self.llm
+        self.context = ContextManager(summary_llm, keep_turns=keep_turns, max_tokens=max_context_tokens, metrics=self.metrics)
         if self.memory:
-            self.checkpointer = SqliteSaver.from_conn_string("memory")
+            self.checkpointer = ThreadedSqliteSaver.from_conn_string(
+                checkpoint_path or os.getenv("CHECKPOINT_DB", "checkpoints.sqlite"),
+                keep_last=checkpoint_keep, metrics=self.metrics,
+            )
         self.graph = self._setup_graph()
         self.config = {"configurable": {"thread_id": f"{thread_id}"}}
+        # El hilo de voz arranca con la primera frase; el servidor o el benchmark nunca lo crean.
+        self.speech = LazyResource("speech worker", lambda: SpeechWorker(self.make_tts_backend(tts_backend),
+                                                                         metrics=self.metrics))
 
     def set_cons(self, tools, lang, memory):
         """
@@ -68,46 +147,255 @@ class AgentHandler:
         self.lang = lang
         self.memory = memory
 
-    def _chatbot(self, state: State):
+    def _chatbot(self, state: State, config: RunnableConfig = None):
         """
         Función interna que maneja la lógica del chatbot.
+        Si la configuración trae un "speech_stream", la respuesta se consume token a token
+        y se le va pasando para hablar por oraciones mientras el modelo genera.
+        
+        :param state: Estado actual del agente
+        :param config: Configuración de la ejecución del grafo
+        :return: Nuevo estado con la respuesta del modelo
+        """
+        with self.metrics.timer("agent_node_seconds", node="chatbot"):
+            self._debug_messages(state["messages"])
+            messages = self._llm_messages(state)
+            speech_stream = self._get_speech_stream(config)
+            models = self._route(messages)
+            for index, model in enumerate(models):
+                start = perf_counter()
+                first_token = None
+                llm = self._llm_for(model, messages)
+                try:
+                    if speech_stream is None:
+                        result = llm.invoke(messages)
+                    else:
+                        result = None
+                        speech_stream.begin(hold=self._may_call_tools(model, llm, messages))
+                        for chunk in llm.stream(messages):
+                            if first_token is None:
+                                first_token = perf_counter() - start
+                            result = chunk if result is None else result + chunk
+                            self._feed_speech_stream(speech_stream, chunk)
+                        speech_stream.end()
+                        result = message_chunk_to_message(result)
+                    break
+                except Exception as e:
+                    # Si ya se empezó a hablar la respuesta no se puede cambiar de modelo.
+                    if first_token is not None or index == len(models) - 1 or not should_fall_back(e):
+                        raise
+                    self._record_fallback(model, models[index + 1], e, perf_counter() - start)
+            self._record_llm(result, perf_counter() - start, first_token, model)
+        logger.debug("LLM response: %s", result)
+        return {"messages": [result]}
+
+    async def _achatbot(self, state: State, config: RunnableConfig = None):
+        """
+        Versión asíncrona de _chatbot, usada cuando el grafo corre con astream.
         
         :param state: Estado actual del agente
+        :param config: Configuración de la ejecución del grafo
         :return: Nuevo estado con la respuesta del modelo
         """
-        messages = state["messages"]
-        print("================================ Debug Messages ================================")
-        print("Debug: Messages before LLM invocation:", messages[-1], end="\n\n")
-        for message in messages:
-            if isinstance(message, ToolMessage):
-                print(message)
-        result = self.llm_with_tools.invoke(messages)
-        print("Debug: LLM response:", result, end="\n")
+        with self.metrics.timer("agent_node_seconds", node="chatbot"):
+            self._debug_messages(state["messages"])
+            messages = self._llm_messages(state)
+            speech_stream = self._get_speech_stream(config)
+            models = self._route(messages)
+            for index, model in enumerate(models):
+                start = perf_counter()
+                first_token = None
+                llm = self._llm_for(model, messages)
+                try:
+                    if speech_stream is None:
+                        result = await llm.ainvoke(messages)
+                    else:
+                        result = None
+                        speech_stream.begin(hold=self._may_call_tools(model, llm, messages))
+                        async for chunk in llm.astream(messages):
+                            if first_token is None:
+                                first_token = perf_counter() - start
+                            result = chunk if result is None else result + chunk
+                            self._feed_speech_stream(speech_stream, chunk)
+                        speech_stream.end()
+                        result = message_chunk_to_message(result)
+                    break
+                except Exception as e:
+                    if first_token is not None or index == len(models) - 1 or not should_fall_back(e):
+                        raise
+                    self._record_fallback(model, models[index + 1], e, perf_counter() - start)
+            self._record_llm(result, perf_counter() - start, first_token, model)
+        logger.debug("LLM response: %s", result)
         return {"messages": [result]}
+
+    def _may_call_tools(self, model, llm, messages):
+        """
+        True si es probable que este mensaje del modelo llame herramientas: la primera llamada
+        del turno con herramientas de algún grupo que coincide con el pedido (o con cualquier
+        herramienta si no hay tool_router). Su texto se retiene hasta que termina; el resto
+        (charla simple, la respuesta después de las herramientas) se habla mientras llega.
+        """
+        if llm is self.models[model][0] or not messages or not isinstance(messages[-1], HumanMessage):
+            return False
+        return self.tool_router is None or bool(self.tool_router.groups_for(messages))
+
+    def _get_speech_stream(self, config):
+        if not config:
+            return None
+        return config.get("configurable", {}).get("speech_stream")
+
+    def _feed_speech_stream(self, speech_stream, chunk):
+        """
+        Pasa el texto de un fragmento del modelo al speech_stream, saltando las llamadas a herramientas.
+        """
+        if chunk.tool_call_chunks:
+            speech_stream.tool_call()
+            return
+        # Con herramientas enlazadas Anthropic entrega el contenido como bloques.
+        if isinstance(chunk.content, str):
+            text = chunk.content
+        else:
+            text = "".join(block.get("text", "") for block in chunk.content
+                           if isinstance(block, dict) and block.get("type") in ("text", "text_delta"))
+        if text:
+            speech_stream.token(text)
+
+    def _llm_messages(self, state):
+        """
+        Mensajes que recibe el modelo: las instrucciones fijas primero (prefijo cacheable),
+        luego el resumen y la historia reciente.
+        """
+        messages = self.context.messages_for_llm(state)
+        if self.system_prompt:
+            return [SystemMessage(self.system_prompt)] + messages
+        return messages
+
+    def _route(self, messages):
+        """
+        Modelos a usar para estos mensajes, en orden de preferencia.
+        """
+        if self.model_router is None:
+            return [self.model_name]
+        return self.model_router.route(messages)
+
+    def _llm_for(self, model, messages):
+        """
+        Modelo con las herramientas que se enlazan para estos mensajes: todas, o las que
+        elige el tool_router si hay grupos configurados.
+        """
+        llm, llm_with_tools = self.models[model]
+        if self.tool_router is None:
+            return llm_with_tools
+        return self.tool_router.bind(llm, messages)
+
+    def _record_fallback(self, model, fallback, error, elapsed):
+        self.metrics.inc("agent_model_fallback_total", model=model, reason=type(error).__name__)
+        logger.warning("Model %s failed after %.2fs (%s), falling back to %s", model, elapsed, error, fallback)
+
+    def _record_llm(self, result, elapsed, first_token=None, model=None):
+        """
+        Registra el tiempo de una llamada al modelo, los tokens que informa en usage_metadata
+        y su costo estimado.
+        """
+        model = model or self.model_name
+        self.metrics.observe("agent_llm_seconds", elapsed, model=model)
+        if first_token is not None:
+            self.metrics.observe("agent_llm_first_token_seconds", first_token, model=model)
+        usage = getattr(result, "usage_metadata", None) or {}
+        for kind in ("input", "output"):
+            tokens = usage.get(f"{kind}_tokens")
+            if tokens is not None:
+                self.metrics.observe(f"agent_llm_{kind}_tokens", tokens, buckets=TOKEN_BUCKETS, model=model)
+                self.metrics.inc(f"agent_llm_{kind}_tokens_total", tokens, model=model)
+        metadata = getattr(result, "response_metadata", None) or {}
+        if "cache_read_input_tokens" in metadata:
+            read = metadata["cache_read_input_tokens"]
+            written = metadata.get("cache_creation_input_tokens", 0)
+            self.metrics.inc("agent_llm_cache_read_tokens_total", read, model=model)
+            self.metrics.inc("agent_llm_cache_write_tokens_total", written, model=model)
+            self.metrics.inc("agent_llm_cache_requests_total", model=model, result="hit" if read else "miss")
+            logger.debug("Prompt cache: %d tokens read, %d tokens written", read, written)
+        cost = estimate_cost(model, usage, metadata)
+        if cost is not None:
+            self.metrics.inc("agent_llm_cost_usd_total", cost, model=model)
+        logger.info("LLM %s: %.2fs, %s input / %s output tokens, ~$%s", model, elapsed, usage.get("input_tokens", "?"),
+                    usage.get("output_tokens", "?"), "?" if cost is None else f"{cost:.5f}")
+
+    def _debug_messages(self, messages):
+        # Solo el último mensaje y los resultados de herramientas del paso actual, no toda la historia.
+        if not logger.isEnabledFor(logging.DEBUG):
+            return
+        logger.debug("Messages before LLM invocation: %s", messages[-1])
+        for message in reversed(messages):
+            if not isinstance(message, ToolMessage):
+                break
+            logger.debug("Tool result: %s", message)
     
+    def make_tts_backend(self, tts_backend):
+        """
+        Crea el backend de síntesis de voz indicado en el constructor.
+        """
+        if tts_backend is None or tts_backend == "pyttsx3":
+            return Pyttsx3Backend(lang=self.lang)
+        if tts_backend == "exe":
+            return ProcessBackend([f".\\textToSpeech\\bin\\speak_{self.lang}_arg.exe"])
+        if tts_backend == "nao":
+            return NaoBackend(getattr(self, "nao_ip", None))
+        return tts_backend
+
     def speak(self, text):
         """
-        Sintetiza el texto a voz utilizando un ejecutable externo.
+        Encola el texto en el hilo de voz, que lo dice después de lo que ya tenga pendiente.
         
         :param text: Texto a sintetizar
         """
-        speak_command = f'.\\textToSpeech\\bin\\speak_{self.lang}_arg.exe "{str(text).replace('"',"")}"'
-        if not isinstance(text,list):
-          process = subprocess.Popen(speak_command, stdout=subprocess.PIPE)
+        if not isinstance(text, list):
+            self.speech.get().say(text)
+
+    def stop_speaking(self):
+        """
+        Corta lo que se está diciendo y descarta lo pendiente.
+        """
+        if self.speech.ready:
+            self.speech.get().cancel()
     
-    def _setup_graph(self):
+    def _build_graph(self):
         """
-        funcion interna que configura el grafo de estados para el flujo de conversación.
+        funcion interna que arma (sin compilar) el grafo de estados para el flujo de conversación.
         
-        :return: Grafo compilado
+        :return: StateGraph listo para compilar
         """
         graph_builder = StateGraph(self.State)
-        graph_builder.add_node("chatbot", self._chatbot)
-        tool_node = ToolNode(self.tools)
+        graph_builder.add_node("chatbot", RunnableCallable(self._chatbot, self._achatbot, name="chatbot", trace=False))
+        # Las llamadas de un mismo mensaje corren en paralelo y se devuelven en orden.
+        tool_node = ParallelToolNode(self.tools, max_concurrency=self.tool_concurrency,
+                                     timeout=self.tool_timeout, timeouts=self.tool_timeouts, metrics=self.metrics)
         graph_builder.add_node("tools", tool_node)
-        graph_builder.add_conditional_edges("chatbot", tools_condition)
+        # Con la respuesta ya entregada, si la historia se pasa de largo se resumen los turnos
+        # antiguos; así el resumen no se suma a la latencia del turno.
+        graph_builder.add_node("context", RunnableCallable(self.context.run, self.context.arun, name="context", trace=False))
         graph_builder.add_edge(START, "chatbot")
+        graph_builder.add_conditional_edges("chatbot", self._after_chatbot)
         graph_builder.add_edge("tools", "chatbot")
+        graph_builder.add_edge("context", END)
+        return graph_builder
+
+    def _after_chatbot(self, state):
+        """
+        Arista condicional desde el chatbot: herramientas si las pidió, si no el resumen
+        de la historia (cuando hace falta) o el fin del turno.
+        """
+        if tools_condition(state) == "tools":
+            return "tools"
+        return self.context.route(state)
+
+    def _setup_graph(self):
+        """
+        funcion interna que configura el grafo de estados para el flujo de conversación.
+        
+        :return: Grafo compilado
+        """
+        graph_builder = self._build_graph()
         if self.memory:
             return graph_builder.compile(checkpointer=self.checkpointer)
         else:
@@ -129,15 +417,116 @@ class AgentHandler:
         except Exception as e:
             print(f"Error generating the image: {e}")
 
+    def with_speech_stream(self, config, speech_stream):
+        """
+        Devuelve una copia de la configuración que lleva el speech_stream al nodo chatbot.
+        """
+        return {**config, "configurable": {**config["configurable"], "speech_stream": speech_stream}}
+
+    def _cache_lookup(self, user_input, values=None):
+        """
+        Busca la pregunta en la caché de respuestas y devuelve los mensajes del turno
+        (pregunta y respuesta) para agregar a la historia, o None. Igual que al guardar,
+        solo se usa en hilos sin historia ni resumen: con contexto, la misma pregunta
+        puede tener otra respuesta.
+        
+        :param values: Estado actual del hilo, si hay memoria
+        """
+        if self.response_cache is None:
+            return None
+        if values and (values.get("messages") or values.get("summary")):
+            self.metrics.inc("agent_response_cache_total", result="skip_context")
+            return None
+        answer = self.response_cache.lookup(user_input)
+        if answer is None:
+            return None
+        return [HumanMessage(user_input), AIMessage(answer)]
+
+    def _cached_answer(self, user_input, config):
+        """
+        Si la pregunta está en la caché, registra el turno en el hilo sin llamar al modelo
+        y devuelve el AIMessage de la respuesta.
+        """
+        if self.response_cache is None:
+            return None
+        values = self.graph.get_state(config).values if self.memory else None
+        messages = self._cache_lookup(user_input, values)
+        if messages is None:
+            return None
+        if self.memory:
+            self.graph.update_state(config, {"messages": messages}, as_node="context")
+        return messages[-1]
+
+    async def _acached_answer(self, user_input, config):
+        if self.response_cache is None:
+            return None
+        values = (await self.graph.aget_state(config)).values if self.memory else None
+        messages = self._cache_lookup(user_input, values)
+        if messages is None:
+            return None
+        if self.memory:
+            await self.graph.aupdate_state(config, {"messages": messages}, as_node="context")
+        return messages[-1]
+
+    def _remember_answer(self, user_input, messages, summary=None):
+        """
+        Guarda en la caché la respuesta final de un turno junto con las herramientas que usó.
+        La caché es de todo el proceso y se busca solo por la pregunta, así que únicamente se
+        guardan turnos de hilos sin historia previa ni resumen: una respuesta que salió de la
+        conversación ("¿cómo me llamo yo?") no le sirve a otro hilo.
+        
+        :param messages: Mensajes del hilo al terminar el turno
+        :param summary: Resumen de la conversación al terminar el turno
+        """
+        if self.response_cache is None:
+            return
+        turn = self._turn_messages(messages)
+        if not turn:
+            return
+        if summary or len(messages) > len(turn) + 1:
+            self.metrics.inc("agent_response_cache_total", result="skip_context")
+            return
+        answer = turn[-1]
+        if not isinstance(answer, AIMessage) or answer.tool_calls:
+            return
+        tools_used = [call["name"] for message in turn if isinstance(message, AIMessage) for call in message.tool_calls]
+        self.response_cache.store(user_input, message_text(answer), tools_used)
+
+    def _turn_messages(self, messages):
+        """
+        Mensajes posteriores al último mensaje del usuario.
+        """
+        for index in range(len(messages) - 1, -1, -1):
+            if isinstance(messages[index], HumanMessage):
+                return messages[index + 1:]
+        return messages
+
     def prompt(self,user_input):
+      # El usuario volvió a hablar: lo que quedaba de la respuesta anterior ya no sirve.
+      self.stop_speaking()
+      # La respuesta se habla por oraciones a medida que el modelo la genera.
+      speech_stream = SpeechStream(self.speak)
+      config = self.with_speech_stream(self.config, speech_stream)
+      last_id = None
+      event = {"messages": []}
       try:
-        for event in self.graph.stream({"messages": [("user", user_input)]}, self.config, stream_mode="values"):
-          if isinstance(event["messages"][-1], AIMessage) and not isinstance(event["messages"][-1], ToolMessage):
-            self.speak(event["messages"][-1].content)
-            pass
-          event["messages"][-1].pretty_print()
+        # Los turnos de voz pasan por el mismo TurnScheduler que la API async.
+        with self.scheduler.sync_slot(self.config["configurable"]["thread_id"], "voice"):
+          if cached := self._cached_answer(user_input, self.config):
+            speech_stream.token(cached.content)
+            speech_stream.end()
+            cached.pretty_print()
+            return
+          for event in self.graph.stream({"messages": [("user", user_input)]}, config, stream_mode="values"):
+            # Al resumir la historia el paso "context" vuelve a entregar la respuesta.
+            if event["messages"][-1].id != last_id:
+              last_id = event["messages"][-1].id
+              event["messages"][-1].pretty_print()
+          self._remember_answer(user_input, event["messages"], event.get("summary"))
       except Exception as e:
-        print(f"Error occurred: {e}")
+        logger.exception("Error occurred: %s", e)
+      finally:
+        speech_stream.close()
 
     def chat(self):
         """
@@ -150,66 +539,189 @@ class AgentHandler:
                 print("Goodbye!")
                 break
             try:
-                for event in self.graph.stream({"messages": [("user", user_input)]}, self.config, stream_mode="values"):
-                    if isinstance(event["messages"][-1], AIMessage):
-                      print(event["messages"][-1])
-                      print(event["messages"][-1].type)
-                      try:
-                        idk = event["messages"][-1].tool_call_id
-                      except:
-                        self.speak(event["messages"][-1].content)
-                    event["messages"][-1].pretty_print()
+                with self.scheduler.sync_slot(self.config["configurable"]["thread_id"], "voice"):
+                    last_id = None
+                    for event in self.graph.stream({"messages": [("user", user_input)]}, self.config, stream_mode="values"):
+                        if event["messages"][-1].id == last_id:
+                          continue
+                        last_id = event["messages"][-1].id
+                        if isinstance(event["messages"][-1], AIMessage):
+                          logger.debug("AI message: %s", event["messages"][-1])
+                          try:
+                            idk = event["messages"][-1].tool_call_id
+                          except:
+                            self.speak(event["messages"][-1].content)
+                        event["messages"][-1].pretty_print()
             except Exception as e:
                 print(f"Error occurred: {e}")
     
     def response(self,input):
         """
         crea una respuesta para el usuario en base al input.
+        Si la historia se resume al final del turno, devuelve después del resumen (la voz ya
+        habló la respuesta por oraciones); aprompt en cambio vuelve apenas llega la respuesta.
         """
         print("===============================================================================")
         user_input = input
         msg = ""
+        event = {"messages": []}
         try:
-          for event in self.graph.stream({"messages": [("user", user_input)]}, self.config, stream_mode="values"):
-            if isinstance(event["messages"][-1], AIMessage):
-              print(event["messages"][-1])
-              print(event["messages"][-1].type)
-              try:
-                idk = event["messages"][-1].tool_call_id
-              except:
-                self.speak(event["messages"][-1].content)
-                msg = event["messages"][-1].content
-              event["messages"][-1].pretty_print()
+          with self.scheduler.sync_slot(self.config["configurable"]["thread_id"], "voice"):
+            if cached := self._cached_answer(user_input, self.config):
+              self.speak(cached.content)
+              cached.pretty_print()
+              return cached.content
+            last_id = None
+            for event in self.graph.stream({"messages": [("user", user_input)]}, self.config, stream_mode="values"):
+              # Al resumir la historia el paso "context" vuelve a entregar la respuesta.
+              if event["messages"][-1].id == last_id:
+                continue
+              last_id = event["messages"][-1].id
+              if isinstance(event["messages"][-1], AIMessage):
+                logger.debug("AI message: %s", event["messages"][-1])
+                try:
+                  idk = event["messages"][-1].tool_call_id
+                except:
+                  self.speak(event["messages"][-1].content)
+                  msg = event["messages"][-1].content
+                event["messages"][-1].pretty_print()
+            self._remember_answer(user_input, event["messages"], event.get("summary"))
         except Exception as e:
-            print(f"Error occurred: {e}")
+            logger.exception("Error occurred: %s", e)
             return "Ups an error has happend"
         return msg
 
+    def get_config(self, thread_id=None):
+        """
+        Devuelve la configuración del hilo indicado, o la del hilo por defecto del agente.
+        
+        :param thread_id: ID del hilo de conversación
+        """
+        if thread_id is None:
+            return self.config
+        return {"configurable": {"thread_id": f"{thread_id}"}}
+
+    async def _agraph_stream(self, user_input, config, speech_stream=None):
+        """
+        Estados del hilo después de cada paso del grafo que agrega un mensaje.
+        """
+        if speech_stream is not None:
+            config = self.with_speech_stream(config, speech_stream)
+        last_id = None
+        async for event in self.graph.astream({"messages": [("user", user_input)]}, config, stream_mode="values"):
+            # El paso "context" vuelve a entregar la respuesta, se la entrega una sola vez.
+            if event["messages"][-1].id != last_id:
+                last_id = event["messages"][-1].id
+                yield event
+
+    async def astream(self, user_input, thread_id=None, speech_stream=None, priority="web"):
+        """
+        Ejecuta un turno de forma asíncrona y entrega el último mensaje de cada paso del grafo.
+        Varias conversaciones pueden correr a la vez sobre el mismo grafo y modelo, hasta
+        max_concurrency turnos simultáneos; los turnos de un mismo hilo corren de a uno (ver TurnScheduler).
+        
+        :param user_input: Texto del usuario
+        :param thread_id: ID del hilo de conversación, por defecto el del agente
+        :param speech_stream: SpeechStream que recibe la respuesta token a token (opcional)
+        :param priority: Clase de prioridad del turno: "voice", "web" o "batch"
+        """
+        config = self.get_config(thread_id)
+        async with self.scheduler.slot(config["configurable"]["thread_id"], priority):
+            async for event in self._agraph_stream(user_input, config, speech_stream):
+                yield event["messages"][-1]
+
+    async def aprompt(self, user_input, thread_id=None, speak=False, stream=None, priority="web"):
+        """
+        Versión asíncrona de response: devuelve el texto de la respuesta final del agente.
+
+        Vuelve apenas llega la respuesta final, sin esperar al resumen de la historia: el turno
+        sigue en segundo plano (en `background`) con el hilo reservado hasta terminar de resumir,
+        así que el turno siguiente del mismo hilo sí espera al resumen.
+        
+        :param user_input: Texto del usuario
+        :param thread_id: ID del hilo de conversación, por defecto el del agente
+        :param speak: Si es True, también sintetiza la respuesta a voz por oraciones
+        :param stream: Objeto con la interfaz de SpeechStream (begin, token, tool_call, end, close) que recibe
+                       la respuesta token a token en lugar de hablarla, por ejemplo para mandarla por SSE.
+                       Se cierra junto con la respuesta final.
+        :param priority: Clase de prioridad del turno: "voice", "web" o "batch"
+        """
+        speech_stream = stream if stream is not None else SpeechStream(self.speak) if speak else None
+        answered = asyncio.get_running_loop().create_future()
+        turn = asyncio.create_task(self._aturn(user_input, self.get_config(thread_id), speech_stream, priority, answered))
+        self.background.add(turn)
+        turn.add_done_callback(self.background.discard)
+        try:
+            return await asyncio.shield(answered)
+        except asyncio.CancelledError:
+            turn.cancel()
+            raise
+
+    async def _aturn(self, user_input, config, speech_stream, priority, answered):
+        """
+        Turno completo de aprompt: resuelve `answered` con el texto de la respuesta final y cierra
+        `speech_stream` en cuanto la respuesta llega, antes del resumen de la historia.
+        """
+        msg = ""
+        event = {"messages": []}
+
+        def answer(text):
+            if answered.done():
+                return
+            answered.set_result(text)
+            if speech_stream is not None:
+                speech_stream.close()
+
+        try:
+            # La respuesta cacheada también escribe en el hilo, así que espera su turno como el resto.
+            async with self.scheduler.slot(config["configurable"]["thread_id"], priority):
+                if cached := await self._acached_answer(user_input, config):
+                    if speech_stream is not None:
+                        speech_stream.token(cached.content)
+                        speech_stream.end()
+                    answer(cached.content)
+                    return
+                async for event in self._agraph_stream(user_input, config, speech_stream):
+                    message = event["messages"][-1]
+                    # Después de la respuesta final solo queda el nodo "context".
+                    if isinstance(message, AIMessage) and not message.tool_calls:
+                        msg = message.content
+                        answer(msg)
+            self._remember_answer(user_input, event["messages"], event.get("summary"))
+        except Exception as e:
+            logger.exception("Error occurred: %s", e)
+            answer("Ups an error has happend")
+        finally:
+            answer(msg)
+
+    async def asettle(self):
+        """
+        Espera a los turnos de aprompt de este event loop que siguen resumiendo la historia.
+        Hay que llamarlo antes de cerrar el loop: asyncio.run cancela las tareas pendientes.
+        """
+        loop = asyncio.get_running_loop()
+        while pending := [turn for turn in list(self.background) if turn.get_loop() is loop]:
+            await asyncio.wait(pending)
+
 # Clase NaoAgent que hereda de AgentHandler, específica para el robot NAO
 class NaoAgent(AgentHandler):
-    def __init__(self, api_key, tools, model_name, thread_id, memory=True, lang="es", nao_ip="127.0.0.1",nao_desc=""):
+    def __init__(self, api_key, tools, model_name, thread_id, memory=True, lang="es", nao_ip="127.0.0.1",nao_desc="",
+                 tool_groups=None, fast_model_name=None, tts_backend="nao"):
         """
         Inicializa un agente específico para el robot NAO.
         
         :param nao_ip: Dirección IP del robot NAO
+        :param tts_backend: Por defecto habla el robot, con un proceso NaoSpeak.py persistente
         """
-        super().__init__(api_key=api_key,tools=tools,model_name=model_name,thread_id=thread_id,memory=memory,lang=lang)
+        super().__init__(api_key=api_key,tools=tools,model_name=model_name,thread_id=thread_id,memory=memory,lang=lang,
+                         system_prompt=nao_desc or None, tool_groups=tool_groups,
+                         fast_model_name=fast_model_name, tts_backend=tts_backend)
         self.nao_ip = nao_ip
         self.nao_desc = nao_desc
 
     def personality(self):
         print(self.nao_desc)
 
-    def speak(self, text):
-        """
-        Sobrescribe el método speak para utilizar la síntesis de voz del robot NAO.
-        
-        :param text: Texto a sintetizar
-        """
-        if not isinstance(text, list):
-            speak_command = "python2 .\\Nao\\NaoSpeak.py  " + text
-            process = subprocess.Popen(speak_command.split(), stdout=subprocess.PIPE)
-
 if __name__ == "__main__":
     # Dependencies for Custom Tools
     from tools import tools
@@ -219,6 +731,7 @@ if __name__ == "__main__":
     # Acceder a las variables de entorno
     api_key = os.getenv('API_KEY')
     model_name = os.getenv('MODEL')
-    chatbot = AgentHandler(api_key, tools, "claude-3-haiku-20240307", 1)
+    chatbot = AgentHandler(api_key, tools, model_name or "claude-3-haiku-20240307", 1,
+                           fast_model_name=os.getenv('FAST_MODEL'))
     #chatbot.display_graph()
     chatbot.chat()
\ No newline at end of file
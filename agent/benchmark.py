@@ -0,0 +1,331 @@
+"""
+Benchmark de carga del grafo del agente sin red.
+
+Reemplaza ChatAnthropic por un modelo local determinista (ScriptedChatModel) con latencia
+configurable y las herramientas por stubs que solo esperan, y corre N sesiones simultáneas
+de M turnos cada una contra el mismo AgentHandler (grafo, checkpointer SQLite, ToolNode).
+Escribe una línea JSON por sesión y una de resumen con throughput, percentiles de latencia
+por turno, el tiempo del grafo que no es modelo ni herramientas, el costo del checkpointer
+y el crecimiento de memoria.
+
+  python -m agent.benchmark --sessions 16 --turns 20 --llm_latency 0.3 --tool_latency 0.1 --output agent_bench.jsonl
+
+Cada turno sigue uno de los `--scripts`, en ciclo: los pasos se separan con ";" y las
+herramientas que se llaman en paralelo en un paso con ",". "" es un turno de charla sin
+herramientas y "tasks;create_task" llama a tasks y, con su resultado, a create_task.
+"""
+import asyncio
+import json
+import os
+import platform
+import re
+import sys
+import tempfile
+import zlib
+from argparse import ArgumentParser
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from time import perf_counter, sleep
+
+import numpy as np
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, HumanMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.tools import StructuredTool
+from langchain_core.utils.function_calling import convert_to_openai_tool
+
+from agent.agentHandler import AgentHandler
+from agent.context import approx_tokens, message_text
+from agent.metrics import MetricsRegistry
+
+DEFAULT_SCRIPTS = ["", "weather", "", "tasks,weather", "", "tasks;create_task"]
+
+def get_parser():
+    parser = ArgumentParser(description="Load test the agent graph with a scripted fake LLM and stub tools.")
+    parser.add_argument("--sessions", default=8, type=int, help="Concurrent simulated conversations.")
+    parser.add_argument("--turns", default=10, type=int, help="Turns per conversation.")
+    parser.add_argument("--mode", default="async", choices=["async", "threads"],
+                        help="Drive the graph with astream (server) or graph.invoke from threads (voice loop).")
+    parser.add_argument("--scripts", nargs="+", default=DEFAULT_SCRIPTS,
+                        help="Tool-call script per turn, used in turn: steps separated by ';', parallel calls by ','.")
+    parser.add_argument("--llm_latency", default=0.2, type=float, help="Seconds per fake LLM call.")
+    parser.add_argument("--llm_jitter", default=0.2, type=float,
+                        help="Deterministic +/- fraction applied to the LLM latency.")
+    parser.add_argument("--tool_latency", default=0.05, type=float, help="Seconds per stub tool call.")
+    parser.add_argument("--response_words", default=30, type=int, help="Words in each final answer.")
+    parser.add_argument("--think_time", default=0.0, type=float, help="Seconds a session waits between turns.")
+    parser.add_argument("--max_concurrency", default=8, type=int, help="AgentHandler max_concurrency.")
+    parser.add_argument("--keep_turns", default=6, type=int)
+    parser.add_argument("--max_context_tokens", default=8000, type=int)
+    parser.add_argument("--checkpoint_path", default=None,
+                        help="SQLite file for the checkpointer, a temporary file by default, ':memory:' also works.")
+    parser.add_argument("--no_memory", action="store_true", help="Run the graph without a checkpointer.")
+    parser.add_argument("--output", default="-", help="JSONL file the results are appended to, '-' for stdout.")
+    return parser
+
+class ScriptedChatModel(BaseChatModel):
+    """
+    Modelo de chat falso y determinista: según el guion del turno pide herramientas o
+    contesta un texto fijo, después de esperar `latency` segundos (± `jitter`, derivado
+    del texto para que dos corridas iguales esperen lo mismo).
+
+    El guion se elige por el prefijo "#n " del mensaje del usuario; los mensajes sin prefijo
+    (por ejemplo el pedido de resumen de ContextManager) reciben una respuesta de texto.
+    """
+    scripts: list = []
+    latency: float = 0.2
+    jitter: float = 0.0
+    response_words: int = 30
+    calls: int = 0
+
+    @property
+    def _llm_type(self):
+        return "scripted"
+
+    def bind_tools(self, tools, **kwargs):
+        # Igual que ChatAnthropic: los esquemas se convierten al enlazar.
+        return self.bind(tools=[convert_to_openai_tool(tool) for tool in tools], **kwargs)
+
+    def _reply(self, messages):
+        index = max((i for i, message in enumerate(messages) if isinstance(message, HumanMessage)), default=-1)
+        text = message_text(messages[index]) if index >= 0 else ""
+        match = re.match(r"#(\d+) ", text)
+        steps = self.scripts[int(match.group(1)) % len(self.scripts)] if match and self.scripts else []
+        step = sum(1 for message in messages[index + 1:] if isinstance(message, AIMessage) and message.tool_calls)
+        seed = zlib.crc32(f"{text}|{step}".encode())
+        delay = self.latency * (1 + self.jitter * ((seed % 2001) / 1000 - 1))
+        self.calls += 1
+        if step < len(steps) and steps[step]:
+            message = AIMessage(content="", tool_calls=[
+                {"name": name, "args": {}, "id": f"call_{seed:08x}_{i}"} for i, name in enumerate(steps[step])
+            ])
+        else:
+            message = AIMessage(content=" ".join(f"palabra{i}" for i in range(self.response_words)))
+        message.usage_metadata = {
+            "input_tokens": approx_tokens(messages),
+            "output_tokens": self.response_words,
+            "total_tokens": approx_tokens(messages) + self.response_words,
+        }
+        return delay, ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        delay, result = self._reply(messages)
+        sleep(delay)
+        return result
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        delay, result = self._reply(messages)
+        await asyncio.sleep(delay)
+        return result
+
+    def _chunks(self, message):
+        # Como la API en streaming: el texto palabra a palabra y cada llamada a herramienta en un fragmento.
+        if message.tool_calls:
+            for index, call in enumerate(message.tool_calls):
+                yield ChatGenerationChunk(message=AIMessageChunk(content="", tool_call_chunks=[
+                    {"name": call["name"], "args": json.dumps(call["args"]), "id": call["id"], "index": index}
+                ]))
+        else:
+            words = message.content.split(" ")
+            for index, word in enumerate(words):
+                yield ChatGenerationChunk(message=AIMessageChunk(content=word if index == len(words) - 1 else word + " "))
+        yield ChatGenerationChunk(message=AIMessageChunk(content="", usage_metadata=message.usage_metadata))
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        delay, result = self._reply(messages)
+        sleep(delay)
+        yield from self._chunks(result.generations[0].message)
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        delay, result = self._reply(messages)
+        await asyncio.sleep(delay)
+        for chunk in self._chunks(result.generations[0].message):
+            yield chunk
+
+def parse_scripts(scripts):
+    """
+    "tasks,weather;create_task" -> [["tasks", "weather"], ["create_task"]]
+    """
+    return [[[name for name in step.split(",") if name] for step in script.split(";")] if script else []
+            for script in scripts]
+
+def stub_tools(names, latency):
+    """
+    Herramientas sin argumentos que esperan `latency` segundos y devuelven un texto fijo.
+    """
+    def make(name):
+        def run():
+            sleep(latency)
+            return f"{name} ok"
+
+        async def arun():
+            await asyncio.sleep(latency)
+            return f"{name} ok"
+        return StructuredTool.from_function(func=run, coroutine=arun, name=name, description=f"Stub of {name}.")
+    return [make(name) for name in names]
+
+def rss_mb():
+    """
+    Memoria residente actual del proceso en MB, o None si no se puede leer.
+    """
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss / (1024 * 1024)
+    except ImportError:
+        return None
+
+def build_agent(args, metrics):
+    scripts = parse_scripts(args.scripts)
+    names = sorted({name for script in scripts for step in script for name in step})
+    llm = ScriptedChatModel(scripts=scripts, latency=args.llm_latency, jitter=args.llm_jitter,
+                            response_words=args.response_words)
+    checkpoint_path = args.checkpoint_path or os.path.join(tempfile.mkdtemp(prefix="agent-bench-"), "checkpoints.sqlite")
+    agent = AgentHandler(api_key=None, tools=stub_tools(names, args.tool_latency), model_name="scripted",
+                         thread_id="bench", memory=not args.no_memory, max_concurrency=args.max_concurrency,
+                         keep_turns=args.keep_turns, max_context_tokens=args.max_context_tokens, metrics=metrics,
+                         checkpoint_path=checkpoint_path, llm=llm)
+    return agent, llm, checkpoint_path
+
+def prompt_for(args, session, turn):
+    return f"#{turn % len(args.scripts)} sesión {session} turno {turn}: ¿me ayudas con esto?"
+
+async def run_session_async(agent, args, session):
+    latencies, errors = [], []
+    for turn in range(args.turns):
+        start = perf_counter()
+        try:
+            async for _ in agent.astream(prompt_for(args, session, turn), thread_id=f"bench-{session}"):
+                pass
+            latencies.append(perf_counter() - start)
+        except Exception as e:
+            errors.append(repr(e))
+        if args.think_time:
+            await asyncio.sleep(args.think_time)
+    return latencies, errors
+
+def run_session_threads(agent, args, session):
+    latencies, errors = [], []
+    config = agent.get_config(f"bench-{session}")
+    for turn in range(args.turns):
+        start = perf_counter()
+        try:
+            # Mismo TurnScheduler y misma prioridad que el modo async, para que la espera en cola se compare.
+            with agent.scheduler.sync_slot(config["configurable"]["thread_id"], "web"):
+                agent.graph.invoke({"messages": [("user", prompt_for(args, session, turn))]}, config)
+            latencies.append(perf_counter() - start)
+        except Exception as e:
+            errors.append(repr(e))
+        if args.think_time:
+            sleep(args.think_time)
+    return latencies, errors
+
+def run_sessions(agent, args, sessions):
+    if args.mode == "threads":
+        with ThreadPoolExecutor(max(len(sessions), 1)) as executor:
+            return list(executor.map(lambda session: run_session_threads(agent, args, session), sessions))
+
+    async def main():
+        return await asyncio.gather(*(run_session_async(agent, args, session) for session in sessions))
+    return asyncio.run(main())
+
+def _percentile(values, q):
+    return float(np.percentile(values, q)) if values else None
+
+def _format(value, spec, unit="", scale=1):
+    return "n/a" if value is None else format(value * scale, spec) + unit
+
+def _total(metrics, name, **labels):
+    summary = metrics.get(name, **labels)
+    return summary["sum"] if summary else 0.0
+
+def summarize(args, results, metrics, wall, rss_before, rss_after, checkpoint_path):
+    latencies = [latency for session_latencies, _ in results for latency in session_latencies]
+    turns = len(latencies)
+    turn_seconds = sum(latencies)
+    llm_seconds = _total(metrics, "agent_llm_seconds", model="scripted")
+    tool_seconds = _total(metrics, "agent_node_seconds", node="tools")
+    queue_seconds = _total(metrics, "agent_queue_wait_seconds", priority="web")
+    checkpoint_seconds = sum(_total(metrics, "agent_checkpoint_seconds", op=op) for op in ("get", "list", "put", "put_writes"))
+    commit = metrics.get("agent_checkpoint_commit_seconds")
+    db_bytes = metrics.get("agent_checkpoint_db_bytes")
+    return {
+        "type": "summary",
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "host": platform.node(),
+        "cpu_count": os.cpu_count(),
+        "settings": {name: getattr(args, name) for name in
+                     ("sessions", "turns", "mode", "scripts", "llm_latency", "llm_jitter", "tool_latency",
+                      "response_words", "think_time", "max_concurrency", "keep_turns", "max_context_tokens", "no_memory")},
+        "turns": turns,
+        "failed_turns": sum(len(errors) for _, errors in results),
+        "wall_seconds": wall,
+        "throughput_turns_per_second": turns / wall if wall else None,
+        "turn_latency_p50": _percentile(latencies, 50),
+        "turn_latency_p95": _percentile(latencies, 95),
+        "turn_latency_p99": _percentile(latencies, 99),
+        "turn_latency_max": max(latencies) if latencies else None,
+        # Lo que agrega el grafo por turno: todo lo que no es esperar lugar, al modelo o a las herramientas.
+        "graph_overhead_per_turn": (turn_seconds - queue_seconds - llm_seconds - tool_seconds) / turns if turns else None,
+        "queue_seconds_per_turn": queue_seconds / turns if turns else None,
+        "llm_seconds_per_turn": llm_seconds / turns if turns else None,
+        "tool_seconds_per_turn": tool_seconds / turns if turns else None,
+        "checkpoint_seconds_per_turn": checkpoint_seconds / turns if turns else None,
+        "checkpoint_commits": commit["count"] if commit else 0,
+        "checkpoint_commit_seconds": commit["sum"] if commit else 0.0,
+        "checkpoint_db_bytes": db_bytes,
+        "checkpoint_path": None if args.no_memory else checkpoint_path,
+        "queue_wait_p95": (metrics.get("agent_queue_wait_seconds", priority="web") or {}).get("p95"),
+        "rss_mb_before": rss_before,
+        "rss_mb_after": rss_after,
+        "rss_growth_mb": rss_after - rss_before if rss_before is not None and rss_after is not None else None,
+        "rss_growth_kb_per_turn": (rss_after - rss_before) * 1024 / turns
+                                  if turns and rss_before is not None and rss_after is not None else None,
+    }
+
+def run(args):
+    metrics = MetricsRegistry()
+    agent, llm, checkpoint_path = build_agent(args, metrics)
+    # Un turno previo para que imports, esquemas y tablas no cuenten en la medición.
+    run_sessions(agent, args, ["warmup"])
+    metrics.reset()
+    rss_before = rss_mb()
+
+    start = perf_counter()
+    results = run_sessions(agent, args, list(range(args.sessions)))
+    wall = perf_counter() - start
+
+    if not args.no_memory:
+        agent.checkpointer.flush()
+        agent.checkpointer.report_size()
+    summary = summarize(args, results, metrics, wall, rss_before, rss_mb(), checkpoint_path)
+    summary["llm_calls"] = llm.calls
+
+    output = sys.stdout if args.output == "-" else open(args.output, "a", encoding="utf-8")
+    try:
+        for session, (latencies, errors) in enumerate(results):
+            output.write(json.dumps({"type": "session", "session": session, "turn_latencies": latencies,
+                                     "errors": errors}) + "\n")
+        output.write(json.dumps(summary, ensure_ascii=False) + "\n")
+        output.flush()
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    # Si fallaron todos los turnos no hay latencias: los percentiles quedan en None.
+    print(f"{summary['turns']} turns in {wall:.2f}s ({_format(summary['throughput_turns_per_second'], '.1f', '/s')})  "
+          f"p50={_format(summary['turn_latency_p50'], '.3f', 's')} p95={_format(summary['turn_latency_p95'], '.3f', 's')} "
+          f"p99={_format(summary['turn_latency_p99'], '.3f', 's')}  "
+          f"overhead/turn={_format(summary['graph_overhead_per_turn'], '.1f', 'ms', 1000)}  "
+          f"checkpoint/turn={_format(summary['checkpoint_seconds_per_turn'], '.1f', 'ms', 1000)}  "
+          f"rss_growth_mb={summary['rss_growth_mb']}",
+          file=sys.stderr)
+    if not args.no_memory:
+        agent.checkpointer.close()
+    return summary
+
+if __name__ == "__main__":
+    run(get_parser().parse_args())
@@ -0,0 +1,245 @@
+import asyncio
+import atexit
+import logging
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from time import monotonic
+
+from langgraph.checkpoint.sqlite import SqliteSaver
+
+from agent.metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+BATCH_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128)
+
+class ThreadedSqliteSaver(SqliteSaver):
+    """
+    SqliteSaver que también atiende la API async de LangGraph (graph.astream) ejecutando
+    las operaciones síncronas en el executor, y que serializa lecturas y escrituras con
+    el mismo lock para poder compartir la conexión entre sesiones concurrentes.
+
+    Pensado para hilos de larga duración:
+    - WAL con synchronous=NORMAL y commits agrupados: cada paso del grafo escribe en la
+      transacción abierta y un hilo de fondo hace commit cada `commit_interval` segundos
+      (con 0 se hace commit en cada escritura, como SqliteSaver).
+    - Retención: solo se conservan los últimos `keep_last` checkpoints de cada hilo.
+    - Mantenimiento periódico: poda, vacuum incremental y truncado del WAL.
+    Tiempos de lectura / escritura / commit y tamaño de la base se registran en `metrics`.
+    """
+
+    def __init__(self, conn, *, serde=None, path=None, commit_interval=0.05, keep_last=20,
+                 maintenance_interval=300, vacuum_pages=256, metrics=None):
+        """
+        :param conn: Conexión SQLite (creada con check_same_thread=False)
+        :param path: Archivo de la base, para informar el tamaño del WAL
+        :param commit_interval: Segundos máximos que una escritura espera su commit
+        :param keep_last: Checkpoints que se conservan por hilo (None para no podar)
+        :param maintenance_interval: Segundos entre mantenimientos (None para desactivarlos)
+        :param vacuum_pages: Páginas libres que se devuelven al sistema en cada mantenimiento
+        :param metrics: MetricsRegistry, por defecto el registro global
+        """
+        super().__init__(conn, serde=serde)
+        self.path = path
+        self.commit_interval = commit_interval
+        self.keep_last = keep_last
+        self.maintenance_interval = maintenance_interval
+        self.vacuum_pages = vacuum_pages
+        self.metrics = metrics if metrics is not None else REGISTRY
+        self.pending = 0
+        self.touched = set()
+        self.closed = threading.Event()
+        self.thread = None
+        if commit_interval or maintenance_interval:
+            self.thread = threading.Thread(target=self._background, daemon=True)
+            self.thread.start()
+        # Lo que quede sin commit al salir se guarda igual.
+        atexit.register(self.close)
+
+    @classmethod
+    def from_conn_string(cls, conn_string, **kwargs):
+        """
+        Crea el checkpointer sobre un archivo SQLite (o ":memory:").
+        """
+        conn = sqlite3.connect(conn_string, check_same_thread=False)
+        return cls(conn=conn, path=None if conn_string == ":memory:" else conn_string, **kwargs)
+
+    def setup(self):
+        if self.is_setup:
+            return
+        # auto_vacuum solo tiene efecto si se fija antes de crear las tablas.
+        self.conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        self.conn.execute("PRAGMA busy_timeout=5000")
+        super().setup()
+        # En WAL, NORMAL solo sincroniza al pasar el WAL a la base: commits mucho más baratos.
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+
+    @contextmanager
+    def cursor(self, transaction=True):
+        # Se usa siempre con self.lock tomado.
+        self.setup()
+        cur = self.conn.cursor()
+        try:
+            yield cur
+        finally:
+            cur.close()
+            if transaction:
+                self.pending += 1
+                if not self.commit_interval:
+                    self._commit()
+
+    def _commit(self):
+        if not self.pending:
+            return
+        with self.metrics.timer("agent_checkpoint_commit_seconds"):
+            self.conn.commit()
+        self.metrics.observe("agent_checkpoint_batch_writes", self.pending, buckets=BATCH_BUCKETS)
+        self.pending = 0
+
+    def flush(self):
+        """
+        Hace commit de las escrituras pendientes.
+        """
+        with self.lock:
+            self._commit()
+
+    def get_tuple(self, config):
+        with self.metrics.timer("agent_checkpoint_seconds", op="get"), self.lock:
+            return super().get_tuple(config)
+
+    def list(self, config, *, filter=None, before=None, limit=None):
+        # Se materializa dentro del lock para no dejar un cursor abierto entre hilos.
+        with self.metrics.timer("agent_checkpoint_seconds", op="list"), self.lock:
+            items = [*super().list(config, filter=filter, before=before, limit=limit)]
+        yield from items
+
+    def put(self, config, checkpoint, metadata):
+        with self.metrics.timer("agent_checkpoint_seconds", op="put"):
+            result = super().put(config, checkpoint, metadata)
+        with self.lock:
+            self.touched.add(str(config["configurable"]["thread_id"]))
+        return result
+
+    def put_writes(self, config, writes, task_id):
+        with self.metrics.timer("agent_checkpoint_seconds", op="put_writes"):
+            return super().put_writes(config, writes, task_id)
+
+    async def aget_tuple(self, config):
+        return await asyncio.get_running_loop().run_in_executor(None, self.get_tuple, config)
+
+    async def alist(self, config, *, filter=None, before=None, limit=None):
+        items = await asyncio.get_running_loop().run_in_executor(
+            None, lambda: [*self.list(config, filter=filter, before=before, limit=limit)]
+        )
+        for item in items:
+            yield item
+
+    async def aput(self, config, checkpoint, metadata):
+        return await asyncio.get_running_loop().run_in_executor(None, self.put, config, checkpoint, metadata)
+
+    async def aput_writes(self, config, writes, task_id):
+        return await asyncio.get_running_loop().run_in_executor(None, self.put_writes, config, writes, task_id)
+
+    def prune(self, thread_ids=None):
+        """
+        Borra los checkpoints (y sus escrituras) de cada hilo salvo los últimos `keep_last`.
+
+        :param thread_ids: Hilos a podar, por defecto los que recibieron escrituras desde la última poda
+        :return: Cantidad de checkpoints borrados
+        """
+        if not self.keep_last:
+            return 0
+        deleted = 0
+        with self.lock, self.cursor() as cur:
+            # Con el lock tomado, para no perder un hilo que otro put agregue justo ahora.
+            if thread_ids is None:
+                thread_ids, self.touched = self.touched, set()
+            for thread_id in thread_ids:
+                cur.execute(
+                    "DELETE FROM checkpoints WHERE thread_id = ? AND thread_ts NOT IN "
+                    "(SELECT thread_ts FROM checkpoints WHERE thread_id = ? ORDER BY thread_ts DESC LIMIT ?)",
+                    (thread_id, thread_id, self.keep_last),
+                )
+                deleted += cur.rowcount
+                cur.execute(
+                    "DELETE FROM writes WHERE thread_id = ? AND thread_ts NOT IN "
+                    "(SELECT thread_ts FROM checkpoints WHERE thread_id = ?)",
+                    (thread_id, thread_id),
+                )
+        self.flush()
+        self.metrics.inc("agent_checkpoint_pruned_total", deleted)
+        return deleted
+
+    def vacuum(self):
+        """
+        Compacta la base completa (y la pasa a auto_vacuum incremental si venía de SqliteSaver).
+        Bloquea el checkpointer mientras dura.
+        """
+        with self.lock:
+            self.setup()
+            self._commit()
+            self.conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+            self.conn.execute("VACUUM")
+
+    def _pages(self):
+        return {
+            pragma: self.conn.execute(f"PRAGMA {pragma}").fetchone()[0]
+            for pragma in ("auto_vacuum", "page_size", "page_count", "freelist_count")
+        }
+
+    def maintain(self):
+        """
+        Poda los hilos con escrituras nuevas, devuelve páginas libres al sistema, trunca el WAL
+        y actualiza las métricas de tamaño.
+        """
+        with self.metrics.timer("agent_checkpoint_maintenance_seconds"):
+            self.prune()
+            with self.lock:
+                self.setup()
+                self._commit()
+                pages = self._pages()
+                if pages["auto_vacuum"] == 2 and pages["freelist_count"]:
+                    self.conn.execute(f"PRAGMA incremental_vacuum({int(self.vacuum_pages)})")
+                    self.conn.commit()
+                self.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            # Una base creada sin auto_vacuum incremental se compacta entera cuando está muy vacía.
+            if pages["auto_vacuum"] != 2 and pages["freelist_count"] > pages["page_count"] // 4:
+                self.vacuum()
+            self.report_size()
+
+    def report_size(self):
+        with self.lock:
+            self.setup()
+            pages = self._pages()
+        self.metrics.set("agent_checkpoint_db_bytes", pages["page_count"] * pages["page_size"])
+        self.metrics.set("agent_checkpoint_free_bytes", pages["freelist_count"] * pages["page_size"])
+        if self.path and os.path.exists(f"{self.path}-wal"):
+            self.metrics.set("agent_checkpoint_wal_bytes", os.path.getsize(f"{self.path}-wal"))
+
+    def _background(self):
+        next_maintenance = monotonic() + (self.maintenance_interval or 0)
+        while not self.closed.wait(self.commit_interval or self.maintenance_interval):
+            try:
+                self.flush()
+                if self.maintenance_interval and monotonic() >= next_maintenance:
+                    self.maintain()
+                    next_maintenance = monotonic() + self.maintenance_interval
+            except Exception as e:
+                logger.exception("Checkpoint background task failed: %s", e)
+
+    def close(self):
+        """
+        Detiene el hilo de fondo, hace commit de lo pendiente y cierra la conexión.
+        """
+        if self.closed.is_set():
+            return
+        self.closed.set()
+        if self.thread is not None:
+            self.thread.join()
+        try:
+            self.flush()
+            self.conn.close()
+        except sqlite3.ProgrammingError:
+            pass
@@ -0,0 +1,159 @@
+import json
+import logging
+from time import perf_counter
+
+from langchain_core.messages import AIMessage, HumanMessage, RemoveMessage, SystemMessage, ToolMessage
+from langgraph.graph import END
+
+from agent.metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_PROMPT = (
+    "Eres el encargado de la memoria de un asistente conversacional. Actualiza el resumen de la "
+    "conversación incorporando los mensajes nuevos. Conserva los datos que puedan hacer falta más "
+    "adelante: nombres, preferencias, tareas creadas, lugares, fechas y decisiones. Escribe solo el "
+    "resumen, breve y en el idioma de la conversación."
+)
+
+def message_text(message):
+    """
+    Texto de un mensaje, también cuando el contenido viene en bloques (Anthropic).
+    """
+    if isinstance(message.content, str):
+        return message.content
+    return " ".join(block.get("text", "") if isinstance(block, dict) else str(block) for block in message.content)
+
+def approx_tokens(messages):
+    """
+    Estimación rápida de tokens (unos 4 caracteres por token), sin llamar a la API.
+    """
+    total = 0
+    for message in messages:
+        total += 4 + len(message_text(message)) // 4
+        if isinstance(message, AIMessage) and message.tool_calls:
+            total += len(json.dumps([call["args"] for call in message.tool_calls], default=str)) // 4
+    return total
+
+def render_transcript(messages):
+    lines = []
+    for message in messages:
+        if isinstance(message, HumanMessage):
+            lines.append(f"Usuario: {message_text(message)}")
+        elif isinstance(message, ToolMessage):
+            lines.append(f"Herramienta {message.name}: {message_text(message)}")
+        elif isinstance(message, AIMessage):
+            if text := message_text(message).strip():
+                lines.append(f"Asistente: {text}")
+            for call in message.tool_calls:
+                lines.append(f"Asistente llamó a {call['name']}({json.dumps(call['args'], ensure_ascii=False, default=str)})")
+    return "\n".join(lines)
+
+class ContextManager:
+    """
+    Mantiene acotado el contexto que se manda al modelo en hilos de larga duración.
+
+    Conserva textuales los últimos `keep_turns` turnos (un turno empieza en cada mensaje
+    del usuario) y resume los anteriores en `state["summary"]`, quitándolos del estado.
+    Solo se corta al inicio de un turno, así una llamada a herramienta nunca queda separada
+    de su resultado. Los turnos se resumen por tandas de `fold_turns` para no llamar al
+    modelo en cada turno, y si lo que queda supera `max_tokens` se siguen resumiendo turnos
+    hasta bajar a la mitad del presupuesto. El resumen se hace al final del turno, después
+    de la respuesta: aprompt (y la API HTTP) la entregan sin esperarlo y la voz ya la habló
+    por oraciones, pero response/prompt/chat devuelven recién al terminar de resumir. El
+    turno siguiente del mismo hilo siempre espera al resumen y empieza con la historia acotada.
+    """
+    def __init__(self, llm, keep_turns=6, max_tokens=8000, fold_turns=4, token_counter=approx_tokens, metrics=REGISTRY):
+        """
+        :param llm: Modelo (sin herramientas) que escribe el resumen
+        :param keep_turns: Turnos recientes que se conservan sin resumir
+        :param max_tokens: Presupuesto de tokens de la historia que se manda al modelo
+        :param fold_turns: Turnos extra que se acumulan antes de resumir
+        :param token_counter: Función que estima los tokens de una lista de mensajes
+        """
+        self.llm = llm
+        self.keep_turns = max(1, keep_turns)
+        self.max_tokens = max_tokens
+        self.fold_turns = fold_turns
+        self.token_counter = token_counter
+        self.metrics = metrics
+
+    def plan(self, messages):
+        """
+        Devuelve cuántos mensajes del inicio hay que resumir (0 si ninguno).
+        """
+        starts = [index for index, message in enumerate(messages) if isinstance(message, HumanMessage)]
+        if len(starts) <= 1:
+            return 0
+        cut = 0
+        if len(starts) > self.keep_turns + self.fold_turns:
+            cut = starts[-self.keep_turns]
+        if self.max_tokens and self.token_counter(messages[cut:]) > self.max_tokens:
+            # El último turno siempre se conserva completo.
+            for start in starts:
+                if start <= cut:
+                    continue
+                if start == starts[-1] or self.token_counter(messages[start:]) <= self.max_tokens // 2:
+                    cut = start
+                    break
+        return cut
+
+    def _summary_request(self, summary, messages):
+        return [
+            SystemMessage(SUMMARY_PROMPT),
+            HumanMessage(f"Resumen actual:\n{summary or '(vacío)'}\n\nMensajes nuevos:\n{render_transcript(messages)}"),
+        ]
+
+    def route(self, state):
+        """
+        Arista condicional al terminar la respuesta: pasa por el nodo "context" solo si hay algo que resumir.
+        """
+        return "context" if self.plan(state["messages"]) else END
+
+    def _update(self, state, cut, summary):
+        removed = [RemoveMessage(id=message.id) for message in state["messages"][:cut]]
+        logger.debug("Folded %d messages into the conversation summary", cut)
+        return {"summary": summary, "messages": removed}
+
+    def run(self, state):
+        """
+        Nodo del grafo: resume los turnos antiguos.
+        """
+        messages = state["messages"]
+        cut = self.plan(messages)
+        if not cut:
+            return {"summary": state.get("summary") or ""}
+        start = perf_counter()
+        try:
+            summary = message_text(self.llm.invoke(self._summary_request(state.get("summary"), messages[:cut])))
+        except Exception as e:
+            # Sin resumen se sigue con la historia completa, se intentará al final del próximo turno.
+            logger.warning("Could not summarize the conversation: %s", e)
+            return {"summary": state.get("summary") or ""}
+        finally:
+            self.metrics.observe("agent_summary_seconds", perf_counter() - start)
+        return self._update(state, cut, summary)
+
+    async def arun(self, state):
+        messages = state["messages"]
+        cut = self.plan(messages)
+        if not cut:
+            return {"summary": state.get("summary") or ""}
+        start = perf_counter()
+        try:
+            summary = message_text(await self.llm.ainvoke(self._summary_request(state.get("summary"), messages[:cut])))
+        except Exception as e:
+            logger.warning("Could not summarize the conversation: %s", e)
+            return {"summary": state.get("summary") or ""}
+        finally:
+            self.metrics.observe("agent_summary_seconds", perf_counter() - start)
+        return self._update(state, cut, summary)
+
+    def messages_for_llm(self, state):
+        """
+        Mensajes que se mandan al modelo: el resumen (si hay) seguido de la historia reciente.
+        """
+        messages = state["messages"]
+        if summary := state.get("summary"):
+            return [SystemMessage(f"Resumen de la conversación anterior:\n{summary}")] + messages
+        return messages
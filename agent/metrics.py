@@ -0,0 +1,166 @@
+import threading
+from bisect import bisect_left
+from collections import deque
+from contextlib import contextmanager
+from time import perf_counter
+
+# Límites (en segundos) de los buckets de latencia.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+# Límites de los buckets de tokens por llamada.
+TOKEN_BUCKETS = (16, 64, 256, 1024, 4096, 16384, 65536)
+
+class Histogram:
+    """
+    Histograma de buckets acumulables (formato Prometheus) que además guarda las últimas
+    muestras para calcular percentiles.
+    """
+    def __init__(self, buckets=LATENCY_BUCKETS, samples=1024):
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+        self.samples = deque(maxlen=samples)
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+        self.samples.append(value)
+
+    def quantile(self, q):
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "avg": self.sum / self.count if self.count else 0.0,
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99),
+            "max": self.max,
+        }
+
+class MetricsRegistry:
+    """
+    Registro en proceso de contadores, gauges e histogramas con etiquetas, seguro entre hilos.
+    Se consulta con `snapshot()` o se exporta en texto Prometheus con `to_prometheus()`.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.histograms = {}
+        self.counters = {}
+        self.gauges = {}
+
+    def _key(self, name, labels):
+        return name, tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+    def observe(self, name, value, buckets=LATENCY_BUCKETS, **labels):
+        """
+        Registra una muestra en el histograma `name` con las etiquetas dadas.
+        """
+        key = self._key(name, labels)
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram(buckets)
+            histogram.observe(value)
+
+    def inc(self, name, value=1, **labels):
+        """
+        Incrementa el contador `name` con las etiquetas dadas.
+        """
+        key = self._key(name, labels)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def set(self, name, value, **labels):
+        """
+        Fija el valor actual del gauge `name` (tamaños, profundidades de cola).
+        """
+        key = self._key(name, labels)
+        with self.lock:
+            self.gauges[key] = value
+
+    @contextmanager
+    def timer(self, name, **labels):
+        """
+        Mide el tiempo de pared del bloque y lo registra en el histograma `name`.
+        """
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, perf_counter() - start, **labels)
+
+    def get(self, name, **labels):
+        """
+        Resumen de un histograma (o valor de un contador o gauge), None si no hay datos.
+        """
+        key = self._key(name, labels)
+        with self.lock:
+            if key in self.histograms:
+                return self.histograms[key].summary()
+            if key in self.gauges:
+                return self.gauges[key]
+            return self.counters.get(key)
+
+    def reset(self):
+        with self.lock:
+            self.histograms.clear()
+            self.counters.clear()
+            self.gauges.clear()
+
+    def snapshot(self):
+        """
+        Devuelve {nombre: {etiquetas: resumen}} con histogramas, contadores y gauges.
+        """
+        with self.lock:
+            histograms = [(key, histogram.summary()) for key, histogram in self.histograms.items()]
+            values = list(self.counters.items()) + list(self.gauges.items())
+        result = {}
+        for (name, labels), value in histograms + values:
+            result.setdefault(name, {})[_format_labels(labels)] = value
+        return result
+
+    def to_prometheus(self):
+        """
+        Exporta el registro en el formato de texto de Prometheus.
+        """
+        lines = []
+        with self.lock:
+            histograms = sorted(self.histograms.items())
+            counters = sorted(self.counters.items())
+            last = None
+            for (name, labels), histogram in histograms:
+                if name != last:
+                    lines.append(f"# TYPE {name} histogram")
+                    last = name
+                cumulative = 0
+                for bound, count in zip(histogram.buckets + (float("inf"),), histogram.counts):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else repr(float(bound))
+                    lines.append(f"{name}_bucket{_format_labels(labels + (('le', le),))} {cumulative}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {histogram.sum}")
+                lines.append(f"{name}_count{_format_labels(labels)} {histogram.count}")
+            for kind, items in (("counter", counters), ("gauge", sorted(self.gauges.items()))):
+                for (name, labels), value in items:
+                    if name != last:
+                        lines.append(f"# TYPE {name} {kind}")
+                        last = name
+                    lines.append(f"{name}{_format_labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in labels)
+    return "{" + ",".join(f'{key}="{value}"' for (key, _), value in zip(labels, escaped)) + "}"
+
+# Registro por defecto que comparten el agente, las herramientas y el checkpointer.
+REGISTRY = MetricsRegistry()
@@ -0,0 +1,110 @@
+import logging
+
+import anthropic
+from langchain_core.messages import AIMessage, HumanMessage
+
+from agent.context import message_text
+from agent.metrics import REGISTRY
+from agent.text import normalize_text
+
+logger = logging.getLogger(__name__)
+
+# Precio en USD por millón de tokens (entrada, salida) por familia de modelo.
+MODEL_PRICES = {
+    "claude-3-haiku": (0.25, 1.25),
+    "claude-3-5-haiku": (0.8, 4.0),
+    "claude-3-sonnet": (3.0, 15.0),
+    "claude-3-5-sonnet": (3.0, 15.0),
+    "claude-3-opus": (15.0, 75.0),
+}
+# Leer de la caché de prompt cuesta el 10% de la entrada y escribirla el 125%.
+CACHE_READ_FACTOR = 0.1
+CACHE_WRITE_FACTOR = 1.25
+
+# Frases que anuncian un pedido de varios pasos o que requiere razonar.
+MULTI_STEP_KEYWORDS = (
+    "y luego", "y despues", "despues de", "primero", "paso a paso", "explica", "compara", "por que", "planifica", "resume",
+    "and then", "after that", "first", "step by step", "explain", "compare", "why", "summarize",
+)
+
+def estimate_cost(model, usage, metadata=None):
+    """
+    Costo aproximado en USD de una llamada según los tokens informados, o None si no se
+    conoce el precio del modelo.
+    """
+    prices = next((price for family, price in sorted(MODEL_PRICES.items(), key=lambda item: -len(item[0]))
+                   if model and model.startswith(family)), None)
+    if prices is None or not usage:
+        return None
+    metadata = metadata or {}
+    input_price, output_price = prices
+    input_tokens = (usage.get("input_tokens", 0)
+                    + metadata.get("cache_read_input_tokens", 0) * CACHE_READ_FACTOR
+                    + metadata.get("cache_creation_input_tokens", 0) * CACHE_WRITE_FACTOR)
+    return (input_tokens * input_price + usage.get("output_tokens", 0) * output_price) / 1_000_000
+
+def should_fall_back(error):
+    """
+    True si el error es de disponibilidad (timeout, conexión, límite de uso, sobrecarga)
+    y vale la pena reintentar con el otro modelo.
+    """
+    if isinstance(error, anthropic.APIConnectionError):
+        return True
+    if isinstance(error, anthropic.APIStatusError):
+        return error.status_code == 429 or error.status_code >= 500
+    return False
+
+class ModelRouter:
+    """
+    Decide en cada llamada si responde el modelo rápido o el capaz.
+
+    La charla simple va al modelo rápido. Se escala al capaz cuando el turno necesita
+    herramientas de algún grupo del ToolRouter, cuando ya lleva `max_fast_tool_calls`
+    llamadas a herramientas, cuando el pedido es largo o anuncia varios pasos. El otro
+    modelo queda como respaldo si el elegido falla por timeout o sobrecarga.
+    """
+    def __init__(self, fast_model, capable_model, tool_router=None, max_fast_words=40, max_fast_tool_calls=2,
+                 keywords=MULTI_STEP_KEYWORDS, metrics=REGISTRY):
+        """
+        :param fast_model: Nombre del modelo rápido
+        :param capable_model: Nombre del modelo capaz
+        :param tool_router: ToolRouter del agente, para saber si el turno necesita herramientas
+        :param max_fast_words: Pedidos con más palabras van al modelo capaz
+        :param max_fast_tool_calls: Llamadas a herramientas en el turno a partir de las cuales se escala
+        :param keywords: Frases (prefijos, sin tildes) que indican un pedido de varios pasos
+        """
+        self.fast_model = fast_model
+        self.capable_model = capable_model
+        self.tool_router = tool_router
+        self.max_fast_words = max_fast_words
+        self.max_fast_tool_calls = max_fast_tool_calls
+        self.keywords = [normalize_text(keyword).rstrip() for keyword in keywords]
+        self.metrics = metrics
+
+    def _reason(self, messages):
+        index = max((i for i, message in enumerate(messages) if isinstance(message, HumanMessage)), default=-1)
+        if index < 0:
+            return None
+        text = normalize_text(message_text(messages[index]))
+        tool_calls = sum(len(message.tool_calls) for message in messages[index + 1:] if isinstance(message, AIMessage))
+        if self.tool_router is not None and self.tool_router.groups_for(messages):
+            return "tools"
+        if tool_calls >= self.max_fast_tool_calls:
+            return "multi_step"
+        if len(text.split()) > self.max_fast_words:
+            return "long"
+        if any(keyword in text for keyword in self.keywords):
+            return "multi_step"
+        return None
+
+    def route(self, messages):
+        """
+        Modelos a probar en orden: el elegido para `messages` y luego el de respaldo.
+        """
+        reason = self._reason(messages)
+        route = "fast" if reason is None else "capable"
+        self.metrics.inc("agent_model_route_total", route=route, reason=reason or "small_talk")
+        logger.info("Routing to the %s model (%s)", route, reason or "small talk")
+        if reason is None:
+            return [self.fast_model, self.capable_model]
+        return [self.capable_model, self.fast_model]
@@ -0,0 +1,143 @@
+import asyncio
+from time import monotonic, perf_counter
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+from langchain_core.messages import AIMessage, ToolMessage
+from langchain_core.runnables.config import ContextThreadPoolExecutor
+from langgraph.prebuilt import ToolNode
+from langgraph.prebuilt.tool_node import INVALID_TOOL_NAME_ERROR_TEMPLATE, TOOL_CALL_ERROR_TEMPLATE
+
+from agent.metrics import REGISTRY
+
+TOOL_TIMEOUT_ERROR_TEMPLATE = "Error: {requested_tool} did not answer within {timeout} seconds, try again later."
+
+class ParallelToolNode(ToolNode):
+    """
+    ToolNode que ejecuta a la vez las llamadas independientes de un mismo AIMessage,
+    con un máximo de llamadas simultáneas por paso y un timeout por herramienta, que
+    corre desde el inicio del paso (también para las llamadas que esperan lugar).
+    Los ToolMessage se devuelven en el orden original de las llamadas, así un paso
+    con varias herramientas cuesta lo que la más lenta y no la suma de todas.
+    """
+    def __init__(self, tools, *, max_concurrency=4, timeout=30, timeouts=None, metrics=REGISTRY, **kwargs):
+        """
+        :param tools: Herramientas disponibles
+        :param max_concurrency: Máximo de herramientas ejecutándose a la vez en un paso
+        :param timeout: Segundos desde el inicio del paso que se espera a cada herramienta (None para no limitar)
+        :param timeouts: Timeouts particulares por nombre de herramienta
+        :param metrics: MetricsRegistry donde se registran los tiempos del nodo y de cada herramienta
+        """
+        super().__init__(tools, **kwargs)
+        self.max_concurrency = max(1, max_concurrency)
+        self.timeout = timeout
+        self.timeouts = timeouts or {}
+        self.metrics = metrics
+
+    def _get_calls(self, input):
+        if isinstance(input, list):
+            output_type = "list"
+            message = input[-1]
+        elif messages := input.get("messages", []):
+            output_type = "dict"
+            message = messages[-1]
+        else:
+            raise ValueError("No message found in input")
+
+        if not isinstance(message, AIMessage):
+            raise ValueError("Last message is not an AIMessage")
+        return output_type, message.tool_calls
+
+    def _get_timeout(self, call):
+        return self.timeouts.get(call["name"], self.timeout)
+
+    def _invalid_tool(self, call):
+        if call["name"] in self.tools_by_name:
+            return None
+        content = INVALID_TOOL_NAME_ERROR_TEMPLATE.format(
+            requested_tool=call["name"],
+            available_tools=", ".join(self.tools_by_name.keys()),
+        )
+        return ToolMessage(content, name=call["name"], tool_call_id=call["id"])
+
+    def _error(self, call, error):
+        self.metrics.inc("agent_tool_errors_total", tool=call["name"], reason="error")
+        if not self.handle_tool_errors:
+            raise error
+        content = TOOL_CALL_ERROR_TEMPLATE.format(error=repr(error))
+        return ToolMessage(content, name=call["name"], tool_call_id=call["id"])
+
+    def _timed_out(self, call):
+        self.metrics.inc("agent_tool_errors_total", tool=call["name"], reason="timeout")
+        content = TOOL_TIMEOUT_ERROR_TEMPLATE.format(requested_tool=call["name"], timeout=self._get_timeout(call))
+        return ToolMessage(content, name=call["name"], tool_call_id=call["id"])
+
+    def _run_one(self, call, config):
+        if invalid := self._invalid_tool(call):
+            return invalid
+        try:
+            with self.metrics.timer("agent_tool_seconds", tool=call["name"]):
+                return self.tools_by_name[call["name"]].invoke({**call, "type": "tool_call"}, config)
+        except Exception as e:
+            return self._error(call, e)
+
+    async def _arun_one(self, call, config):
+        if invalid := self._invalid_tool(call):
+            return invalid
+        start = perf_counter()
+        try:
+            return await self.tools_by_name[call["name"]].ainvoke({**call, "type": "tool_call"}, config)
+        except Exception as e:
+            return self._error(call, e)
+        finally:
+            self.metrics.observe("agent_tool_seconds", perf_counter() - start, tool=call["name"])
+
+    def _func(self, input, config):
+        with self.metrics.timer("agent_node_seconds", node=self.name):
+            return self._run_calls(input, config)
+
+    def _run_calls(self, input, config):
+        output_type, calls = self._get_calls(input)
+        executor = ContextThreadPoolExecutor(max_workers=min(self.max_concurrency, max(len(calls), 1)))
+        try:
+            submitted = monotonic()
+            futures = [executor.submit(self._run_one, call, config) for call in calls]
+            outputs = [self._wait(future, call, submitted) for future, call in zip(futures, calls)]
+        finally:
+            # Las herramientas que se pasaron del timeout siguen en su hilo, no se las espera.
+            executor.shutdown(wait=False)
+        return outputs if output_type == "list" else {"messages": outputs}
+
+    def _wait(self, future, call, submitted):
+        """
+        Espera el resultado de una llamada; el timeout corre desde que se encoló, así una
+        herramienta colgada no deja esperando sin límite a las que están detrás.
+        """
+        timeout = self._get_timeout(call)
+        try:
+            return future.result(timeout=None if timeout is None else max(0.0, submitted + timeout - monotonic()))
+        except FutureTimeoutError:
+            # Si todavía estaba en cola ya no se ejecuta.
+            future.cancel()
+            return self._timed_out(call)
+
+    async def _afunc(self, input, config):
+        with self.metrics.timer("agent_node_seconds", node=self.name):
+            return await self._arun_calls(input, config)
+
+    async def _arun_calls(self, input, config):
+        output_type, calls = self._get_calls(input)
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def run_one(call):
+            async with semaphore:
+                return await self._arun_one(call, config)
+
+        async def run(call):
+            # La espera por el semáforo también cuenta para el timeout.
+            try:
+                return await asyncio.wait_for(run_one(call), self._get_timeout(call))
+            except asyncio.TimeoutError:
+                return self._timed_out(call)
+
+        outputs = await asyncio.gather(*(run(call) for call in calls))
+        return outputs if output_type == "list" else {"messages": outputs}
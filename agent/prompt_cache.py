@@ -0,0 +1,95 @@
+import functools
+from copy import deepcopy
+
+from langchain_anthropic import ChatAnthropic, chat_models
+from langchain_core.messages import SystemMessage
+
+CACHE_CONTROL = {"type": "ephemeral"}
+CACHE_USAGE_KEYS = ("cache_creation_input_tokens", "cache_read_input_tokens")
+
+def _mark(block):
+    block = dict(block)
+    block["cache_control"] = CACHE_CONTROL
+    return block
+
+def _mark_last_block(message):
+    """
+    Copia del mensaje (en formato de la API) con un punto de caché en su último bloque.
+    """
+    content = message["content"]
+    if isinstance(content, str):
+        content = [{"type": "text", "text": content}]
+    if not content:
+        return message
+    return {**message, "content": [*content[:-1], _mark(content[-1])]}
+
+def cache_usage(usage):
+    """
+    Tokens leídos / escritos en la caché que informa la API en `usage`.
+    """
+    return {key: getattr(usage, key, None) or 0 for key in CACHE_USAGE_KEYS}
+
+def _with_cache_usage(make_chunk):
+    """
+    Envuelve la conversión de eventos del stream de langchain_anthropic para que el chunk de
+    message_start lleve en `response_metadata` los tokens de la caché (la 0.1.20 solo informa
+    input_tokens). Es el único punto de ChatAnthropic._stream / _astream donde se ve el evento.
+    """
+    @functools.wraps(make_chunk)
+    def wrapper(event, **kwargs):
+        chunk = make_chunk(event, **kwargs)
+        if chunk is not None and event.type == "message_start":
+            chunk.response_metadata.update(cache_usage(event.message.usage))
+        return chunk
+    wrapper.with_cache_usage = True
+    return wrapper
+
+if not getattr(chat_models._make_message_chunk_from_anthropic_event, "with_cache_usage", False):
+    chat_models._make_message_chunk_from_anthropic_event = _with_cache_usage(
+        chat_models._make_message_chunk_from_anthropic_event)
+
+class CachingChatAnthropic(ChatAnthropic):
+    """
+    ChatAnthropic que marca como cacheable el prefijo estable de cada llamada
+    (prompt caching de Anthropic) y devuelve en `response_metadata` los tokens leídos
+    y escritos en la caché.
+
+    Los puntos de caché van al final de las herramientas, del primer mensaje de sistema
+    (la personalidad, que no cambia) y del último mensaje, así la siguiente llamada del
+    mismo hilo reutiliza toda la historia anterior. Acepta varios SystemMessage seguidos
+    al inicio (personalidad y resumen de la conversación), que se mandan como bloques.
+
+    Solo se redefinen el armado del pedido y la salida sin stream; con stream los tokens
+    de la caché los agrega _with_cache_usage. Depende de langchain-anthropic 0.1.20 (ver
+    requirements.txt).
+    """
+    prompt_cache: bool = True
+    """Si es False solo se unen los mensajes de sistema, sin puntos de caché."""
+
+    def _get_request_payload(self, input_, *, stop=None, **kwargs):
+        messages = self._convert_input(input_).to_messages()
+        system = []
+        while messages and isinstance(messages[0], SystemMessage):
+            system.append(messages.pop(0).content)
+        payload = super()._get_request_payload(messages, stop=stop, **kwargs)
+        if not self.prompt_cache:
+            if system:
+                payload["system"] = "\n\n".join(system)
+            return payload
+
+        if system:
+            payload["system"] = [{"type": "text", "text": text} for text in system]
+            payload["system"][0] = _mark(payload["system"][0])
+        if payload.get("tools"):
+            # Las definiciones son las mismas en cada llamada: basta marcar la última.
+            tools = deepcopy(payload["tools"])
+            tools[-1] = _mark(tools[-1])
+            payload["tools"] = tools
+        if payload["messages"]:
+            payload["messages"] = [*payload["messages"][:-1], _mark_last_block(payload["messages"][-1])]
+        return payload
+
+    def _format_output(self, data, **kwargs):
+        result = super()._format_output(data, **kwargs)
+        result.generations[0].message.response_metadata.update(cache_usage(data.usage))
+        return result
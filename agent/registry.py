@@ -0,0 +1,180 @@
+import importlib.abc
+import logging
+import sys
+import threading
+from contextlib import contextmanager
+from time import perf_counter
+
+from langchain_core.tools import BaseTool
+
+logger = logging.getLogger(__name__)
+
+class _ImportTimer(importlib.abc.MetaPathFinder):
+    """
+    Finder que no carga nada: envuelve el exec_module de cada módulo importado para medir
+    cuánto tarda (incluyendo sus propios imports), como `python -X importtime`.
+    """
+    def __init__(self, report):
+        self.report = report
+        self.local = threading.local()
+
+    def find_spec(self, name, path, target=None):
+        if getattr(self.local, "searching", False):
+            return None
+        self.local.searching = True
+        try:
+            for finder in sys.meta_path:
+                if finder is self or not hasattr(finder, "find_spec"):
+                    continue
+                spec = finder.find_spec(name, path, target)
+                if spec is not None:
+                    break
+            else:
+                return None
+        finally:
+            self.local.searching = False
+        loader = spec.loader
+        # Solo loaders por módulo (archivos .py / extensiones), nunca clases compartidas.
+        if loader is None or isinstance(loader, type) or not hasattr(loader, "exec_module"):
+            return spec
+        exec_module = loader.exec_module
+        report = self.report
+        local = self.local
+
+        def timed_exec_module(module):
+            depth = getattr(local, "depth", 0)
+            local.depth = depth + 1
+            start = perf_counter()
+            try:
+                exec_module(module)
+            finally:
+                local.depth = depth
+                report.record_import(name, perf_counter() - start, depth)
+
+        loader.exec_module = timed_exec_module
+        return spec
+
+class StartupReport:
+    """
+    Tiempos del arranque: fases marcadas con `phase`, los imports más costosos de cada fase
+    y la creación diferida de clientes (LazyResource) cuando ocurre.
+    """
+    def __init__(self):
+        self.start = perf_counter()
+        self.lock = threading.Lock()
+        self.phases = []
+        self.imports = []
+        self.resources = []
+        self.current = None
+        self.timer = None
+
+    @contextmanager
+    def phase(self, name):
+        """
+        Mide un tramo del arranque (por ejemplo "import tools") y los imports que hace.
+        """
+        previous, self.current = self.current, name
+        if self.timer is None:
+            self.timer = _ImportTimer(self)
+            sys.meta_path.insert(0, self.timer)
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            with self.lock:
+                self.phases.append((name, perf_counter() - start))
+            self.current = previous
+            if previous is None and self.timer in sys.meta_path:
+                sys.meta_path.remove(self.timer)
+                self.timer = None
+
+    def record_import(self, module, seconds, depth):
+        with self.lock:
+            self.imports.append((self.current, module, seconds, depth))
+
+    def record_resource(self, name, seconds):
+        with self.lock:
+            self.resources.append((name, seconds))
+
+    def report(self, top=8):
+        """
+        Texto con las fases, los `top` imports de primer nivel más lentos de cada fase
+        y los recursos diferidos creados hasta ahora.
+        """
+        with self.lock:
+            phases, imports, resources = list(self.phases), list(self.imports), list(self.resources)
+        lines = [f"Startup: {perf_counter() - self.start:.2f}s since the report was created"]
+        for name, seconds in phases:
+            lines.append(f"  {name:<32} {seconds:7.3f}s")
+            slowest = sorted((item for item in imports if item[0] == name and item[3] == 0), key=lambda item: -item[2])
+            for _, module, module_seconds, _ in slowest[:top]:
+                lines.append(f"      import {module:<36} {module_seconds:7.3f}s")
+        for name, seconds in resources:
+            lines.append(f"  lazy {name:<27} {seconds:7.3f}s (first use)")
+        return "\n".join(lines)
+
+# Reporte del proceso; main.py y voice-main.py marcan sus fases de arranque en él.
+STARTUP = StartupReport()
+
+class LazyResource:
+    """
+    Cliente / credenciales que se crean la primera vez que se usan (una sola vez aunque
+    varios hilos lo pidan a la vez), para que importar las herramientas no haga I/O.
+    """
+    def __init__(self, name, factory, report=STARTUP):
+        """
+        :param name: Nombre que aparece en el reporte de arranque
+        :param factory: Función sin argumentos que crea el recurso
+        """
+        self.name = name
+        self.factory = factory
+        self.report = report
+        self.lock = threading.Lock()
+        self.value = None
+        self.ready = False
+
+    def get(self):
+        if not self.ready:
+            with self.lock:
+                if not self.ready:
+                    start = perf_counter()
+                    self.value = self.factory()
+                    self.ready = True
+                    self.report.record_resource(self.name, perf_counter() - start)
+                    logger.info("Created %s in %.2fs", self.name, perf_counter() - start)
+        return self.value
+
+    def reset(self):
+        """
+        Descarta el recurso para recrearlo en el próximo uso (por ejemplo si vencieron las credenciales).
+        """
+        with self.lock:
+            self.value = None
+            self.ready = False
+
+class LazyTool(BaseTool):
+    """
+    Herramienta que expone desde el registro el nombre, la descripción y el esquema de
+    `tool_class`, pero crea la instancia real (con su cliente) recién en la primera llamada.
+    """
+    resource: LazyResource
+
+    class Config:
+        arbitrary_types_allowed = True
+
+    def _run(self, run_manager=None, **kwargs):
+        return self.resource.get().run(kwargs, callbacks=run_manager.get_child() if run_manager else None)
+
+def lazy_tool(tool_class, factory, name=None):
+    """
+    Registra `tool_class` (una subclase de BaseTool) sin instanciarla.
+
+    :param factory: Función sin argumentos que devuelve la instancia real de la herramienta
+    """
+    fields = tool_class.__fields__
+    return LazyTool(
+        name=fields["name"].default,
+        description=fields["description"].default,
+        args_schema=fields["args_schema"].default,
+        resource=LazyResource(name or fields["name"].default, factory),
+    )
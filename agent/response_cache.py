@@ -0,0 +1,138 @@
+import threading
+import zlib
+from time import monotonic, perf_counter
+
+import numpy as np
+
+from agent.metrics import REGISTRY
+from agent.text import normalize_prompt, strip_accents
+
+class HashingEmbedder:
+    """
+    Embedding liviano sin modelo: n-gramas de caracteres y palabras proyectados con un hash
+    estable a un vector de `dim` dimensiones. Alcanza para reconocer la misma pregunta dicha
+    con pequeñas variaciones; para paráfrasis se puede pasar cualquier `embed` (por ejemplo
+    `Embeddings.embed_query` de LangChain).
+    """
+    def __init__(self, dim=1024, ngram=3):
+        self.dim = dim
+        self.ngram = ngram
+
+    def __call__(self, text):
+        text = strip_accents(text)
+        padded = f" {text} "
+        features = [padded[i:i + self.ngram] for i in range(max(1, len(padded) - self.ngram + 1))]
+        features += text.split()
+        indices = [zlib.crc32(feature.encode()) % self.dim for feature in features]
+        return np.bincount(indices, minlength=self.dim).astype(np.float32)
+
+class ResponseCache:
+    """
+    Caché semántica de respuestas: guarda el texto de la respuesta final por el embedding
+    de la pregunta y responde una pregunta nueva si la más parecida supera `threshold`
+    de similitud coseno. Las entradas vencen a los `ttl` segundos y al llenarse se
+    descarta la menos usada recientemente.
+
+    Solo se guardan respuestas que no usaron herramientas, o que usaron únicamente
+    herramientas de `cacheable_tools`: el clima, las tareas o el correo cambian, y las
+    herramientas con efectos (posturas, crear tareas) no se pueden saltar.
+
+    La clave es solo la pregunta y la caché se comparte entre todos los hilos del proceso:
+    AgentHandler solo guarda respuestas de turnos sin historia previa ni resumen, que no
+    dependen de la conversación. Los agentes con otra personalidad (system_prompt) deben
+    usar su propia ResponseCache.
+    """
+    def __init__(self, embed=None, threshold=0.92, ttl=3600, max_entries=512, min_words=3,
+                 cacheable_tools=(), metrics=REGISTRY):
+        """
+        :param embed: Función texto -> vector, por defecto HashingEmbedder
+        :param threshold: Similitud coseno mínima para considerar la misma pregunta
+        :param ttl: Segundos que vale una respuesta guardada
+        :param max_entries: Cantidad máxima de respuestas guardadas
+        :param min_words: Preguntas más cortas (del estilo "¿y mañana?") dependen de la conversación y no se cachean
+        :param cacheable_tools: Herramientas cuyo resultado no cambia y no tienen efectos
+        """
+        self.embed = embed or HashingEmbedder()
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.min_words = min_words
+        self.cacheable_tools = set(cacheable_tools)
+        self.metrics = metrics
+        self.lock = threading.Lock()
+        self.vectors = None
+        self.answers = [None] * max_entries
+        self.questions = [None] * max_entries
+        self.created = np.zeros(max_entries)
+        self.used = np.zeros(max_entries)
+        self.valid = np.zeros(max_entries, dtype=bool)
+
+    def _vector(self, text):
+        vector = np.asarray(self.embed(text), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _cacheable_question(self, text):
+        return len(normalize_prompt(text).split()) >= self.min_words
+
+    def lookup(self, text):
+        """
+        Devuelve la respuesta guardada para una pregunta equivalente, o None.
+        """
+        if not self._cacheable_question(text):
+            self.metrics.inc("agent_response_cache_total", result="bypass")
+            return None
+        start = perf_counter()
+        vector = self._vector(text)
+        now = monotonic()
+        answer = None
+        with self.lock:
+            if self.vectors is not None:
+                self.valid &= self.created > now - self.ttl
+                similarity = np.where(self.valid, self.vectors @ vector, -1.0)
+                best = int(np.argmax(similarity))
+                if similarity[best] >= self.threshold:
+                    self.used[best] = now
+                    answer = self.answers[best]
+        self.metrics.observe("agent_response_cache_seconds", perf_counter() - start)
+        self.metrics.inc("agent_response_cache_total", result="hit" if answer is not None else "miss")
+        return answer
+
+    def store(self, text, answer, tools_used=()):
+        """
+        Guarda la respuesta de una pregunta si no dependió de herramientas que cambian.
+        """
+        if not answer or not self._cacheable_question(text):
+            return False
+        if any(tool not in self.cacheable_tools for tool in tools_used):
+            self.metrics.inc("agent_response_cache_total", result="skip_tools")
+            return False
+        vector = self._vector(text)
+        now = monotonic()
+        with self.lock:
+            if self.vectors is None:
+                self.vectors = np.zeros((self.max_entries, vector.shape[0]), dtype=np.float32)
+            self.valid &= self.created > now - self.ttl
+            # Si ya hay una pregunta equivalente se reemplaza, si no el lugar libre o el menos usado.
+            similarity = np.where(self.valid, self.vectors @ vector, -1.0)
+            if similarity.max() >= self.threshold:
+                slot = int(np.argmax(similarity))
+            elif not self.valid.all():
+                slot = int(np.argmin(self.valid))
+            else:
+                slot = int(np.argmin(self.used))
+            self.vectors[slot] = vector
+            self.answers[slot] = answer
+            self.questions[slot] = text
+            self.created[slot] = now
+            self.used[slot] = now
+            self.valid[slot] = True
+        return True
+
+    def clear(self):
+        with self.lock:
+            self.valid[:] = False
+
+    def __len__(self):
+        with self.lock:
+            return int((self.valid & (self.created > monotonic() - self.ttl)).sum())
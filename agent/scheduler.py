@@ -0,0 +1,158 @@
+import asyncio
+import itertools
+import threading
+from contextlib import asynccontextmanager, contextmanager
+from time import monotonic
+
+from agent.metrics import REGISTRY
+
+# Clases de prioridad: menor número, antes se atiende.
+PRIORITIES = {"voice": 0, "web": 1, "batch": 2}
+
+class _Entry:
+    """
+    Un turno esperando lugar: lo espera un future de su event loop (slot) o un
+    threading.Event (sync_slot).
+    """
+    def __init__(self, priority, seq, thread_id, loop=None):
+        self.priority = priority
+        self.seq = seq
+        self.thread_id = thread_id
+        self.enqueued = monotonic()
+        self.loop = loop
+        self.future = loop.create_future() if loop is not None else None
+        self.event = threading.Event() if loop is None else None
+
+class TurnScheduler:
+    """
+    Decide cuándo corre cada turno del agente, tanto de la API async como de los caminos
+    sincrónicos de voz (prompt, response, chat).
+
+    - Un hilo de conversación tiene a lo sumo un turno en curso; los siguientes esperan
+      en orden de llegada, así dos llamadas con el mismo thread_id no mezclan escrituras
+      en la historia del checkpoint.
+    - Hilos distintos corren en paralelo hasta `max_concurrency` turnos en total, lo que
+      también limita las llamadas simultáneas al modelo del proceso.
+    - Cuando se libera un lugar pasa primero el turno de mayor prioridad (voz antes que
+      web); cada `aging` segundos de espera un turno sube una clase, para que una carga
+      constante de voz no deje esperando para siempre a la web.
+
+    El tiempo en cola se registra en agent_queue_wait_seconds{priority}. Se puede usar
+    desde varios hilos y event loops a la vez.
+    """
+    def __init__(self, max_concurrency=8, aging=10, metrics=REGISTRY):
+        """
+        :param max_concurrency: Turnos que pueden correr a la vez
+        :param aging: Segundos de espera que equivalen a una clase de prioridad (None para prioridad estricta)
+        :param metrics: MetricsRegistry donde se registran la espera y el tamaño de la cola
+        """
+        self.max_concurrency = max(1, max_concurrency)
+        self.aging = aging
+        self.metrics = metrics
+        self.running = set()
+        self.waiting = []
+        self.counter = itertools.count()
+        self.lock = threading.Lock()
+
+    def _rank(self, entry, now):
+        if not self.aging:
+            return entry.priority, entry.seq
+        return entry.priority - (now - entry.enqueued) / self.aging, entry.seq
+
+    def _dispatch(self):
+        """
+        Asigna los lugares libres (con el lock tomado) y devuelve los turnos que hay que despertar.
+        """
+        now = monotonic()
+        granted = []
+        while len(self.running) < self.max_concurrency:
+            # Solo el turno más antiguo de cada hilo libre puede empezar.
+            heads = {}
+            for entry in self.waiting:
+                heads.setdefault(entry.thread_id, entry)
+            eligible = [entry for thread_id, entry in heads.items() if thread_id not in self.running]
+            if not eligible:
+                break
+            entry = min(eligible, key=lambda entry: self._rank(entry, now))
+            self.waiting.remove(entry)
+            self.running.add(entry.thread_id)
+            granted.append(entry)
+        self.metrics.set("agent_scheduler_running", len(self.running))
+        self.metrics.set("agent_scheduler_waiting", len(self.waiting))
+        return granted
+
+    def _wake(self, granted):
+        for entry in granted:
+            if entry.event is not None:
+                entry.event.set()
+            else:
+                entry.loop.call_soon_threadsafe(self._grant, entry)
+
+    def _grant(self, entry):
+        # Corre en el loop del turno; si se canceló mientras se le daba el lugar, se devuelve.
+        if entry.future.done():
+            self._finish(entry.thread_id)
+        else:
+            entry.future.set_result(None)
+
+    def _enqueue(self, entry):
+        with self.lock:
+            self.waiting.append(entry)
+            granted = self._dispatch()
+        self._wake(granted)
+
+    def _finish(self, thread_id):
+        with self.lock:
+            self.running.discard(thread_id)
+            granted = self._dispatch()
+        self._wake(granted)
+
+    def _entry(self, thread_id, priority, loop=None):
+        if priority not in PRIORITIES:
+            raise ValueError(f"Unknown priority {priority!r}, expected one of {', '.join(PRIORITIES)}")
+        return _Entry(PRIORITIES[priority], next(self.counter), str(thread_id), loop)
+
+    @asynccontextmanager
+    async def slot(self, thread_id, priority="web"):
+        """
+        Espera el turno de `thread_id` y lo mantiene reservado mientras dura el bloque.
+
+        :param priority: Clase de PRIORITIES
+        """
+        entry = self._entry(thread_id, priority, asyncio.get_running_loop())
+        self._enqueue(entry)
+        try:
+            await entry.future
+        except BaseException:
+            if not entry.future.cancelled():
+                # El lugar ya se había dado cuando se canceló la tarea: se devuelve.
+                self._finish(entry.thread_id)
+            else:
+                # Si ya se le dio el lugar, _grant lo devuelve al ver el future cancelado.
+                with self.lock:
+                    if entry in self.waiting:
+                        self.waiting.remove(entry)
+                    granted = self._dispatch()
+                self._wake(granted)
+            raise
+        self.metrics.observe("agent_queue_wait_seconds", monotonic() - entry.enqueued, priority=priority)
+        try:
+            yield
+        finally:
+            self._finish(entry.thread_id)
+
+    @contextmanager
+    def sync_slot(self, thread_id, priority="voice"):
+        """
+        Igual que slot, bloqueando el hilo que llama. No usar desde un event loop.
+
+        :param priority: Clase de PRIORITIES
+        """
+        entry = self._entry(thread_id, priority)
+        self._enqueue(entry)
+        entry.event.wait()
+        self.metrics.observe("agent_queue_wait_seconds", monotonic() - entry.enqueued, priority=priority)
+        try:
+            yield
+        finally:
+            self._finish(entry.thread_id)
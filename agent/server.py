@@ -0,0 +1,216 @@
+import asyncio
+import json
+import logging
+import uuid
+from time import perf_counter
+
+from aiohttp import web
+
+from agent.scheduler import PRIORITIES
+
+logger = logging.getLogger(__name__)
+
+class EventStream:
+    """
+    Misma interfaz que SpeechStream (begin, token, tool_call, end, close), pero en lugar de
+    hablar deja los eventos en una cola asyncio para mandarlos al cliente por SSE.
+    """
+    def __init__(self, loop):
+        self.loop = loop
+        self.queue = asyncio.Queue()
+        self.skipping = False
+
+    def _put(self, event, data):
+        # El nodo del modelo puede correr fuera del hilo del event loop.
+        self.loop.call_soon_threadsafe(self.queue.put_nowait, (event, data))
+
+    def begin(self, hold=False):
+        pass
+
+    def token(self, text):
+        if not self.skipping:
+            self._put("token", {"text": text})
+
+    def tool_call(self):
+        if not self.skipping:
+            self.skipping = True
+            self._put("tool_call", {})
+
+    def end(self):
+        self.skipping = False
+        self._put("message_end", {})
+
+    def close(self):
+        self._put(None, None)
+
+class AgentServer:
+    """
+    Servicio HTTP sobre un AgentHandler ya cargado, para que la interfaz web, el bucle de
+    voz y cada robot compartan un mismo proceso con las herramientas y credenciales listas.
+
+    - POST /chat {"message", "thread_id", "stream", "priority"}: con stream (por defecto) la
+      respuesta llega por Server-Sent Events (token, tool_call, message_end, done); sin
+      stream, en JSON. Los robots mandan priority "voice" para pasar antes que la web. Sin
+      thread_id (ni cabecera X-Thread-Id) el turno abre un hilo nuevo, cuyo id vuelve en la
+      respuesta para seguir la conversación.
+    - GET /healthz: el proceso responde. GET /readyz: acepta turnos (503 mientras se drena).
+    - GET /metrics: el MetricsRegistry del agente en formato Prometheus.
+
+    Se admiten hasta max_concurrency turnos del agente corriendo más `max_pending`
+    esperando; por encima se responde 429 con Retry-After. Al apagarse deja de aceptar
+    turnos y espera hasta `drain_timeout` segundos a que terminen los que están en curso,
+    incluidos los que ya respondieron y siguen resumiendo la historia.
+    Si el cliente se desconecta el turno termina igual, para que la historia del hilo quede completa.
+    """
+    def __init__(self, agent, max_pending=16, drain_timeout=30, retry_after=1, metrics=None):
+        """
+        :param agent: AgentHandler que atiende los turnos
+        :param max_pending: Turnos que pueden esperar lugar además de los que están corriendo
+        :param drain_timeout: Segundos que se espera a los turnos en curso al apagar
+        :param retry_after: Segundos que se sugieren al cliente en las respuestas 429
+        :param metrics: MetricsRegistry, por defecto el del agente
+        """
+        self.agent = agent
+        self.max_inflight = agent.max_concurrency + max_pending
+        self.drain_timeout = drain_timeout
+        self.retry_after = retry_after
+        self.metrics = metrics if metrics is not None else agent.metrics
+        self.inflight = 0
+        self.draining = False
+        self.idle = None
+
+    def app(self):
+        app = web.Application(middlewares=[self._observe])
+        app.router.add_get("/healthz", self.health)
+        app.router.add_get("/readyz", self.ready)
+        app.router.add_get("/metrics", self.prometheus)
+        app.router.add_post("/chat", self.chat)
+        app.on_shutdown.append(self._drain)
+        app.on_cleanup.append(self._close)
+        return app
+
+    @web.middleware
+    async def _observe(self, request, handler):
+        start = perf_counter()
+        status = 500
+        try:
+            response = await handler(request)
+            status = response.status
+            return response
+        except web.HTTPException as e:
+            status = e.status
+            raise
+        finally:
+            self.metrics.observe("agent_http_seconds", perf_counter() - start, path=request.path)
+            self.metrics.inc("agent_http_requests_total", path=request.path, status=status)
+
+    async def health(self, request):
+        return web.json_response({"status": "ok"})
+
+    async def ready(self, request):
+        if self.draining:
+            return web.json_response({"status": "draining", "inflight": self.inflight}, status=503)
+        return web.json_response({"status": "ready", "inflight": self.inflight, "capacity": self.max_inflight})
+
+    async def prometheus(self, request):
+        return web.Response(text=self.metrics.to_prometheus(), content_type="text/plain", charset="utf-8")
+
+    def _admit(self):
+        """
+        Reserva un lugar para un turno o rechaza el pedido (503 al drenar, 429 si no hay lugar).
+        """
+        if self.draining:
+            self.metrics.inc("agent_http_rejected_total", reason="draining")
+            raise web.HTTPServiceUnavailable(text="Server is shutting down")
+        if self.inflight >= self.max_inflight:
+            self.metrics.inc("agent_http_rejected_total", reason="saturated")
+            raise web.HTTPTooManyRequests(text="Too many turns in progress", headers={"Retry-After": str(self.retry_after)})
+        self.inflight += 1
+        self.metrics.set("agent_http_inflight", self.inflight)
+
+    def _release(self, task):
+        self.inflight -= 1
+        self.metrics.set("agent_http_inflight", self.inflight)
+        if self.inflight == 0 and self.idle is not None:
+            self.idle.set()
+
+    async def _read_request(self, request):
+        try:
+            body = await request.json()
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            raise web.HTTPBadRequest(text="Body must be JSON")
+        message = body.get("message") if isinstance(body, dict) else None
+        if not isinstance(message, str) or not message.strip():
+            raise web.HTTPBadRequest(text='"message" is required')
+        # Sin hilo explícito no se usa el del agente: lo compartirían todos los clientes.
+        thread_id = body.get("thread_id") or request.headers.get("X-Thread-Id") or uuid.uuid4().hex
+        priority = body.get("priority") or request.headers.get("X-Priority", "web")
+        if priority not in PRIORITIES:
+            raise web.HTTPBadRequest(text=f'"priority" must be one of {", ".join(PRIORITIES)}')
+        stream = body.get("stream", True)
+        if not isinstance(stream, bool):
+            raise web.HTTPBadRequest(text='"stream" must be true or false')
+        return message, str(thread_id), priority, stream
+
+    async def chat(self, request):
+        message, thread_id, priority, stream = await self._read_request(request)
+        self._admit()
+        start = perf_counter()
+        events = EventStream(asyncio.get_running_loop()) if stream else None
+        # El turno corre en su propia tarea: si el cliente se va, se completa igual.
+        task = asyncio.create_task(self.agent.aprompt(message, thread_id, stream=events, priority=priority))
+        task.add_done_callback(self._release)
+        if not stream:
+            reply = await asyncio.shield(task)
+            return web.json_response({"reply": reply, "thread_id": thread_id, "seconds": perf_counter() - start})
+
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream", "Cache-Control": "no-cache",
+                                               "X-Accel-Buffering": "no"})
+        await response.prepare(request)
+        connected = True
+        while True:
+            event, data = await events.queue.get()
+            if event is None:
+                break
+            if connected:
+                connected = await self._send(response, event, data)
+        reply = await asyncio.shield(task)
+        if connected:
+            await self._send(response, "done", {"reply": reply, "thread_id": thread_id, "seconds": perf_counter() - start})
+            await response.write_eof()
+        return response
+
+    async def _send(self, response, event, data):
+        try:
+            await response.write(f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n".encode())
+            return True
+        except (ConnectionResetError, RuntimeError):
+            logger.info("Client disconnected, finishing the turn without streaming")
+            return False
+
+    async def _drain(self, app):
+        self.draining = True
+        if self.inflight:
+            logger.info("Draining %d turns in progress", self.inflight)
+            self.idle = asyncio.Event()
+        try:
+            await asyncio.wait_for(self._settled(), self.drain_timeout)
+        except asyncio.TimeoutError:
+            logger.warning("%d turns still running after %ss, shutting down anyway", self.inflight, self.drain_timeout)
+
+    async def _settled(self):
+        if self.idle is not None:
+            await self.idle.wait()
+        # Los turnos ya respondidos pueden seguir resumiendo la historia antes de cerrar la base.
+        await self.agent.asettle()
+
+    async def _close(self, app):
+        if self.agent.memory:
+            self.agent.checkpointer.close()
+
+def run(agent, host="0.0.0.0", port=8080, max_pending=16, drain_timeout=30):
+    """
+    Sirve `agent` hasta recibir SIGINT / SIGTERM.
+    """
+    server = AgentServer(agent, max_pending=max_pending, drain_timeout=drain_timeout)
+    web.run_app(server.app(), host=host, port=port, shutdown_timeout=drain_timeout + 5, print=None)
@@ -0,0 +1,215 @@
+import logging
+import uuid
+import threading
+
+from langchain_core.messages import AIMessage, RemoveMessage
+from langgraph.checkpoint.memory import MemorySaver
+
+from agent.context import message_text
+from agent.speech_stream import SpeechStream
+from agent.text import normalize_prompt
+
+logger = logging.getLogger(__name__)
+
+class SpeculativeRun:
+    """
+    Una ejecución del grafo lanzada sobre una transcripción parcial.
+    """
+    def __init__(self, prompt):
+        self.prompt = prompt
+        self.key = normalize_prompt(prompt)
+        self.confirmed = threading.Event()
+        self.cancelled = threading.Event()
+        # Se activa al confirmar o cancelar, libera la ejecución detenida antes de las herramientas.
+        self.resume = threading.Event()
+        self.done = threading.Event()
+        # Se activa cuando ya se copió el hilo real (o la ejecución falló antes).
+        self.forked = threading.Event()
+        self.lock = threading.Lock()
+        # Mensajes que se imprimen / hablan cuando la transcripción final confirme la ejecución.
+        self.pending = []
+        self.messages = []
+        self.summary = None
+        self.summary_at_fork = None
+        self.history_ids = []
+        self.graph = None
+        self.error = None
+        self.speech = None
+
+class SpeculativeRunner:
+    """
+    Adelanta la llamada al agente mientras el usuario termina de hablar.
+
+    `start` lanza el grafo con una transcripción parcial estable sobre una copia del hilo
+    (un checkpointer en memoria propio de cada ejecución), sin hablar ni ejecutar
+    herramientas todavía. `finish` recibe la transcripción final: si coincide y el hilo real
+    no cambió desde la copia, se conserva el resultado y se copia al hilo real; si no, se
+    cancela y se ejecuta `prompt` como siempre.
+    """
+    def __init__(self, handler):
+        """
+        :param handler: AgentHandler (o NaoAgent) que atiende la conversación
+        """
+        self.handler = handler
+        # Las ejecuciones especulativas nunca escriben en el checkpointer real.
+        self.builder = handler._build_graph() if handler.memory else None
+        self.run = None
+        self.lock = threading.Lock()
+        self.stats = {"started": 0, "hits": 0, "misses": 0}
+
+    def start(self, prompt):
+        """
+        Lanza (o relanza si el texto cambió) la ejecución especulativa para una parcial.
+        """
+        key = normalize_prompt(prompt)
+        if not key:
+            return
+        with self.lock:
+            if self.run and self.run.key == key and not self.run.cancelled.is_set():
+                return
+            self._cancel(self.run)
+            run = SpeculativeRun(prompt)
+            self.run = run
+            self.stats["started"] += 1
+        threading.Thread(target=self._execute, args=(run,), daemon=True).start()
+
+    def finish(self, prompt):
+        """
+        Atiende la transcripción final, usando la ejecución especulativa si coincide.
+        """
+        with self.lock:
+            run, self.run = self.run, None
+        if run and run.key == normalize_prompt(prompt) and not run.cancelled.is_set():
+            # _fork también reserva el hilo para leerlo: tiene que haber terminado antes.
+            run.forked.wait()
+            # El hilo queda reservado hasta copiar el resultado, como un turno de voz normal.
+            with self.handler.scheduler.sync_slot(self._thread_id(), "voice"):
+                if self._current(run):
+                    # Igual que en prompt(): lo que quedaba de la respuesta anterior se corta.
+                    self.handler.stop_speaking()
+                    self._release(run)
+                    run.done.wait()
+                    if run.error is None and not run.cancelled.is_set():
+                        self._commit(run)
+                        self.stats["hits"] += 1
+                        return
+        self._cancel(run)
+        self.stats["misses"] += 1
+        self.handler.prompt(prompt)
+
+    def cancel(self):
+        with self.lock:
+            run, self.run = self.run, None
+        self._cancel(run)
+
+    def _cancel(self, run):
+        if run:
+            run.cancelled.set()
+            run.resume.set()
+
+    def _thread_id(self):
+        return self.handler.config["configurable"]["thread_id"]
+
+    def _current(self, run):
+        """
+        True si el hilo real sigue como estaba al copiarlo (otro turno, por ejemplo de la
+        web, no escribió en el medio).
+        """
+        if not self.handler.memory:
+            return True
+        values = self.handler.graph.get_state(self.handler.config).values
+        return ([message.id for message in values.get("messages", [])] == run.history_ids
+                and (values.get("summary") or None) == (run.summary_at_fork or None))
+
+    def _release(self, run):
+        """
+        Confirma la ejecución: muestra / habla lo pendiente y deja correr las herramientas.
+        """
+        with run.lock:
+            run.confirmed.set()
+            run.speech = SpeechStream(self.handler.speak)
+            for message in run.pending:
+                self._output(run, message)
+            run.pending = []
+        run.resume.set()
+
+    def _output(self, run, message):
+        # Por oraciones, como el resto de los caminos de voz; los mensajes con herramientas no se hablan.
+        if isinstance(message, AIMessage) and not message.tool_calls:
+            run.speech.begin()
+            run.speech.token(message_text(message))
+            run.speech.end()
+        message.pretty_print()
+
+    def _emit(self, run, message):
+        with run.lock:
+            if not run.confirmed.is_set():
+                run.pending.append(message)
+                return
+            self._output(run, message)
+
+    def _fork(self, run):
+        """
+        Copia la historia del hilo real a un grafo especulativo con su propio checkpointer
+        en memoria, que se descarta con la ejecución.
+        """
+        if not self.handler.memory:
+            run.graph = self.handler.graph
+            return self.handler.config
+        run.graph = self.builder.compile(checkpointer=MemorySaver())
+        config = {"configurable": {"thread_id": f"spec-{uuid.uuid4().hex}"}}
+        with self.handler.scheduler.sync_slot(self._thread_id(), "voice"):
+            values = self.handler.graph.get_state(self.handler.config).values
+        history = values.get("messages", [])
+        if history:
+            run.graph.update_state(config, {"messages": history, "summary": values.get("summary") or ""}, as_node="context")
+        run.history_ids = [message.id for message in history]
+        run.summary = run.summary_at_fork = values.get("summary")
+        return config
+
+    def _execute(self, run):
+        stream = None
+        try:
+            config = self._fork(run)
+            run.forked.set()
+            stream = run.graph.stream({"messages": [("user", run.prompt)]}, config, stream_mode="values")
+            last_id = None
+            for event in stream:
+                if run.cancelled.is_set():
+                    return
+                run.messages = event["messages"]
+                run.summary = event.get("summary")
+                message = event["messages"][-1]
+                if message.id == last_id:
+                    continue
+                last_id = message.id
+                self._emit(run, message)
+                # Las herramientas pueden tener efectos (crear tareas, mover al robot),
+                # no se ejecutan hasta que la transcripción final confirme la ejecución.
+                if isinstance(message, AIMessage) and message.tool_calls and not run.confirmed.is_set():
+                    run.resume.wait()
+                    if run.cancelled.is_set():
+                        return
+        except Exception as e:
+            run.error = e
+            logger.exception("Error occurred in speculative run: %s", e)
+        finally:
+            if stream is not None:
+                stream.close()
+            run.forked.set()
+            run.done.set()
+
+    def _commit(self, run):
+        """
+        Agrega al hilo real los mensajes producidos por la ejecución especulativa, y quita
+        los que se hayan resumido durante ella. Quien llama tiene reservado el hilo (finish).
+        """
+        self.handler._remember_answer(run.prompt, run.messages, run.summary)
+        if not self.handler.memory:
+            return
+        kept = {message.id for message in run.messages}
+        history = set(run.history_ids)
+        update = [RemoveMessage(id=id) for id in run.history_ids if id not in kept]
+        update += [message for message in run.messages if message.id not in history]
+        if update:
+            self.handler.graph.update_state(self.handler.config, {"messages": update, "summary": run.summary or ""}, as_node="context")
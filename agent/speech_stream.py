@@ -0,0 +1,120 @@
+import re
+import logging
+
+# Fin de oración: puntuación seguida de espacio (no corta "3.5") o saltos de línea.
+SENTENCE_END = re.compile(r'[.!?…]+["\')\]»]*\s+|\n+')
+# Fin de cláusula, solo se usa cuando la oración ya es larga.
+CLAUSE_END = re.compile(r'[,;:]\s+')
+
+logger = logging.getLogger(__name__)
+
+class SentenceChunker:
+    """
+    Acumula el texto que llega token a token y lo entrega por oraciones (o cláusulas
+    si una oración se alarga), que es la unidad que se manda a la síntesis de voz.
+    """
+    def __init__(self, min_clause_chars=60):
+        """
+        :param min_clause_chars: Largo a partir del cual se corta en una coma / punto y coma
+        """
+        self.min_clause_chars = min_clause_chars
+        self.buffer = ""
+
+    def feed(self, text):
+        """
+        Agrega texto y devuelve la lista de fragmentos completos.
+        """
+        self.buffer += text
+        chunks = []
+        while True:
+            match = SENTENCE_END.search(self.buffer)
+            if match:
+                cut = match.end()
+            elif len(self.buffer) >= self.min_clause_chars and (clauses := list(CLAUSE_END.finditer(self.buffer))):
+                cut = clauses[-1].end()
+            else:
+                break
+            chunk, self.buffer = self.buffer[:cut].strip(), self.buffer[cut:]
+            if chunk:
+                chunks.append(chunk)
+        return chunks
+
+    def flush(self):
+        """
+        Devuelve lo que quede pendiente (el final del mensaje).
+        """
+        rest, self.buffer = self.buffer.strip(), ""
+        return rest
+
+class SpeechStream:
+    """
+    Recibe los tokens del modelo durante un turno y los manda a `speak` por oraciones,
+    en orden. `speak` solo encola (AgentHandler.speak usa el SpeechWorker de agent.tts),
+    así el stream del modelo nunca espera a la síntesis.
+
+    Los mensajes que llaman herramientas no se hablan. Como Anthropic manda el texto antes
+    que el bloque tool_use, cuando es probable que el mensaje llame herramientas
+    (`begin(hold=True)`) las oraciones se retienen hasta que termina sin llamar ninguna. Si
+    no, se hablan a medida que llegan y, si igual aparece una llamada, se descarta lo que venga
+    después de ella.
+    """
+    def __init__(self, speak, min_clause_chars=60):
+        """
+        :param speak: Función que encola un texto para sintetizarlo
+        """
+        self.speak = speak
+        self.chunker = SentenceChunker(min_clause_chars=min_clause_chars)
+        self.skipping = False
+        self.hold = False
+        self.pending = []
+
+    def begin(self, hold=False):
+        """
+        Inicio de un mensaje del modelo.
+
+        :param hold: Es probable que el mensaje termine en una llamada a herramientas
+        """
+        self.hold = hold
+
+    def token(self, text):
+        if self.skipping:
+            return
+        for chunk in self.chunker.feed(text):
+            self._say(chunk)
+
+    def tool_call(self):
+        """
+        El mensaje en curso llama herramientas: se descarta el texto retenido y el que falte.
+        """
+        self.skipping = True
+        self.pending = []
+        self.chunker.flush()
+
+    def end(self):
+        """
+        Fin del mensaje en curso.
+        """
+        rest = self.chunker.flush()
+        if rest and not self.skipping:
+            self._say(rest)
+        pending, self.pending = self.pending, []
+        self.skipping = self.hold = False
+        for chunk in pending:
+            self._speak(chunk)
+
+    def close(self):
+        """
+        Las frases ya están en la cola de `speak`; no queda nada que cerrar.
+        """
+
+    def _say(self, chunk):
+        if self.hold:
+            self.pending.append(chunk)
+        else:
+            self._speak(chunk)
+
+    def _speak(self, chunk):
+        try:
+            self.speak(chunk)
+        except Exception as e:
+            logger.exception("Error occurred while speaking: %s", e)
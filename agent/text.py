@@ -0,0 +1,22 @@
+import re
+import unicodedata
+
+def normalize_prompt(text):
+    """
+    Texto en minúsculas, sin puntuación y con los espacios colapsados. Sirve para comparar
+    una transcripción parcial con la final y como clave de las cachés.
+    """
+    return " ".join(re.sub(r"[^\w ]", " ", str(text).lower()).split())
+
+def strip_accents(text):
+    """
+    normalize_prompt sin tildes: la transcripción a veces las pone y a veces no.
+    """
+    return unicodedata.normalize("NFKD", normalize_prompt(text)).encode("ascii", "ignore").decode()
+
+def normalize_text(text):
+    """
+    Texto en minúsculas, sin puntuación ni tildes, con un espacio a cada lado para
+    buscar palabras enteras (" list ") o por prefijo (" llov").
+    """
+    return " " + strip_accents(text) + " "
@@ -0,0 +1,160 @@
+import copy
+import functools
+import inspect
+import json
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from time import monotonic
+
+from agent.metrics import REGISTRY
+
+def make_key(signature, args, kwargs, round_floats=None):
+    """
+    Clave de caché a partir de los argumentos normalizados: con los valores por defecto
+    aplicados, sin importar si se pasaron por posición o por nombre, con los textos sin
+    espacios sobrantes y los decimales redondeados a `round_floats` cifras.
+    """
+    bound = signature.bind(*args, **kwargs)
+    bound.apply_defaults()
+
+    def normalize(value):
+        if isinstance(value, float) and round_floats is not None:
+            return round(value, round_floats)
+        if isinstance(value, str):
+            return value.strip()
+        if isinstance(value, dict):
+            return {str(key): normalize(item) for key, item in value.items()}
+        if isinstance(value, (list, tuple)):
+            return [normalize(item) for item in value]
+        return value
+
+    return json.dumps({name: normalize(value) for name, value in bound.arguments.items()}, sort_keys=True, default=str)
+
+class ToolResultCache:
+    """
+    Caché LRU de resultados de herramientas, compartida entre conversaciones.
+
+    Cada entrada vence según el TTL de su herramienta. Si llegan a la vez varias llamadas
+    idénticas solo la primera ejecuta la herramienta y el resto espera su resultado
+    (single-flight). `invalidate` descarta las entradas de una herramienta, por ejemplo
+    cuando una herramienta que modifica datos se ejecuta.
+    """
+    def __init__(self, max_entries=512, metrics=REGISTRY):
+        self.max_entries = max_entries
+        self.metrics = metrics
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.inflight = {}
+        # Se incrementa al invalidar, para no guardar un resultado que empezó antes.
+        self.generations = {}
+        self.counts = {}
+
+    def _count(self, tool, result):
+        counts = self.counts.setdefault(tool, {"hits": 0, "misses": 0, "coalesced": 0, "invalidations": 0})
+        counts[result] += 1
+        self.metrics.inc("agent_tool_cache_total", tool=tool, result=result)
+
+    def call(self, tool, key, ttl, function, cache_if=None):
+        """
+        Devuelve el resultado guardado de `tool` para `key`, o ejecuta `function` y lo guarda.
+        """
+        entry_key = (tool, key)
+        with self.lock:
+            entry = self.entries.get(entry_key)
+            if entry is not None:
+                expires, value = entry
+                if expires > monotonic():
+                    self.entries.move_to_end(entry_key)
+                    self._count(tool, "hits")
+                    return copy.deepcopy(value)
+                del self.entries[entry_key]
+            future = self.inflight.get(entry_key)
+            owner = future is None
+            if owner:
+                future = self.inflight[entry_key] = Future()
+                generation = self.generations.get(tool, 0)
+                self._count(tool, "misses")
+            else:
+                self._count(tool, "coalesced")
+        if not owner:
+            return copy.deepcopy(future.result())
+
+        try:
+            value = function()
+        except BaseException as e:
+            with self.lock:
+                self.inflight.pop(entry_key, None)
+            future.set_exception(e)
+            raise
+        with self.lock:
+            self.inflight.pop(entry_key, None)
+            if (cache_if is None or cache_if(value)) and self.generations.get(tool, 0) == generation:
+                self.entries[entry_key] = (monotonic() + ttl, copy.deepcopy(value))
+                self.entries.move_to_end(entry_key)
+                while len(self.entries) > self.max_entries:
+                    self.entries.popitem(last=False)
+        future.set_result(value)
+        return value
+
+    def invalidate(self, *tools):
+        """
+        Descarta los resultados guardados de las herramientas indicadas (todas si no se indica ninguna).
+        """
+        with self.lock:
+            for tool, key in list(self.entries):
+                if not tools or tool in tools:
+                    del self.entries[(tool, key)]
+            for tool in tools or list(self.counts):
+                self.generations[tool] = self.generations.get(tool, 0) + 1
+                self._count(tool, "invalidations")
+
+    def stats(self):
+        """
+        Aciertos, fallos, llamadas unidas a otra en curso e invalidaciones por herramienta.
+        """
+        with self.lock:
+            return {tool: {**counts, "entries": sum(1 for name, _ in self.entries if name == tool)}
+                    for tool, counts in self.counts.items()}
+
+# Caché por defecto que comparten las herramientas del proyecto.
+TOOL_CACHE = ToolResultCache()
+
+def cached_tool(ttl, cache=None, round_floats=None, cache_if=None, name=None):
+    """
+    Decorador para la función de una herramienta (se aplica debajo de @tool):
+
+        @tool
+        @cached_tool(ttl=600, round_floats=2)
+        def get_weather_data(latitude: float, longitude: float): ...
+
+    :param ttl: Segundos que vale un resultado
+    :param round_floats: Cifras decimales con que se comparan los argumentos float (coordenadas)
+    :param cache_if: Función resultado -> bool, para no guardar por ejemplo respuestas de error
+    :param name: Nombre de la herramienta, por defecto el de la función
+    """
+    def decorator(function):
+        signature = inspect.signature(function)
+        tool = name or function.__name__
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            key = make_key(signature, args, kwargs, round_floats)
+            return (cache or TOOL_CACHE).call(tool, key, ttl, lambda: function(*args, **kwargs), cache_if)
+        return wrapper
+    return decorator
+
+def invalidates(*tools, cache=None):
+    """
+    Decorador para herramientas que modifican datos: al ejecutarse descarta los resultados
+    guardados de `tools`.
+    """
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            try:
+                return function(*args, **kwargs)
+            finally:
+                (cache or TOOL_CACHE).invalidate(*tools)
+        return wrapper
+    return decorator
@@ -0,0 +1,107 @@
+import threading
+
+from langchain_core.messages import AIMessage, HumanMessage
+
+from agent.context import message_text
+from agent.metrics import REGISTRY
+from agent.text import normalize_text
+
+# Límites de los buckets de cantidad de herramientas enlazadas por llamada.
+TOOL_COUNT_BUCKETS = (0, 1, 2, 4, 8, 16, 32)
+
+def keyword_pattern(keyword):
+    """
+    Forma en que se busca una palabra clave en normalize_text: como palabras enteras, o como
+    prefijo de palabra si termina en "*" ("llov*" encuentra "lloviendo" y "llovió").
+    """
+    if keyword.endswith("*"):
+        return normalize_text(keyword.rstrip("*")).rstrip()
+    return normalize_text(keyword)
+
+class ToolRouter:
+    """
+    Elige en cada llamada al modelo qué herramientas se le enlazan, para no mandar en cada
+    turno los esquemas de todas (las del clima son casi iguales entre sí).
+
+    Las herramientas se agrupan en `groups`: {"grupo": {"tools": [nombres], "keywords": [palabras]}}.
+    Un grupo entra si alguna de sus palabras clave aparece (ver keyword_pattern) en los
+    últimos `lookback` mensajes del usuario, así una repregunta como "¿y mañana?" sigue
+    teniendo las herramientas del turno anterior. Las herramientas que no están en ningún
+    grupo se enlazan siempre, igual que las que ya se llamaron en la historia que se manda
+    (Anthropic rechaza bloques tool_use de herramientas que no están definidas).
+
+    Cada combinación se enlaza una sola vez y se reutiliza; el orden de las herramientas es
+    siempre el original para que la misma combinación aproveche la caché de prompt.
+    """
+    def __init__(self, tools, groups, lookback=2, metrics=REGISTRY):
+        """
+        :param tools: Todas las herramientas del agente
+        :param groups: Grupos de herramientas con sus palabras clave
+        :param lookback: Mensajes del usuario (contando el actual) en que se buscan las palabras clave
+        :param metrics: MetricsRegistry donde se registra cuántas herramientas se enlazan
+        """
+        self.tools = tools
+        self.names = [tool.name for tool in tools]
+        self.groups = {
+            group: ([keyword_pattern(keyword) for keyword in spec.get("keywords", ())], set(spec["tools"]))
+            for group, spec in groups.items()
+        }
+        grouped = set().union(*(names for _, names in self.groups.values()))
+        self.always = {name for name in self.names if name not in grouped}
+        self.lookback = lookback
+        self.metrics = metrics
+        self.lock = threading.Lock()
+        self.bound = {}
+
+    def groups_for(self, messages):
+        """
+        Grupos cuyas palabras clave aparecen en los últimos mensajes del usuario.
+        """
+        questions = [message_text(message) for message in messages if isinstance(message, HumanMessage)]
+        text = normalize_text(" ".join(questions[-self.lookback:]))
+        return [group for group, (keywords, _) in self.groups.items() if any(keyword in text for keyword in keywords)]
+
+    def select(self, messages):
+        """
+        Nombres de las herramientas que corresponden a la conversación, en el orden original.
+        """
+        selected = set(self.always)
+        for group in self.groups_for(messages):
+            selected |= self.groups[group][1]
+            self.metrics.inc("agent_tool_router_total", group=group)
+        for message in messages:
+            if isinstance(message, AIMessage):
+                selected.update(call["name"] for call in message.tool_calls)
+        return tuple(name for name in self.names if name in selected)
+
+    def bind(self, llm, messages):
+        """
+        Devuelve `llm` con las herramientas elegidas para `messages` enlazadas (o sin
+        herramientas si no corresponde ninguna).
+        """
+        names = self.select(messages)
+        self.metrics.observe("agent_tool_router_tools", len(names), buckets=TOOL_COUNT_BUCKETS)
+        if not names:
+            return llm
+        key = (id(llm), names)
+        with self.lock:
+            bound = self.bound.get(key)
+            if bound is None:
+                bound = self.bound[key] = llm.bind_tools([tool for tool in self.tools if tool.name in names])
+        return bound
+
+if __name__ == "__main__":
+    # Palabras comunes que no deben activar grupos, y pedidos que sí.
+    from tools import tools, tool_groups
+    router = ToolRouter(tools, tool_groups)
+    cases = {
+        "ya estoy listo": [], "¿estás lista?": [], "busco un hotel": [], "la nevera está vacía": [],
+        "me gusta coldplay": [], "caminamos por el sendero": [], "hola, ¿cómo estás?": [],
+        "¿va a llover mañana?": ["weather"], "¿está nevando?": ["weather"], "is it cold outside": ["weather"],
+        "agrega una tarea a mi lista": ["tasks"], "add it to my list": ["tasks"],
+        "send an email to Ana": ["gmail"], "envíale un correo": ["gmail"],
+    }
+    for text, expected in cases.items():
+        groups = router.groups_for([HumanMessage(text)])
+        assert groups == expected, f"{text!r}: {groups} != {expected}"
+    print(f"{len(cases)} cases OK")
@@ -2,20 +2,34 @@ from langchain_google_community.gmail.utils import (
     build_resource_service,
     get_gmail_credentials,
 )
-from langchain_google_community import GmailToolkit
+from langchain_google_community.gmail.create_draft import GmailCreateDraft
+from langchain_google_community.gmail.send_message import GmailSendMessage
+from langchain_google_community.gmail.search import GmailSearch
+from langchain_google_community.gmail.get_message import GmailGetMessage
+from langchain_google_community.gmail.get_thread import GmailGetThread
 
-# Can review scopes here https://developers.google.com/gmail/api/auth/scopes
-# For instance, readonly scope is 'https://www.googleapis.com/auth/gmail.readonly'
-credentials = get_gmail_credentials(
-    token_file="gmailToken.json",
-    scopes=["https://mail.google.com/","https://www.googleapis.com/auth/gmail.send","https://www.googleapis.com/auth/gmail.compose",],
-    client_secrets_file="./utils/credentials.json",
-)
-api_resource = build_resource_service(credentials=credentials)
+from agent.registry import LazyResource, lazy_tool
+
+def build_api_resource():
+    # Can review scopes here https://developers.google.com/gmail/api/auth/scopes
+    # For instance, readonly scope is 'https://www.googleapis.com/auth/gmail.readonly'
+    credentials = get_gmail_credentials(
+        token_file="gmailToken.json",
+        scopes=["https://mail.google.com/","https://www.googleapis.com/auth/gmail.send","https://www.googleapis.com/auth/gmail.compose",],
+        client_secrets_file="./utils/credentials.json",
+    )
+    return build_resource_service(credentials=credentials)
+
+# Las credenciales y el cliente de Gmail se crean en la primera llamada a una herramienta, no al importar.
+api_resource = LazyResource("gmail api", build_api_resource)
 
-toolkit = GmailToolkit(api_resource=api_resource).get_tools()
+# Las mismas herramientas que GmailToolkit(api_resource=...).get_tools(), con el esquema disponible desde el inicio.
+toolkit = [
+  lazy_tool(tool_class, lambda tool_class=tool_class: tool_class(api_resource=api_resource.get()))
+  for tool_class in (GmailCreateDraft, GmailSendMessage, GmailSearch, GmailGetMessage, GmailGetThread)
+]
 
 tools = [toolkit]
 
 if __name__ == "__main__":
-  print(tools)
\ No newline at end of file
+  print(tools)
@@ -1,16 +1,24 @@
 from langchain.agents import tool
-import openmeteo_requests
-import requests_cache
-import pandas as pd
-from retry_requests import retry
 from typing import Dict, Any, Optional
+from agent.registry import LazyResource
+from agent.tool_cache import cached_tool
 
-# Setup the Open-Meteo API client with cache and retry on error
-cache_session = requests_cache.CachedSession('.cache', expire_after = 3600)
-retry_session = retry(cache_session, retries = 5, backoff_factor = 0.2)
-openmeteo = openmeteo_requests.Client(session = retry_session)
+def build_openmeteo_client():
+    import openmeteo_requests
+    import requests_cache
+    from retry_requests import retry
+
+    # Setup the Open-Meteo API client with cache and retry on error
+    cache_session = requests_cache.CachedSession('.cache', expire_after = 3600)
+    retry_session = retry(cache_session, retries = 5, backoff_factor = 0.2)
+    return openmeteo_requests.Client(session = retry_session)
+
+# El cliente (y la caché en disco) se crean en la primera consulta del clima.
+openmeteo = LazyResource("open-meteo client", build_openmeteo_client)
 
 @tool
+# Todas las herramientas del clima pasan por aquí: 10 minutos por zona de ~1 km, sin guardar errores.
+@cached_tool(ttl=600, round_floats=2, cache_if=lambda result: "error" not in result)
 def get_weather_data(latitude: float, longitude: float) -> Dict[str, Any]:
     """
     Fetches weather data from the Open-Meteo API and returns the weather details as a dictionary.
@@ -30,7 +38,7 @@ def get_weather_data(latitude: float, longitude: float) -> Dict[str, Any]:
         "forecast_days": 1
     }
     try:
-        responses = openmeteo.weather_api(url, params=params)
+        responses = openmeteo.get().weather_api(url, params=params)
         response = responses[0]
         current = response.Current()
         current_weather = {
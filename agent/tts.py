@@ -0,0 +1,212 @@
+import atexit
+import logging
+import queue
+import subprocess
+import threading
+from time import monotonic
+
+from agent.metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+class ProcessBackend:
+    """
+    Síntesis con un ejecutable que recibe el texto como argumento (los speak_{lang}_arg.exe
+    de textToSpeech). Lanza un proceso por frase, así que cada frase paga el arranque del
+    ejecutable; se mantiene para esos binarios, el backend por defecto es Pyttsx3Backend.
+    """
+    def __init__(self, command):
+        """
+        :param command: Lista con el ejecutable y sus argumentos; el texto se agrega al final
+        """
+        self.command = list(command)
+        self.process = None
+
+    def say(self, text):
+        self.process = subprocess.Popen(self.command + [text], stdout=subprocess.DEVNULL)
+        self.process.wait()
+
+    def stop(self):
+        process = self.process
+        if process is not None and process.poll() is None:
+            process.kill()
+
+    def close(self):
+        self.stop()
+
+class Pyttsx3Backend:
+    """
+    Síntesis local con pyttsx3 (SAPI5 / NSSpeechSynthesizer / eSpeak). El motor se crea una
+    sola vez, en el hilo del SpeechWorker, que es el único que lo usa.
+
+    pyttsx3 no admite llamar a engine.stop() desde otro hilo mientras corre runAndWait, así
+    que `stop` solo lo pide y el corte lo hace el callback de la siguiente palabra, que
+    corre en el hilo del SpeechWorker.
+    """
+    def __init__(self, lang=None, rate=None):
+        """
+        :param lang: Código de idioma ("es", "en") para elegir la voz, None deja la del sistema
+        :param rate: Palabras por minuto, None deja la del sistema
+        """
+        self.lang = lang
+        self.rate = rate
+        self.engine = None
+        self.stopping = threading.Event()
+
+    def _engine(self):
+        if self.engine is None:
+            import pyttsx3
+            self.engine = pyttsx3.init()
+            self.engine.connect("started-word", self._on_word)
+            if self.rate:
+                self.engine.setProperty("rate", self.rate)
+            if self.lang:
+                for voice in self.engine.getProperty("voices"):
+                    languages = " ".join(str(language) for language in getattr(voice, "languages", []) or [])
+                    if self.lang.lower() in f"{voice.id} {voice.name} {languages}".lower():
+                        self.engine.setProperty("voice", voice.id)
+                        break
+        return self.engine
+
+    def _on_word(self, name, location, length):
+        if self.stopping.is_set():
+            self.engine.stop()
+
+    def say(self, text):
+        engine = self._engine()
+        self.stopping.clear()
+        engine.say(text)
+        engine.runAndWait()
+
+    def stop(self):
+        self.stopping.set()
+
+    def close(self):
+        self.stop()
+
+class NaoBackend:
+    """
+    Síntesis en el robot NAO con un único proceso python2 (`NaoSpeak.py --serve`) que se
+    conecta una vez a ALTextToSpeech y recibe una frase por línea, en lugar de lanzar un
+    intérprete e importar naoqi por cada frase.
+    """
+    def __init__(self, ip=None, script=".\\Nao\\NaoSpeak.py", python="python2"):
+        """
+        :param ip: Dirección IP del robot, None usa la que tenga configurada el script
+        :param script: Ruta de NaoSpeak.py
+        :param python: Intérprete con naoqi instalado
+        """
+        self.command = [python, script, "--serve"] + (["--ip", str(ip)] if ip else [])
+        self.process = None
+        self.lock = threading.Lock()
+
+    def _process(self):
+        if self.process is None or self.process.poll() is not None:
+            self.process = subprocess.Popen(self.command, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                            encoding="utf-8", bufsize=1)
+        return self.process
+
+    def _send(self, line):
+        with self.lock:
+            process = self._process()
+            process.stdin.write(line + "\n")
+            process.stdin.flush()
+            return process
+
+    def say(self, text):
+        process = self._send("SAY " + " ".join(text.split()))
+        # El script contesta una línea cuando el robot termina (o se interrumpe) la frase.
+        if not process.stdout.readline():
+            raise RuntimeError(f"NaoSpeak exited with code {process.wait()}")
+
+    def stop(self):
+        if self.process is not None and self.process.poll() is None:
+            self._send("STOP")
+
+    def close(self):
+        if self.process is not None and self.process.poll() is None:
+            try:
+                self.process.stdin.close()
+                self.process.wait(timeout=5)
+            except (OSError, subprocess.TimeoutExpired):
+                self.process.kill()
+
+class SpeechWorker:
+    """
+    Hilo de síntesis de voz de larga duración: `say` solo encola la frase y vuelve, y el
+    hilo las dice en orden con el backend (Pyttsx3Backend, NaoBackend, ProcessBackend o
+    cualquier objeto con say / stop / close). `cancel` descarta lo encolado y corta la
+    frase en curso, por ejemplo cuando el usuario vuelve a hablar; el backend recibe
+    `stop` desde el hilo que cancela, mientras su `say` corre en el del worker.
+
+    El tiempo entre encolar y empezar a hablar se registra en agent_tts_start_seconds y
+    lo que dura cada frase en agent_tts_seconds.
+    """
+    def __init__(self, backend, metrics=REGISTRY):
+        self.backend = backend
+        self.metrics = metrics
+        self.queue = queue.Queue()
+        self.lock = threading.Lock()
+        # Las frases encoladas antes de un cancel tienen una generación vieja y se saltan.
+        self.generation = 0
+        self.thread = threading.Thread(target=self._worker, daemon=True)
+        self.thread.start()
+        atexit.register(self.close)
+
+    def say(self, text):
+        """
+        Encola `text` para decirlo después de lo que ya está en cola.
+        """
+        text = " ".join(str(text).split())
+        if text:
+            self.queue.put((self.generation, monotonic(), text))
+
+    def cancel(self):
+        """
+        Descarta las frases encoladas y corta la que se está diciendo.
+        """
+        with self.lock:
+            self.generation += 1
+        while True:
+            try:
+                self.queue.get_nowait()
+                self.queue.task_done()
+            except queue.Empty:
+                break
+        try:
+            self.backend.stop()
+        except Exception as e:
+            logger.exception("Error occurred while stopping speech: %s", e)
+        self.metrics.inc("agent_tts_cancelled_total")
+
+    def wait(self):
+        """
+        Bloquea hasta que se dijo (o se descartó) todo lo encolado.
+        """
+        self.queue.join()
+
+    def close(self):
+        if not self.thread.is_alive():
+            return
+        self.queue.put(None)
+        self.thread.join(timeout=5)
+        try:
+            self.backend.close()
+        except Exception as e:
+            logger.exception("Error occurred while closing the speech backend: %s", e)
+
+    def _worker(self):
+        while (item := self.queue.get()) is not None:
+            generation, queued, text = item
+            try:
+                with self.lock:
+                    current = generation == self.generation
+                if current:
+                    self.metrics.observe("agent_tts_start_seconds", monotonic() - queued)
+                    with self.metrics.timer("agent_tts_seconds"):
+                        self.backend.say(text)
+            except Exception as e:
+                logger.exception("Error occurred while speaking: %s", e)
+            finally:
+                self.queue.task_done()
+        self.queue.task_done()
@@ -1,32 +1,50 @@
 from dotenv import load_dotenv
+import logging
 import os
 
-from agent.agentHandler import NaoAgent, AgentHandler
-from tools import tools
+from agent.registry import STARTUP
+
+with STARTUP.phase("import agent"):
+  from agent.agentHandler import NaoAgent, AgentHandler
+with STARTUP.phase("import tools"):
+  from tools import tools, tool_groups
 
 # Cargar las variables del archivo .env
 load_dotenv()
 
+# LOG_LEVEL=DEBUG muestra los mensajes que entran y salen del modelo.
+logging.basicConfig(level=os.getenv('LOG_LEVEL', 'WARNING').upper())
+
 LANGS = ["es","en"]
 
 # Acceder a las variables de entorno
 api_key = os.getenv('API_KEY')
 model_name = os.getenv('MODEL')
+# Modelo rápido opcional para la charla simple (MODEL queda para los pedidos con herramientas).
+fast_model_name = os.getenv('FAST_MODEL')
 lang = os.getenv('AILANG')
 thread_id = os.getenv('THREAD_ID')
 nao_ip = os.getenv('NAO_IP')
+# Síntesis de voz: pyttsx3 (por defecto), nao o exe (ver agent/tts.py).
+tts_backend = os.getenv('TTS_BACKEND')
 
 print(api_key,model_name)
 
-chatbot = AgentHandler(
-  api_key=api_key,
-  tools=tools,
-  model_name=model_name,
-  thread_id=thread_id,
-  memory=True,
-  lang="es",
-)
+with STARTUP.phase("create agent"):
+  chatbot = AgentHandler(
+    api_key=api_key,
+    tools=tools,
+    tool_groups=tool_groups,
+    model_name=model_name,
+    fast_model_name=fast_model_name,
+    thread_id=thread_id,
+    memory=True,
+    lang="es",
+    tts_backend=tts_backend,
+  )
 nao_ip=nao_ip
+# Cuánto tardó cada parte del arranque.
+print(STARTUP.report())
 
 #chatbot.display_graph(chatbot.graph)
 #chatbot.display_graph(chatbot.llm_with_tools.get_graph())
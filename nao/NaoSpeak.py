@@ -2,6 +2,7 @@ import sys
 import codecs
 import dotenv
 import os
+import threading
 
 sys.path.append("C:\\Users\\Windows 10\\Pictures\\Nao\\lib")
 
@@ -13,7 +14,39 @@ dotenv.load_dotenv("..\\.env")
 # Acceder a las variables de entorno
 naoip = os.getenv('NAO_IPS')
 
-tts = ALProxy("ALTextToSpeech", "169.254.219.188", 9559)
+ip = "169.254.219.188"
+if "--ip" in sys.argv:
+    ip = sys.argv[sys.argv.index("--ip") + 1]
+
+tts = ALProxy("ALTextToSpeech", ip, 9559)
+
+def serve():
+    # Modo persistente (agent/tts.py): una orden por linea en stdin, "SAY <texto>" o "STOP".
+    # Contesta "done" cuando termina (o se corta) cada frase.
+    output_lock = threading.Lock()
+
+    def wait(task):
+        tts.wait(task, 0)
+        with output_lock:
+            sys.stdout.write("done\n")
+            sys.stdout.flush()
+
+    while True:
+        line = sys.stdin.readline()
+        if not line:
+            break
+        line = line.rstrip("\r\n")
+        if line == "STOP":
+            tts.stopAll()
+        elif line.startswith("SAY "):
+            phrase = line[4:].decode('utf-8', 'ignore').encode('utf-8', 'ignore')
+            waiter = threading.Thread(target=wait, args=(tts.post.say(phrase),))
+            waiter.daemon = True
+            waiter.start()
+
+if "--serve" in sys.argv:
+    serve()
+    sys.exit(0)
 
 phrase = ""
 
@@ -25,4 +58,4 @@ for text in sys.argv:
 
 phrase = phrase.decode('utf-8', 'ignore')
 phrase = phrase.encode('utf-8', 'ignore')
-tts.say(phrase)
\ No newline at end of file
+tts.say(phrase)
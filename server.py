@@ -0,0 +1,46 @@
+from dotenv import load_dotenv
+import logging
+import os
+
+from agent.registry import STARTUP
+
+with STARTUP.phase("import agent"):
+  from agent.agentHandler import AgentHandler
+  from agent.server import run
+with STARTUP.phase("import tools"):
+  from tools import tools, tool_groups
+
+# Cargar las variables del archivo .env
+load_dotenv()
+
+logging.basicConfig(level=os.getenv('LOG_LEVEL', 'INFO').upper())
+
+# Acceder a las variables de entorno
+api_key = os.getenv('API_KEY')
+model_name = os.getenv('MODEL')
+fast_model_name = os.getenv('FAST_MODEL')
+thread_id = os.getenv('THREAD_ID')
+
+with STARTUP.phase("create agent"):
+  chatbot = AgentHandler(
+    api_key=api_key,
+    tools=tools,
+    tool_groups=tool_groups,
+    model_name=model_name,
+    fast_model_name=fast_model_name,
+    thread_id=thread_id,
+    memory=True,
+    lang="es",
+    max_concurrency=int(os.getenv('MAX_CONCURRENCY', '8')),
+  )
+logging.getLogger(__name__).info(STARTUP.report())
+
+# Un solo proceso con el agente cargado para la web, el bucle de voz y los robots:
+#   curl -N localhost:8080/chat -d '{"message": "hola", "thread_id": "nao-1"}'
+run(
+  chatbot,
+  host=os.getenv('HOST', '0.0.0.0'),
+  port=int(os.getenv('PORT', '8080')),
+  max_pending=int(os.getenv('MAX_PENDING', '16')),
+  drain_timeout=float(os.getenv('DRAIN_TIMEOUT', '30')),
+)
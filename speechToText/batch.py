@@ -0,0 +1,119 @@
+"""
+Offline batch transcription of recorded audio.
+
+Transcribes a directory (or a manifest) of WAV/FLAC files across a process pool,
+one WhisperModel per worker, and streams one JSON line per file as soon as it is done.
+
+  python -m speechToText.batch ./sessions --workers 4 --model small --output results.jsonl
+"""
+import os
+import sys
+import json
+import multiprocessing
+from argparse import ArgumentParser
+from pathlib import Path
+from time import perf_counter
+
+from speechToText.utils.whisperUtils import add_model_arguments, load_model
+from speechToText.utils.audio_processing import transcribe
+
+AUDIO_EXTENSIONS = {".wav", ".flac"}
+
+# Model of the current worker process, created once by init_worker.
+_audio_model = None
+_beam_size = 5
+
+def get_parser():
+    parser = ArgumentParser(description="Transcribe recorded audio files in parallel.")
+    parser.add_argument("input",
+                        help="Directory with WAV/FLAC files, or a manifest (.txt with one path per "
+                             "line or .jsonl with a \"path\" field per line).")
+    parser.add_argument("--output", default="-",
+                        help="JSONL file to write results to, '-' for stdout.")
+    parser.add_argument("--workers", default=max(1, (os.cpu_count() or 1) // 2),
+                        help="Number of worker processes, each one loads its own model.", type=int)
+    parser.add_argument("--language", default=None,
+                        help="Force the language instead of detecting it per file.")
+    add_model_arguments(parser)
+    return parser
+
+def list_audio_files(path):
+    """
+    Returns the audio files of a directory, or the entries of a manifest file.
+    """
+    path = Path(path)
+    if path.is_dir():
+        return sorted(str(file) for file in path.rglob("*") if file.suffix.lower() in AUDIO_EXTENSIONS)
+
+    files = []
+    with open(path, encoding="utf-8") as manifest:
+        for line in manifest:
+            line = line.strip()
+            if not line:
+                continue
+            entry = json.loads(line)["path"] if path.suffix == ".jsonl" else line
+            # Relative entries are relative to the manifest.
+            files.append(str(path.parent / entry))
+    return files
+
+def init_worker(model, device, compute_type, cpu_threads, num_workers, beam_size):
+    global _audio_model, _beam_size
+    _audio_model = load_model(model, device=device, compute_type=compute_type, cpu_threads=cpu_threads,
+                              num_workers=num_workers, beam_size=beam_size, warm_up=False)
+    _beam_size = beam_size
+
+def transcribe_file(job):
+    path, language = job
+    start = perf_counter()
+    try:
+        text, segments, info = transcribe(_audio_model, path, beam_size=_beam_size, language=language)
+    except Exception as e:
+        return {"path": path, "error": str(e)}
+    elapsed = perf_counter() - start
+    return {
+        "path": path,
+        "text": text,
+        "language": info.language,
+        "duration": info.duration,
+        "decode_seconds": elapsed,
+        "rtf": elapsed / info.duration if info.duration else None,
+        "segments": [{"start": s.start, "end": s.end, "text": s.text} for s in segments],
+    }
+
+def run(args):
+    files = list_audio_files(args.input)
+    if not files:
+        print(f"No audio files found in {args.input}", file=sys.stderr)
+        return
+    workers = max(1, min(args.workers, len(files)))
+    # Split the cores between the workers instead of letting every model grab all of them.
+    cpu_threads = args.cpu_threads or max(1, (os.cpu_count() or 1) // workers)
+
+    output = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+    start = perf_counter()
+    done = failed = 0
+    audio_seconds = 0.0
+    try:
+        # spawn: CTranslate2 thread pools do not survive a fork.
+        context = multiprocessing.get_context("spawn")
+        initargs = (args.model, args.device, args.compute_type, cpu_threads, args.num_workers, args.beam_size)
+        with context.Pool(workers, initializer=init_worker, initargs=initargs) as pool:
+            jobs = [(path, args.language) for path in files]
+            for result in pool.imap_unordered(transcribe_file, jobs):
+                output.write(json.dumps(result, ensure_ascii=False) + "\n")
+                output.flush()
+                done += 1
+                if "error" in result:
+                    failed += 1
+                else:
+                    audio_seconds += result["duration"] or 0.0
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+    elapsed = perf_counter() - start
+    print(f"Transcribed {done} files ({failed} failed), {audio_seconds:.1f}s of audio in {elapsed:.1f}s "
+          f"with {workers} workers", file=sys.stderr)
+
+if __name__ == "__main__":
+    run(get_parser().parse_args())
@@ -0,0 +1,286 @@
+"""
+Speech-to-text benchmark.
+
+Feeds fixture audio through the same path as SpeechToText.Loop (audio queue, VAD,
+streaming / full decode, ActionCaller) without a microphone, for every model size and
+compute type asked for, and writes one JSON line per fixture plus one summary line per
+configuration. Every configuration runs in a fresh process so peak RSS is its own.
+
+  python -m speechToText.benchmark ./fixtures --models tiny base --compute_types int8 int8_float32 --output stt_bench.jsonl
+
+Fixtures are WAV/FLAC files. The reference text for WER is read from a .txt file next to
+each audio file, or from a .jsonl manifest with "path" and "text" fields.
+"""
+import os
+import sys
+import json
+import platform
+import threading
+import concurrent.futures
+import multiprocessing
+from argparse import ArgumentParser
+from datetime import datetime, timezone
+from pathlib import Path
+from time import monotonic, perf_counter, sleep
+
+import numpy as np
+
+from speechToText.batch import AUDIO_EXTENSIONS
+from speechToText.utils.whisperUtils import MODELS, get_parser as get_loop_parser, load_model
+
+SAMPLE_RATE = 16000
+
+def get_parser():
+    parser = ArgumentParser(description="Benchmark the speech-to-text pipeline on fixture audio.")
+    parser.add_argument("fixtures", help="Directory with WAV/FLAC fixtures or a .jsonl manifest.")
+    parser.add_argument("--models", nargs="+", default=["tiny"], choices=MODELS)
+    parser.add_argument("--compute_types", nargs="+", default=["int8"],
+                        choices=["default", "int8", "int8_float32", "int8_float16", "float16", "float32"])
+    parser.add_argument("--device", default="cpu", choices=["auto", "cpu", "cuda"])
+    parser.add_argument("--cpu_threads", default=0, type=int)
+    parser.add_argument("--beam_size", default=5, type=int)
+    parser.add_argument("--vad", default="energy", choices=["none", "energy", "silero"])
+    parser.add_argument("--vad_silence_ms", default=300, type=int)
+    parser.add_argument("--streaming", action="store_true")
+    parser.add_argument("--record_timeout", default=2, type=float,
+                        help="Seconds of audio per chunk handed to the loop, like the recorder does.")
+    parser.add_argument("--phrase_timeout", default=10, type=float)
+    parser.add_argument("--tail_silence", default=1.0, type=float,
+                        help="Seconds of silence appended after each fixture so the turn can end.")
+    parser.add_argument("--speed", default=1.0, type=float,
+                        help="Playback speed of the fixtures, 0 feeds them as fast as possible.")
+    parser.add_argument("--output", default="-",
+                        help="JSONL file the results are appended to, '-' for stdout.")
+    return parser
+
+def load_fixtures(path):
+    """
+    Returns (audio path, reference text or None) pairs.
+    """
+    path = Path(path)
+    if path.is_dir():
+        fixtures = []
+        for file in sorted(path.rglob("*")):
+            if file.suffix.lower() in AUDIO_EXTENSIONS:
+                reference = file.with_suffix(".txt")
+                fixtures.append((str(file), reference.read_text(encoding="utf-8").strip() if reference.exists() else None))
+        return fixtures
+
+    fixtures = []
+    with open(path, encoding="utf-8") as manifest:
+        for line in manifest:
+            if line.strip():
+                entry = json.loads(line)
+                fixtures.append((str(path.parent / entry["path"]), entry.get("text")))
+    return fixtures
+
+def _words(text):
+    return "".join(c if c.isalnum() or c.isspace() else " " for c in text.lower()).split()
+
+def word_errors(reference, hypothesis):
+    """
+    Returns (word level edit distance, number of reference words).
+    """
+    ref, hyp = _words(reference), _words(hypothesis)
+    row = list(range(len(hyp) + 1))
+    for i, ref_word in enumerate(ref, 1):
+        previous, row[0] = row[0], i
+        for j, hyp_word in enumerate(hyp, 1):
+            current = min(row[j] + 1, row[j - 1] + 1, previous + (ref_word != hyp_word))
+            previous, row[j] = row[j], current
+    return row[-1], len(ref)
+
+def peak_rss_mb():
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Kilobytes on Linux, bytes on macOS.
+        return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+    except ImportError:
+        pass
+    try:
+        import psutil
+        info = psutil.Process().memory_info()
+        return getattr(info, "peak_wset", info.rss) / (1024 * 1024)
+    except ImportError:
+        return None
+
+class TimedModel():
+    """
+    Wraps a WhisperModel and accumulates the time spent decoding.
+    """
+
+    def __init__(self, audio_model):
+        self.audio_model = audio_model
+        self.reset()
+
+    def reset(self):
+        self.decode_seconds = 0.0
+        self.calls = 0
+
+    def transcribe(self, audio, **kwargs):
+        start = perf_counter()
+        segments, info = self.audio_model.transcribe(audio, **kwargs)
+        # Segments are decoded lazily, consume them inside the timer.
+        segments = list(segments)
+        self.decode_seconds += perf_counter() - start
+        self.calls += 1
+        return segments, info
+
+def run_fixture(stt, timed_model, audio, args):
+    """
+    Plays one fixture into the loop and measures it.
+    """
+    pcm = (np.clip(audio, -1.0, 1.0) * 32767).astype(np.int16)
+    chunk = int(args.record_timeout * SAMPLE_RATE)
+    chunks = [pcm[i:i + chunk] for i in range(0, len(pcm), chunk)]
+    # Like the recorder, the last chunk carries the pause that follows the speech.
+    chunks[-1] = np.concatenate((chunks[-1], np.zeros(int(args.tail_silence * SAMPLE_RATE), dtype=np.int16)))
+
+    # Start every fixture as an active request, the trigger is not part of the measurement.
+    stt.active = True
+    stt.transcription = ['']
+    stt.phrase_time = None
+    if stt.vad:
+        stt.vad.reset()
+    if stt.streaming:
+        stt.streamer.reset()
+    timed_model.reset()
+
+    times = {}
+    final = {}
+
+    def Action(prompt):
+        final["time"] = monotonic()
+        final["text"] = prompt
+    stt.Action = Action
+
+    def feed():
+        for index, data in enumerate(chunks):
+            if args.speed > 0:
+                sleep(len(data) / SAMPLE_RATE / args.speed)
+            now = monotonic()
+            times.setdefault("first_put", now)
+            if index == len(chunks) - 1:
+                times["last_put"] = now
+            stt.data_queue.put(data.tobytes())
+
+    duration = len(audio) / SAMPLE_RATE
+    feeder = threading.Thread(target=feed, daemon=True)
+    start = monotonic()
+    feeder.start()
+    first_partial = None
+    deadline = start + duration / max(args.speed, 1e-3) * 10 + args.phrase_timeout + 30
+    while "time" not in final and monotonic() < deadline:
+        stt.step(max_wait=0.05)
+        if first_partial is None and any(stt.transcription):
+            first_partial = monotonic()
+    feeder.join()
+
+    return {
+        "duration": duration,
+        "text": final.get("text"),
+        "decode_seconds": timed_model.decode_seconds,
+        "decode_calls": timed_model.calls,
+        "rtf": timed_model.decode_seconds / duration if duration else None,
+        "first_partial_latency": first_partial - times["first_put"] if first_partial else None,
+        "final_latency": final["time"] - times["last_put"] if "time" in final else None,
+    }
+
+def run_config(model, compute_type, args, fixtures):
+    """
+    Benchmarks one model size / compute type. Runs in its own process.
+    """
+    from faster_whisper import decode_audio
+    from speechToText.whisperLoop import SpeechToText
+
+    start = perf_counter()
+    audio_model = load_model(model, device=args.device, compute_type=compute_type,
+                             cpu_threads=args.cpu_threads, beam_size=args.beam_size)
+    load_seconds = perf_counter() - start
+
+    loop_args = get_loop_parser().parse_args([])
+    for name in ("beam_size", "vad", "vad_silence_ms", "streaming", "record_timeout", "phrase_timeout"):
+        setattr(loop_args, name, getattr(args, name))
+    loop_args.model = model
+    loop_args.compute_type = compute_type
+    loop_args.wake_word = "none"
+
+    timed_model = TimedModel(audio_model)
+    stt = SpeechToText(Action=None, trigger="", debug=False, args=loop_args,
+                       audio_model=timed_model, microphone=False)
+
+    results = []
+    for path, reference in fixtures:
+        result = {"type": "fixture", "model": model, "compute_type": compute_type, "path": path}
+        try:
+            result.update(run_fixture(stt, timed_model, decode_audio(path, sampling_rate=SAMPLE_RATE), args))
+        except Exception as e:
+            result["error"] = str(e)
+        if reference is not None and result.get("text") is not None:
+            result["word_errors"], result["reference_words"] = word_errors(reference, result["text"])
+            result["wer"] = result["word_errors"] / max(result["reference_words"], 1)
+        results.append(result)
+
+    return results, {"load_seconds": load_seconds, "peak_rss_mb": peak_rss_mb()}
+
+def _percentile(values, q):
+    return float(np.percentile(values, q)) if values else None
+
+def summarize(model, compute_type, args, results, process):
+    ok = [r for r in results if "error" not in r]
+    audio = sum(r["duration"] for r in ok)
+    first = [r["first_partial_latency"] for r in ok if r["first_partial_latency"] is not None]
+    final = [r["final_latency"] for r in ok if r["final_latency"] is not None]
+    errors = sum(r.get("word_errors", 0) for r in ok)
+    words = sum(r.get("reference_words", 0) for r in ok)
+    return {
+        "type": "summary",
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "host": platform.node(),
+        "cpu_count": os.cpu_count(),
+        "model": model,
+        "compute_type": compute_type,
+        "settings": {name: getattr(args, name) for name in
+                     ("device", "cpu_threads", "beam_size", "vad", "vad_silence_ms", "streaming",
+                      "record_timeout", "phrase_timeout", "tail_silence", "speed")},
+        "fixtures": len(results),
+        "failed": len(results) - len(ok),
+        "audio_seconds": audio,
+        "rtf": sum(r["decode_seconds"] for r in ok) / audio if audio else None,
+        "first_partial_p50": _percentile(first, 50),
+        "first_partial_p95": _percentile(first, 95),
+        "final_latency_p50": _percentile(final, 50),
+        "final_latency_p95": _percentile(final, 95),
+        "missing_finals": len(ok) - len(final),
+        "wer": errors / words if words else None,
+        **process,
+    }
+
+def run(args):
+    fixtures = load_fixtures(args.fixtures)
+    if not fixtures:
+        print(f"No fixtures found in {args.fixtures}", file=sys.stderr)
+        return
+
+    output = sys.stdout if args.output == "-" else open(args.output, "a", encoding="utf-8")
+    context = multiprocessing.get_context("spawn")
+    try:
+        for model in args.models:
+            for compute_type in args.compute_types:
+                # A fresh process per configuration keeps models and peak RSS apart.
+                with concurrent.futures.ProcessPoolExecutor(1, mp_context=context) as executor:
+                    results, process = executor.submit(run_config, model, compute_type, args, fixtures).result()
+                summary = summarize(model, compute_type, args, results, process)
+                for result in results + [summary]:
+                    output.write(json.dumps(result, ensure_ascii=False) + "\n")
+                output.flush()
+                print(f"{model:>9} {compute_type:>13}  rtf={summary['rtf']}  "
+                      f"first_partial_p50={summary['first_partial_p50']}  final_p50={summary['final_latency_p50']}  "
+                      f"wer={summary['wer']}  peak_rss_mb={summary['peak_rss_mb']}", file=sys.stderr)
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+if __name__ == "__main__":
+    run(get_parser().parse_args())
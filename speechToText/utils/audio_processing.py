@@ -1,17 +1,27 @@
 import io
 import speech_recognition as sr
 
-def process_audio(audio_model, temp_file, last_sample, source):
+def process_audio(audio_model, temp_file, last_sample, source, beam_size=5):
     audio_data = sr.AudioData(last_sample, source.SAMPLE_RATE, source.SAMPLE_WIDTH)
     wav_data = io.BytesIO(audio_data.get_wav_data())
 
     with open(temp_file, 'w+b') as f:
         f.write(wav_data.read())
 
-    segments, _ = audio_model.transcribe(temp_file, beam_size=5)
+    segments, _ = audio_model.transcribe(temp_file, beam_size=beam_size)
     segment = list(segments)
     
     try: 
         return segment[0].text
     except IndexError:
-        return ""
\ No newline at end of file
+        return ""
+
+def transcribe(audio_model, audio, beam_size=5, **kwargs):
+    """
+    Decodes a float32 array or an audio file path.
+    Returns the joined text, the list of segments and the transcription info.
+    """
+    segments, info = audio_model.transcribe(audio, beam_size=beam_size, **kwargs)
+    segments = list(segments)
+    text = "".join(segment.text for segment in segments).strip()
+    return text, segments, info
@@ -0,0 +1,89 @@
+import threading
+from time import monotonic
+
+from speechToText.utils.ring_buffer import PCMRingBuffer
+
+class AudioQueue():
+    """
+    Thread safe queue of raw audio for the recording callback.
+
+    Audio is written into a preallocated PCM ring buffer. The consumer blocks until
+    audio arrives or a timeout expires and takes every pending sample in one atomic
+    read. Queue depth and wait times are tracked so we can see where speech-to-text
+    latency goes.
+    """
+
+    def __init__(self, seconds=30, sample_rate=16000):
+        self.condition = threading.Condition()
+        self.ring = PCMRingBuffer(seconds=seconds, sample_rate=sample_rate)
+        self.sample_rate = sample_rate
+        # When the oldest pending audio was put, None if there is none.
+        self.oldest_put = None
+        self.reset_stats()
+
+    def reset_stats(self):
+        with self.condition:
+            self.max_depth = 0
+            self.total_chunks = 0
+            self.total_takes = 0
+            # Time the consumer spent blocked waiting for audio.
+            self.wait_total = 0.0
+            self.wait_max = 0.0
+            # Age of the oldest chunk when it was taken by the consumer.
+            self.latency_total = 0.0
+            self.latency_max = 0.0
+
+    def put(self, data):
+        with self.condition:
+            self.ring.write(data)
+            if self.oldest_put is None:
+                self.oldest_put = monotonic()
+            self.total_chunks += 1
+            self.max_depth = max(self.max_depth, len(self.ring))
+            self.condition.notify()
+
+    def take(self, timeout=None):
+        """
+        Waits up to `timeout` seconds (forever if None) for audio and returns every
+        pending sample as float32, or an empty array if the timeout expired first.
+
+        The array is a view into a reused buffer, it is only valid until the next take.
+        """
+        start = monotonic()
+        with self.condition:
+            self.condition.wait_for(lambda: len(self.ring), timeout=timeout)
+            now = monotonic()
+            waited = now - start
+            self.wait_total += waited
+            self.wait_max = max(self.wait_max, waited)
+            if not len(self.ring):
+                return self.ring.scratch[:0]
+
+            latency = now - self.oldest_put
+            self.oldest_put = None
+            self.total_takes += 1
+            self.latency_total += latency
+            self.latency_max = max(self.latency_max, latency)
+            return self.ring.read()
+
+    def depth(self):
+        with self.condition:
+            return len(self.ring)
+
+    def empty(self):
+        return self.depth() == 0
+
+    def stats(self):
+        with self.condition:
+            takes = max(self.total_takes, 1)
+            return {
+                "depth_seconds": len(self.ring) / self.sample_rate,
+                "max_depth_seconds": self.max_depth / self.sample_rate,
+                "overrun_seconds": self.ring.overruns / self.sample_rate,
+                "chunks": self.total_chunks,
+                "takes": self.total_takes,
+                "wait_total": self.wait_total,
+                "wait_max": self.wait_max,
+                "latency_avg": self.latency_total / takes,
+                "latency_max": self.latency_max,
+            }
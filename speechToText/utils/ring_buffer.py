@@ -0,0 +1,116 @@
+import numpy as np
+
+SAMPLE_RATE = 16000
+# 16 bit PCM to [-1, 1) float, same as dividing by 32768.0.
+SCALE = np.float32(1 / 32768.0)
+
+class PCMRingBuffer():
+    """
+    Preallocated int16 ring buffer for raw PCM audio.
+
+    The recording side copies samples straight into the ring and the reading side
+    converts every pending sample into a reused float32 buffer, so steady state
+    listening does not allocate. Not thread safe on its own, see AudioQueue.
+    """
+
+    def __init__(self, seconds=30, sample_rate=SAMPLE_RATE):
+        self.capacity = int(seconds * sample_rate)
+        self.sample_rate = sample_rate
+        self.data = np.zeros(self.capacity, dtype=np.int16)
+        self.scratch = np.zeros(self.capacity, dtype=np.float32)
+        self.start = 0
+        self.size = 0
+        # Samples dropped because the reader fell more than `seconds` behind.
+        self.overruns = 0
+
+    def __len__(self):
+        return self.size
+
+    def write(self, data):
+        """
+        Copies raw 16 bit PCM bytes (or an int16 array) into the ring, dropping the
+        oldest samples if it is full.
+        """
+        samples = np.frombuffer(data, dtype=np.int16) if isinstance(data, (bytes, bytearray, memoryview)) else data
+        n = len(samples)
+        if n > self.capacity:
+            self.overruns += n - self.capacity
+            samples = samples[-self.capacity:]
+            n = self.capacity
+
+        overflow = self.size + n - self.capacity
+        if overflow > 0:
+            self.overruns += overflow
+            self.start = (self.start + overflow) % self.capacity
+            self.size -= overflow
+
+        end = (self.start + self.size) % self.capacity
+        first = min(n, self.capacity - end)
+        self.data[end:end + first] = samples[:first]
+        self.data[:n - first] = samples[first:]
+        self.size += n
+
+    def read(self):
+        """
+        Converts every pending sample to float32 and returns it.
+
+        The returned array is a view into a reused buffer and is only valid until the
+        next call, callers that keep the audio must copy it.
+        """
+        n = self.size
+        first = min(n, self.capacity - self.start)
+        out = self.scratch[:n]
+        np.multiply(self.data[self.start:self.start + first], SCALE, out=out[:first], dtype=np.float32)
+        np.multiply(self.data[:n - first], SCALE, out=out[first:], dtype=np.float32)
+        self.start = (self.start + n) % self.capacity
+        self.size = 0
+        return out
+
+class AudioWindow():
+    """
+    Preallocated float32 window that grows at the end and is trimmed from the front.
+
+    Trimming only moves the start index, the live samples are moved back to the front
+    of the storage when an append would not fit.
+    """
+
+    def __init__(self, capacity):
+        self.capacity = int(capacity)
+        self.storage = np.zeros(self.capacity, dtype=np.float32)
+        self.head = 0
+        self.tail = 0
+
+    def __len__(self):
+        return self.tail - self.head
+
+    @property
+    def audio(self):
+        return self.storage[self.head:self.tail]
+
+    def clear(self):
+        self.head = self.tail = 0
+
+    def append(self, audio):
+        """
+        Copies audio at the end of the window, dropping the oldest samples if it is full.
+        """
+        if len(audio) >= self.capacity:
+            self.storage[:] = audio[-self.capacity:]
+            self.head, self.tail = 0, self.capacity
+            return
+        if self.tail + len(audio) > self.capacity:
+            self.drop(max(0, len(self) + len(audio) - self.capacity))
+            size = len(self)
+            self.storage[:size] = self.storage[self.head:self.tail]
+            self.head, self.tail = 0, size
+        self.storage[self.tail:self.tail + len(audio)] = audio
+        self.tail += len(audio)
+
+    def drop(self, n):
+        """
+        Drops the first n samples of the window.
+        """
+        self.head = min(self.tail, self.head + int(n))
+
+    def keep_last(self, n):
+        self.drop(len(self) - n)
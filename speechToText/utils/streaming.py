@@ -0,0 +1,121 @@
+import re
+
+from speechToText.utils.ring_buffer import AudioWindow
+
+SAMPLE_RATE = 16000
+
+def _normalize(word):
+    return re.sub(r"[^\w]", "", word.lower())
+
+class StreamingTranscriber():
+    """
+    Incremental transcription of the current phrase over a bounded rolling audio window.
+
+    Every pass decodes the buffered audio with word timestamps. Words that agree with
+    the previous pass are committed and the audio behind them is dropped from the
+    buffer, so only the unstable tail gets decoded again.
+    """
+
+    def __init__(self, audio_model, max_buffer_seconds=15, sample_rate=SAMPLE_RATE, **transcribe_kwargs):
+        self.audio_model = audio_model
+        self.sample_rate = sample_rate
+        self.max_buffer_samples = int(max_buffer_seconds * sample_rate)
+        self.transcribe_kwargs = transcribe_kwargs
+        # Audio of the current phrase that has not been committed yet. Room for one
+        # more full window so a long chunk never forces an early trim.
+        self.window = AudioWindow(2 * self.max_buffer_samples)
+        self.reset()
+
+    @property
+    def buffer(self):
+        return self.window.audio
+
+    def reset(self):
+        self.window.clear()
+        # Seconds of phrase audio already dropped from the front of the buffer.
+        self.buffer_offset = 0.0
+        # Words are (start, end, text) tuples in phrase time.
+        self.committed = []
+        self.hypothesis = []
+
+    def insert_audio(self, audio):
+        """
+        Appends float32 samples to the phrase buffer.
+        """
+        audio = audio[-self.window.capacity:]
+        # Keep phrase time right if the window has to drop audio to make room.
+        overflow = len(self.window) + len(audio) - self.window.capacity
+        if overflow > 0:
+            self._trim(self.buffer_offset + overflow / self.sample_rate)
+        self.window.append(audio)
+
+    def process(self):
+        """
+        Decodes the buffered tail and commits the words that are stable across passes.
+        Returns the current partial text of the phrase.
+        """
+        if not len(self.buffer):
+            return self.text
+
+        prompt = "".join(word for _, _, word in self.committed[-50:]).strip()
+        segments, _ = self.audio_model.transcribe(
+            self.buffer,
+            initial_prompt=prompt or None,
+            word_timestamps=True,
+            **self.transcribe_kwargs,
+        )
+
+        last_end = self.committed[-1][1] if self.committed else 0.0
+        words = []
+        for segment in segments:
+            for word in segment.words or []:
+                start = word.start + self.buffer_offset
+                end = word.end + self.buffer_offset
+                # Skip words that overlap audio we already committed.
+                if end <= last_end:
+                    continue
+                words.append((start, end, word.word))
+
+        # Local agreement: the common prefix of two consecutive passes is stable.
+        stable = []
+        for new, old in zip(words, self.hypothesis):
+            if _normalize(new[2]) != _normalize(old[2]):
+                break
+            stable.append(new)
+        self.committed.extend(stable)
+        self.hypothesis = words[len(stable):]
+        if stable:
+            self._trim(stable[-1][1])
+
+        # Keep the window bounded even if the tail never stabilizes.
+        if len(self.buffer) > self.max_buffer_samples:
+            if self.hypothesis:
+                self.committed.extend(self.hypothesis)
+                self._trim(self.hypothesis[-1][1])
+                self.hypothesis = []
+            if len(self.buffer) > self.max_buffer_samples:
+                self._trim(self.buffer_offset + (len(self.buffer) - self.max_buffer_samples) / self.sample_rate)
+
+        return self.text
+
+    def _trim(self, until):
+        """
+        Drops buffered audio up to `until` seconds of phrase time.
+        """
+        cut = int(round((until - self.buffer_offset) * self.sample_rate))
+        if cut <= 0:
+            return
+        self.window.drop(cut)
+        self.buffer_offset = until
+
+    @property
+    def text(self):
+        return "".join(word for _, _, word in self.committed + self.hypothesis).strip()
+
+    def finish(self):
+        """
+        Closes the current phrase and returns its full text.
+        """
+        text = self.text
+        self.reset()
+        return text
@@ -0,0 +1,130 @@
+import numpy as np
+
+SAMPLE_RATE = 16000
+
+class VAD():
+    """
+    Base voice activity detector.
+
+    Subclasses only decide which frames contain speech (`is_speech`). This class runs
+    the endpointing state machine over those frames, records speech start / end
+    events and trims the silence around the speech before it is decoded.
+    """
+
+    def __init__(self, frame_ms=30, min_speech_ms=90, min_silence_ms=300, pad_ms=150, sample_rate=SAMPLE_RATE):
+        self.sample_rate = sample_rate
+        self.frame_size = int(sample_rate * frame_ms / 1000)
+        self.min_speech_frames = max(1, round(min_speech_ms / frame_ms))
+        self.min_silence_frames = max(1, round(min_silence_ms / frame_ms))
+        self.pad = int(sample_rate * pad_ms / 1000)
+        self.reset()
+
+    def reset(self):
+        self.in_speech = False
+        self.speech_run = 0
+        self.silence_run = 0
+        # Samples seen since the detector was created or reset.
+        self.position = 0
+        # ("start" | "end", seconds) events in stream time.
+        self.events = []
+
+    def frames(self, audio):
+        """
+        Splits audio into a (n_frames, frame_size) view, dropping the incomplete last frame.
+        """
+        n_frames = len(audio) // self.frame_size
+        return audio[:n_frames * self.frame_size].reshape(n_frames, self.frame_size)
+
+    def is_speech(self, audio):
+        """
+        Returns a boolean array with one entry per frame of `audio`.
+        """
+        raise NotImplementedError
+
+    def process(self, audio):
+        """
+        Runs the detector on a new chunk of float32 audio.
+
+        :return: (speech, turn_ended) where speech is the chunk trimmed to its voiced
+                 part (empty if there is none) and turn_ended is True when enough
+                 silence followed the speech to end the user's turn.
+        """
+        flags = self.is_speech(audio)
+        turn_ended = False
+        for index, flag in enumerate(flags):
+            if not self.in_speech:
+                self.speech_run = self.speech_run + 1 if flag else 0
+                if self.speech_run >= self.min_speech_frames:
+                    self.in_speech = True
+                    self.silence_run = 0
+                    self._event("start", index - self.speech_run + 1)
+            else:
+                self.silence_run = 0 if flag else self.silence_run + 1
+                if self.silence_run >= self.min_silence_frames:
+                    self.in_speech = False
+                    self.speech_run = 0
+                    self._event("end", index - self.silence_run + 1)
+                    turn_ended = True
+        self.position += len(audio)
+
+        voiced = np.flatnonzero(flags)
+        if not len(voiced):
+            return audio[:0], turn_ended
+        start = max(0, voiced[0] * self.frame_size - self.pad)
+        end = min(len(audio), (voiced[-1] + 1) * self.frame_size + self.pad)
+        return audio[start:end], turn_ended
+
+    def _event(self, kind, frame):
+        self.events.append((kind, (self.position + frame * self.frame_size) / self.sample_rate))
+
+class EnergyVAD(VAD):
+    """
+    Frame energy / zero-crossing detector computed with vectorized NumPy.
+
+    A frame is speech when its RMS is above the threshold and its zero-crossing rate
+    is low enough not to be broadband noise. Very loud frames count as speech
+    regardless of the zero-crossing rate (fricatives).
+    """
+
+    def __init__(self, energy_threshold=1000, zcr_threshold=0.25, **kwargs):
+        super().__init__(**kwargs)
+        # Same scale as SpeechRecognition's energy_threshold (16 bit RMS).
+        self.energy_threshold = energy_threshold / 32768.0
+        self.zcr_threshold = zcr_threshold
+
+    def is_speech(self, audio):
+        frames = self.frames(audio)
+        if not len(frames):
+            return np.zeros(0, dtype=bool)
+        rms = np.sqrt(np.mean(np.square(frames, dtype=np.float32), axis=1))
+        signs = np.signbit(frames)
+        zcr = np.count_nonzero(signs[:, 1:] != signs[:, :-1], axis=1) / frames.shape[1]
+        loud = rms >= self.energy_threshold
+        return (loud & (zcr < self.zcr_threshold)) | (rms >= 3 * self.energy_threshold)
+
+class SileroVAD(VAD):
+    """
+    Model based detector using the Silero model bundled with faster-whisper.
+    """
+
+    def __init__(self, threshold=0.5, **kwargs):
+        super().__init__(**kwargs)
+        from faster_whisper.vad import VadOptions, get_speech_timestamps
+        self.get_speech_timestamps = get_speech_timestamps
+        self.options = VadOptions(threshold=threshold, min_silence_duration_ms=0, speech_pad_ms=0)
+
+    def is_speech(self, audio):
+        flags = np.zeros(len(audio) // self.frame_size, dtype=bool)
+        for speech in self.get_speech_timestamps(audio, self.options):
+            flags[speech["start"] // self.frame_size:-(-speech["end"] // self.frame_size)] = True
+        return flags
+
+def get_vad(name, energy_threshold=1000, min_silence_ms=300):
+    """
+    Builds the detector selected with --vad, or None when it is disabled.
+    """
+    if name == "energy":
+        return EnergyVAD(energy_threshold=energy_threshold, min_silence_ms=min_silence_ms)
+    if name == "silero":
+        return SileroVAD(min_silence_ms=min_silence_ms)
+    return None
@@ -0,0 +1,53 @@
+import re
+from fuzzywuzzy import fuzz
+
+from speechToText.utils.ring_buffer import AudioWindow
+
+SAMPLE_RATE = 16000
+
+def _normalize(text):
+    return re.sub(r"[^\w ]", "", text.lower()).strip()
+
+class WakeWordSpotter():
+    """
+    Cheap trigger detector that runs while the assistant is idle.
+
+    Only the last few seconds of voiced audio are decoded, greedily, without
+    timestamps and with a small token budget, and the text is fuzzy matched
+    against the trigger phrase. The full quality decode starts once it fires.
+    """
+
+    def __init__(self, audio_model, trigger, threshold=70, window_seconds=2.0, sample_rate=SAMPLE_RATE):
+        self.audio_model = audio_model
+        self.trigger = _normalize(trigger)
+        self.threshold = threshold
+        self.window_size = int(window_seconds * sample_rate)
+        self.window = AudioWindow(2 * self.window_size)
+        # Enough tokens for the trigger phrase plus a few words around it.
+        self.max_new_tokens = 4 * len(self.trigger.split()) + 8
+        self.reset()
+
+    def reset(self):
+        self.window.clear()
+
+    def detect(self, audio):
+        """
+        Adds float32 audio to the window and returns True if the trigger was heard.
+        """
+        self.window.append(audio)
+        self.window.keep_last(self.window_size)
+        segments, _ = self.audio_model.transcribe(
+            self.window.audio,
+            beam_size=1,
+            temperature=0,
+            without_timestamps=True,
+            condition_on_previous_text=False,
+            max_new_tokens=self.max_new_tokens,
+        )
+        text = _normalize("".join(segment.text for segment in segments))
+        # partial_ratio would score any short fragment of the trigger as a match.
+        score = fuzz.partial_ratio(self.trigger, text) if len(text) >= len(self.trigger) else fuzz.ratio(self.trigger, text)
+        if score >= self.threshold:
+            self.reset()
+            return True
+        return False
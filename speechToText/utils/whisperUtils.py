@@ -1,10 +1,33 @@
 from argparse import ArgumentParser
 from sys import platform
+from time import perf_counter
+import numpy as np
+from faster_whisper import WhisperModel
+
+MODELS = ["tiny", "base", "small", "medium", "large", "large-v2", "large-v3"]
+
+def add_model_arguments(parser):
+    """
+    Adds the Whisper model options shared by the live loop and the offline tools.
+    """
+    parser.add_argument("--model", default="tiny", help="Model to use",
+                        choices=MODELS)
+    parser.add_argument("--device", default="cpu", choices=["auto", "cpu", "cuda"],
+                        help="Device the model runs on.")
+    parser.add_argument("--compute_type", default="int8",
+                        choices=["default", "int8", "int8_float32", "int8_float16", "float16", "float32"],
+                        help="Quantization used by CTranslate2 for the model weights.")
+    parser.add_argument("--cpu_threads", default=0,
+                        help="Threads used per decode on CPU (0 lets CTranslate2 decide).", type=int)
+    parser.add_argument("--num_workers", default=1,
+                        help="Decodes that can run in parallel on the same model.", type=int)
+    parser.add_argument("--beam_size", default=5,
+                        help="Beam size used when decoding, 1 is greedy and fastest.", type=int)
+    return parser
 
 def get_parser():
     parser = ArgumentParser()
-    parser.add_argument("--model", default="medium", help="Model to use",
-                        choices=["tiny", "base", "small", "medium", "large"])
+    add_model_arguments(parser)
     parser.add_argument("--non_english", action='store_true',
                         help="Don't use the english model.")
     parser.add_argument("--energy_threshold", default=1000,
@@ -14,13 +37,55 @@ def get_parser():
     parser.add_argument("--phrase_timeout", default=10,
                         help="How much empty space between recordings before we "
                              "consider it a new line in the transcription.", type=float)
+    parser.add_argument("--ring_seconds", default=30,
+                        help="Seconds of audio the preallocated recording buffer can hold.", type=float)
+    parser.add_argument("--vad", default="energy", choices=["none", "energy", "silero"],
+                        help="Voice activity detector used to trim silence and end turns.")
+    parser.add_argument("--vad_silence_ms", default=300,
+                        help="Milliseconds of silence after speech that end the user's turn.", type=int)
+    parser.add_argument("--wake_word", default="whisper", choices=["none", "whisper"],
+                        help="Run only a cheap trigger detector while idle instead of the full decode.")
+    parser.add_argument("--wake_model", default="tiny",
+                        help="Whisper model used by the trigger detector.",
+                        choices=MODELS)
+    parser.add_argument("--wake_threshold", default=70,
+                        help="Fuzzy match score (0-100) needed to fire the trigger.", type=int)
+    parser.add_argument("--speculate_ms", default=400,
+                        help="Milliseconds the partial prompt must stay unchanged before the "
+                             "agent is started speculatively (needs a Speculate callback).", type=int)
+    parser.add_argument("--streaming", action='store_true',
+                        help="Re-decode only the unstable tail of the current phrase "
+                             "and print partial results while the user is speaking.")
+    parser.add_argument("--max_buffer", default=15,
+                        help="Max seconds of phrase audio kept in the streaming window.", type=float)
     if 'linux' in platform:
         parser.add_argument("--default_microphone", default='pulse',
                             help="Default microphone name for SpeechRecognition. "
                                  "Run this with 'list' to view available Microphones.", type=str)
     return parser
 
-def load_model(model):
-    pass 
-    #return WhisperModel(model)
-    #return WhisperModel(model, device="cuda", compute_type="int8")
+def load_model(model, device="cpu", compute_type="int8", cpu_threads=0, num_workers=1, beam_size=5, warm_up=True):
+    """
+    Loads the Whisper model and optionally runs a warm-up decode so the first
+    utterance does not pay for the lazy initialization of the model.
+    """
+    start = perf_counter()
+    audio_model = WhisperModel(model, device=device, compute_type=compute_type,
+                               cpu_threads=cpu_threads, num_workers=num_workers)
+    print(f"Model {model} ({device}, {compute_type}) loaded in {perf_counter() - start:.2f}s")
+    if warm_up:
+        start = perf_counter()
+        warm_up_model(audio_model, beam_size=beam_size)
+        print(f"Model warm-up took {perf_counter() - start:.2f}s")
+    return audio_model
+
+def load_model_from_args(args, warm_up=True):
+    return load_model(args.model, device=args.device, compute_type=args.compute_type,
+                      cpu_threads=args.cpu_threads, num_workers=args.num_workers,
+                      beam_size=args.beam_size, warm_up=warm_up)
+
+def warm_up_model(audio_model, beam_size=5, seconds=1.0, sample_rate=16000):
+    # Low level noise instead of zeros so the decoder actually runs.
+    audio = np.random.default_rng(0).normal(0, 0.01, int(seconds * sample_rate)).astype(np.float32)
+    segments, _ = audio_model.transcribe(audio, beam_size=beam_size)
+    list(segments)
@@ -1,40 +1,58 @@
 import speech_recognition as sr
 import numpy as np
-from datetime import datetime, timedelta
-from queue import Queue
 from tempfile import NamedTemporaryFile
-from time import sleep
+from time import monotonic
 import torch
 import argparse
-from faster_whisper import WhisperModel
 import os
 os.environ["KMP_DUPLICATE_LIB_OK"]="TRUE"
 
 from fuzzywuzzy import fuzz
 
 from speechToText.utils.microphone_setup import setup_microphone
-from speechToText.utils.whisperUtils import load_model, get_parser
+from speechToText.utils.audio_processing import transcribe
+from speechToText.utils.whisperUtils import load_model, load_model_from_args, get_parser
+from speechToText.utils.streaming import StreamingTranscriber
+from speechToText.utils.audio_queue import AudioQueue
+from speechToText.utils.vad import get_vad
+from speechToText.utils.wake_word import WakeWordSpotter
+
+# Upper bound for a single blocking wait so KeyboardInterrupt is still handled on every platform.
+MAX_WAIT = 1.0
 
 class SpeechToText():
-  def __init__(self,Action, trigger, debug=True):
+  def __init__(self,Action, trigger, debug=True, args=None, audio_model=None, microphone=True, Speculate=None):
+    """
+    Action: Callback that receives the prompt once the user finished speaking.
+    Speculate: Optional callback that receives the partial prompt once it has been stable
+      for --speculate_ms, so the agent can start before the user finishes (see
+      agent.speculative.SpeculativeRunner). Action still receives the final prompt.
+    trigger: Phrase that activates the assistant.
+    args / audio_model: Parsed get_parser() arguments and an already loaded model, both
+      default to the command line. microphone=False skips the microphone so audio can be
+      fed through data_queue (offline tools and benchmarks).
+    """
     self.Action = Action
+    self.Speculate = Speculate
     self.trigger = trigger 
     self.debug = debug
     #Loading Arguments 
     self.parser = get_parser()
-    self.args = self.parser.parse_args()
-    
-    #Getting the microphone using setup_microphone 
-    self.source = setup_microphone(self.args)
+    self.args = args if args is not None else self.parser.parse_args()
+    self.microphone = microphone
 
-    # If there is no source not doing anything
-    if not self.source:
-      return
+    if self.microphone:
+      #Getting the microphone using setup_microphone 
+      self.source = setup_microphone(self.args)
+
+      # If there is no source not doing anything
+      if not self.source:
+        return
     
-    # The last time a recording was retrieved from the queue.
+    # The last time (monotonic seconds) a recording was retrieved from the queue.
     self.phrase_time = None
-    # Thread safe Queue for passing data from the threaded recording callback.
-    self.data_queue = Queue()
+    # Thread safe queue for passing data from the threaded recording callback.
+    self.data_queue = AudioQueue(seconds=self.args.ring_seconds)
     # We use SpeechRecognizer to record our audio because it has a nice feature where it can detect when speech ends.
     self.recorder = sr.Recognizer()
     self.recorder.energy_threshold = self.args.energy_threshold
@@ -42,20 +60,43 @@ class SpeechToText():
     self.recorder.dynamic_energy_threshold = False
 
     # Load / Download model using load_model function
-    self.audio_model = WhisperModel("tiny")
+    self.audio_model = audio_model if audio_model is not None else load_model_from_args(self.args)
+    self.beam_size = self.args.beam_size
     self.temp_file = NamedTemporaryFile().name
 
+    # While idle only the trigger detector runs, the full decode starts once it fires.
+    self.spotter = None
+    if self.args.wake_word == "whisper":
+      wake_model = self.audio_model
+      if self.args.wake_model != self.args.model:
+        wake_model = load_model(self.args.wake_model, device=self.args.device, compute_type=self.args.compute_type,
+                                cpu_threads=self.args.cpu_threads, beam_size=1)
+      self.spotter = WakeWordSpotter(wake_model, trigger, threshold=self.args.wake_threshold)
+
     self.record_timeout = self.args.record_timeout
     self.phrase_timeout = self.args.phrase_timeout
 
     self.transcription = ['']
 
-    with self.source:
-      self.recorder.adjust_for_ambient_noise(self.source)
+    # Voice activity detection trims silence before decoding and ends turns without waiting for phrase_timeout.
+    self.vad = get_vad(self.args.vad, energy_threshold=self.args.energy_threshold, min_silence_ms=self.args.vad_silence_ms)
+    if self.vad:
+      # Let the recorder hand over the chunk as soon as the detector could end the turn.
+      self.recorder.pause_threshold = max(self.args.vad_silence_ms / 1000, 0.3)
+      self.recorder.non_speaking_duration = min(self.recorder.non_speaking_duration, self.recorder.pause_threshold)
+
+    # Streaming mode keeps the audio of the current phrase and only re-decodes its unstable tail.
+    self.streaming = self.args.streaming
+    if self.streaming:
+      self.streamer = StreamingTranscriber(self.audio_model, max_buffer_seconds=self.args.max_buffer, beam_size=self.beam_size)
+
+    if self.microphone:
+      with self.source:
+        self.recorder.adjust_for_ambient_noise(self.source)
 
-    # Create a background thread that will pass us raw audio bytes.
-    # We could do this manually but SpeechRecognizer provides a nice helper.
-    self.recorder.listen_in_background(self.source, self.record_callback, phrase_time_limit=self.record_timeout)
+      # Create a background thread that will pass us raw audio bytes.
+      # We could do this manually but SpeechRecognizer provides a nice helper.
+      self.recorder.listen_in_background(self.source, self.record_callback, phrase_time_limit=self.record_timeout)
     
     # Cue the user that we're ready to go.
     print("Model loaded.\n")
@@ -66,86 +107,143 @@ class SpeechToText():
     self.active = False
     self.prompt = ""
 
+    # Speculation: the partial prompt, when it last changed and the last one handed to Speculate.
+    self.speculate_after = self.args.speculate_ms / 1000
+    self.partial_prompt = ""
+    self.partial_time = None
+    self.speculated_prompt = None
+
   def record_callback(self,_, audio:sr.AudioData) -> None:
     """
     Threaded callback function to receive audio data when recordings finish.
     audio: An AudioData containing the recorded bytes.
     """
-    # Grab the raw bytes and push it into the thread safe queue.
+    # Grab the raw bytes and copy them into the thread safe ring buffer.
     data = audio.get_raw_data()
     self.data_queue.put(data)
 
+  def activate(self):
+    self.active = True
+    os.system('cls' if os.name=='nt' else 'clear')
+    self.transcription = [""]
+    print("escuchando")
+
   def ActionCaller(self):
     ratio = fuzz.ratio(self.trigger,self.transcription[-1])
     print(self.transcription[-1],ratio)
     if ratio > 50 and not self.active:
-      self.active = True
-      os.system('cls' if os.name=='nt' else 'clear')
-      self.transcription = [""]
-      print("escuchando")
+      self.activate()
     elif self.active:
-      prompt = ""
       print("hola: ",self.transcription)
-      for words in self.transcription:
-        prompt = prompt.join(" ")
-        prompt = prompt.join(words)
+      prompt = self.current_prompt()
+      self.partial_prompt, self.partial_time, self.speculated_prompt = "", None, None
       self.Action(prompt)
       self.active = False
       self.transcription = [""]
 
+  def current_prompt(self):
+    return " ".join(words.strip() for words in self.transcription if words.strip())
+
+  def speculate(self):
+    """
+    Hands the partial prompt to Speculate once it stopped changing for speculate_after seconds.
+    """
+    if not self.Speculate or not self.active:
+      return
+    prompt = self.current_prompt()
+    if prompt != self.partial_prompt:
+      self.partial_prompt, self.partial_time = prompt, monotonic()
+      return
+    if prompt and prompt != self.speculated_prompt and monotonic() - self.partial_time >= self.speculate_after:
+      self.speculated_prompt = prompt
+      self.Speculate(prompt)
+
+  def complete_phrase(self):
+    """
+    Closes the current phrase and hands it to the ActionCaller.
+    """
+    if self.streaming:
+      self.transcription[-1] = self.streamer.finish()
+    # Nothing was said after the trigger yet.
+    if self.active and not any(self.transcription):
+      return
+    self.ActionCaller()
+    if self.transcription[-1]:
+      self.transcription.append('')
+
+  def step(self, max_wait=MAX_WAIT):
+    """
+    Waits for the next audio (or the phrase timeout) and runs it through the pipeline.
+    """
+    # Block until new audio arrives or the phrase timeout expires.
+    timeout = max_wait
+    if self.phrase_time is not None:
+        timeout = min(timeout, max(0.0, self.phrase_time + self.phrase_timeout - monotonic()))
+    # Wake up when the partial prompt becomes stable enough to speculate on.
+    if self.Speculate and self.partial_time is not None and self.partial_prompt != self.speculated_prompt:
+        timeout = min(timeout, max(0.0, self.partial_time + self.speculate_after - monotonic()))
+    # Pending audio already converted to float32 in a reused buffer, no copies per chunk.
+    audio_np = self.data_queue.take(timeout=timeout)
+
+    if not len(audio_np):
+        # If enough time has passed without new recordings, consider the phrase complete.
+        if self.phrase_time is not None and monotonic() - self.phrase_time >= self.phrase_timeout:
+            self.phrase_time = None
+            self.complete_phrase()
+        else:
+            self.speculate()
+        return
+
+    turn_ended = False
+    if self.vad:
+        audio_np, turn_ended = self.vad.process(audio_np)
+
+    # This is the last time we received new (voiced) audio data from the queue.
+    if len(audio_np):
+        self.phrase_time = monotonic()
+
+    if not len(audio_np):
+        # Nothing but silence, there is nothing to decode.
+        pass
+    elif self.spotter and not self.active:
+        if self.spotter.detect(audio_np):
+            self.activate()
+            # The pause after the trigger must not close the (still empty) request.
+            turn_ended = False
+            self.phrase_time = None
+    elif self.streaming:
+        self.streamer.insert_audio(audio_np)
+        self.transcription[-1] = self.streamer.process()
+    else:
+        # Read the transcription.
+        text, segments, info = transcribe(self.audio_model, audio_np, beam_size=self.beam_size)
+        self.transcription[-1] = text
+
+    if self.debug:
+        print(self.transcription[-1], self.data_queue.stats())
+
+    # The detector heard the end of the turn, there is no need to wait for phrase_timeout.
+    if turn_ended:
+        self.phrase_time = None
+        self.complete_phrase()
+    else:
+        self.speculate()
+
+    # Flush stdout.
+    print('', end='', flush=True)
+
   def Loop(self):
     os.system('cls' if os.name=='nt' else 'clear')
     while True:
         try:
-            now = datetime.utcnow()
-            # Pull raw recorded audio from the queue.
-            if not self.data_queue.empty():
-                phrase_complete = False
-                # If enough time has passed between recordings, consider the phrase complete.
-                # Clear the current working audio buffer to start over with the new data.
-                if self.phrase_time and now - self.phrase_time > timedelta(seconds=self.phrase_timeout):
-                    phrase_complete = True
-                # This is the last time we received new audio data from the queue.
-                self.phrase_time = now
-                
-                # Combine audio data from queue
-                audio_data = b''.join(self.data_queue.queue)
-                self.data_queue.queue.clear()
-                
-                # Convert in-ram buffer to something the model can use directly without needing a temp file.
-                # Convert data from 16 bit wide integers to floating point with a width of 32 bits.
-                # Clamp the audio stream frequency to a PCM wavelength compatible default of 32768hz max.
-                audio_np = np.frombuffer(audio_data, dtype=np.int16).astype(np.float32) / 32768.0
-
-                # Read the transcription.
-                text = ""
-                segments, info = self.audio_model.transcribe(audio_np)
-                segments = list(segments) 
-                for segment in segments:
-                  text = text.join(segment.text)
-
-                # If we detected a pause between recordings, add a new item to our transcription.
-                # Otherwise edit the existing one.
-                if phrase_complete:
-                    self.transcription.append(text)
-                    self.ActionCaller()
-                else:
-                    self.transcription[-1] = text
-
-                # Clear the console to reprint the updated transcription.
-                #os.system('cls' if os.name=='nt' else 'clear')
-
-                # Flush stdout.
-                print('', end='', flush=True)
-            else:
-                # Infinite loops are bad for processors, must sleep.
-                sleep(0.25)
+            self.step()
         except KeyboardInterrupt:
             break
 
     print("\n\nTranscription:")
     for line in self.transcription:
         print(line)
+    print("\nAudio queue:", self.data_queue.stats())
 
 if __name__ == "__main__":
   def Action(prompt):
@@ -0,0 +1,40 @@
+import time
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, HumanMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+
+class StreamingChatModel(BaseChatModel):
+    """
+    Modelo falso que entrega la respuesta palabra a palabra, como Anthropic: si el pedido
+    menciona el clima, primero un texto y después el bloque tool_use.
+    """
+    word_delay: float = 0.05
+
+    @property
+    def _llm_type(self):
+        return "fake-streaming"
+
+    def bind_tools(self, tools, **kwargs):
+        return self.bind(tools=[tool.name for tool in tools], **kwargs)
+
+    def _message(self, messages):
+        last = messages[-1]
+        if isinstance(last, HumanMessage) and "clima" in last.content:
+            return AIMessage(content="Voy a mirar el clima ahora mismo. ",
+                             tool_calls=[{"name": "get_temperature", "args": {}, "id": "call_1"}])
+        return AIMessage(content="Primera oración de la respuesta. Segunda oración un poco más larga. Fin.")
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        return ChatResult(generations=[ChatGeneration(message=self._message(messages))])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        message = self._message(messages)
+        for word in message.content.split(" "):
+            time.sleep(self.word_delay)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=word + " "))
+        for index, call in enumerate(message.tool_calls):
+            yield ChatGenerationChunk(message=AIMessageChunk(content="", tool_call_chunks=[
+                {"name": call["name"], "args": "{}", "id": call["id"], "index": index}
+            ]))
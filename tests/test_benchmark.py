@@ -0,0 +1,18 @@
+from agent.benchmark import get_parser, run
+
+
+def bench(tmp_path, *extra):
+    return run(get_parser().parse_args(["--sessions", "2", "--turns", "2", "--llm_latency", "0", "--llm_jitter", "0", "--tool_latency", "0",
+                                        "--checkpoint_path", str(tmp_path / "bench.sqlite"),
+                                        "--output", str(tmp_path / "bench.jsonl"), *extra]))
+
+
+def test_threads_mode_goes_through_the_scheduler(tmp_path):
+    summary = bench(tmp_path, "--mode", "threads")
+    assert summary["turns"] == 4 and summary["failed_turns"] == 0
+    assert summary["queue_wait_p95"] is not None
+
+
+def test_summary_without_turns_prints(tmp_path):
+    summary = bench(tmp_path, "--turns", "0")
+    assert summary["turns"] == 0 and summary["turn_latency_p50"] is None
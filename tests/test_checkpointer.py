@@ -0,0 +1,48 @@
+import threading
+
+from langgraph.checkpoint.base import empty_checkpoint
+
+from agent.checkpointer import ThreadedSqliteSaver
+from agent.metrics import MetricsRegistry
+
+
+def saver(tmp_path, **kwargs):
+    return ThreadedSqliteSaver.from_conn_string(str(tmp_path / "checkpoints.sqlite"), metrics=MetricsRegistry(),
+                                                maintenance_interval=None, **kwargs)
+
+
+def put(checkpointer, thread_id, index):
+    checkpoint = {**empty_checkpoint(), "id": f"{index:06d}", "ts": f"2024-01-01T00:00:00.{index:06d}+00:00"}
+    checkpointer.put({"configurable": {"thread_id": thread_id}}, checkpoint, {"step": index})
+
+
+def count(checkpointer, thread_id):
+    return len(list(checkpointer.list({"configurable": {"thread_id": thread_id}})))
+
+
+def test_prune_keeps_the_last_checkpoints_of_touched_threads(tmp_path):
+    checkpointer = saver(tmp_path, keep_last=3)
+    for index in range(10):
+        put(checkpointer, "a", index)
+    assert checkpointer.prune() == 7
+    assert count(checkpointer, "a") == 3
+    assert checkpointer.prune() == 0
+    checkpointer.close()
+
+
+def test_threads_written_while_pruning_are_pruned_later(tmp_path):
+    checkpointer = saver(tmp_path, keep_last=2)
+    threads = [f"t{number}" for number in range(4)]
+
+    def write(thread_id):
+        for index in range(50):
+            put(checkpointer, thread_id, index)
+
+    writers = [threading.Thread(target=write, args=(thread_id,)) for thread_id in threads]
+    for writer in writers:
+        writer.start()
+    while any(writer.is_alive() for writer in writers):
+        checkpointer.prune()
+    checkpointer.prune()
+    assert [count(checkpointer, thread_id) for thread_id in threads] == [2] * len(threads)
+    checkpointer.close()
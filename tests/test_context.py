@@ -0,0 +1,66 @@
+import asyncio
+from time import perf_counter
+
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+from langchain_core.runnables import RunnableLambda
+
+from agent.agentHandler import AgentHandler
+from agent.context import ContextManager
+from agent.metrics import MetricsRegistry
+from tests.fakes import StreamingChatModel
+
+
+def turn(index, tool=False):
+    messages = [HumanMessage(f"pregunta {index}", id=f"h{index}")]
+    if tool:
+        messages += [AIMessage("", tool_calls=[{"name": "t", "args": {}, "id": f"c{index}"}], id=f"a{index}t"),
+                     ToolMessage("ok", tool_call_id=f"c{index}", id=f"t{index}")]
+    return messages + [AIMessage(f"respuesta {index}", id=f"a{index}")]
+
+
+def test_cut_points_are_turn_starts():
+    context = ContextManager(llm=None, keep_turns=2, max_tokens=0, fold_turns=2, metrics=MetricsRegistry())
+    messages = [message for index in range(4) for message in turn(index, tool=True)]
+    assert context.plan(messages) == 0
+    messages += turn(4) + turn(5)
+    cut = context.plan(messages)
+    assert isinstance(messages[cut], HumanMessage) and messages[cut].content == "pregunta 4"
+
+
+def test_token_budget_keeps_the_last_turn_whole():
+    context = ContextManager(llm=None, keep_turns=6, max_tokens=1, metrics=MetricsRegistry())
+    messages = turn(0) + turn(1, tool=True)
+    assert messages[context.plan(messages)].content == "pregunta 1"
+
+
+def slow_summary(seconds):
+    async def summarize(messages):
+        await asyncio.sleep(seconds)
+        return AIMessage("el usuario hizo preguntas")
+    return RunnableLambda(lambda messages: AIMessage("el usuario hizo preguntas"), afunc=summarize)
+
+
+def test_aprompt_answers_before_the_summary(tmp_path):
+    agent = AgentHandler(api_key=None, tools=[], model_name="fake", thread_id="voz", metrics=MetricsRegistry(),
+                         llm=StreamingChatModel(word_delay=0), checkpoint_path=str(tmp_path / "checkpoints.sqlite"),
+                         keep_turns=1, max_context_tokens=1)
+    agent.context.llm = slow_summary(0.5)
+
+    async def run():
+        await agent.aprompt("hola robot", thread_id="a")
+        start = perf_counter()
+        await agent.aprompt("¿cómo estás hoy?", thread_id="a")
+        answered = perf_counter() - start
+        # El turno siguiente del hilo espera a que termine el resumen.
+        await agent.aprompt("¿y mañana?", thread_id="a")
+        waited = perf_counter() - start
+        await agent.asettle()
+        return answered, waited
+
+    answered, waited = asyncio.run(run())
+    assert answered < 0.3
+    assert waited >= 0.5
+    state = agent.graph.get_state(agent.get_config("a")).values
+    assert state["summary"] == "el usuario hizo preguntas"
+    assert state["messages"][0].content == "¿y mañana?"
+    agent.checkpointer.close()
@@ -0,0 +1,75 @@
+import asyncio
+import time
+
+from langchain_core.messages import AIMessage
+from langchain_core.tools import tool
+
+from agent.metrics import MetricsRegistry
+from agent.parallel_tools import TOOL_TIMEOUT_ERROR_TEMPLATE as TIMEOUT, ParallelToolNode
+
+
+@tool
+def hung(x: str) -> str:
+    """Herramienta colgada."""
+    time.sleep(2)
+    return "tarde"
+
+
+@tool
+def slow(x: str) -> str:
+    """Herramienta lenta."""
+    time.sleep(0.2)
+    return f"slow {x}"
+
+
+@tool
+def fast(x: str) -> str:
+    """Herramienta rápida."""
+    return f"fast {x}"
+
+
+@tool
+async def ahung(x: str) -> str:
+    """Herramienta async colgada."""
+    await asyncio.sleep(2)
+    return "tarde"
+
+
+def calls(*names):
+    return {"messages": [AIMessage(content="", tool_calls=[
+        {"name": name, "args": {"x": str(index)}, "id": f"call_{index}"} for index, name in enumerate(names)
+    ])]}
+
+
+def node(**kwargs):
+    return ParallelToolNode([hung, slow, fast, ahung], metrics=MetricsRegistry(), **kwargs)
+
+
+def test_results_keep_call_order_and_run_in_parallel():
+    start = time.perf_counter()
+    output = node(max_concurrency=4).invoke(calls("slow", "fast", "slow"))
+    assert [message.content for message in output["messages"]] == ["slow 0", "fast 1", "slow 2"]
+    assert [message.tool_call_id for message in output["messages"]] == ["call_0", "call_1", "call_2"]
+    assert time.perf_counter() - start < 0.35
+
+
+def test_queued_call_is_bounded_by_the_timeout():
+    start = time.perf_counter()
+    output = node(max_concurrency=1, timeout=0.3).invoke(calls("hung", "fast"))
+    assert time.perf_counter() - start < 1
+    assert all("did not answer within" in message.content for message in output["messages"])
+
+
+def test_async_queued_call_is_bounded_by_the_timeout():
+    start = time.perf_counter()
+    output = asyncio.run(node(max_concurrency=1, timeout=0.3).ainvoke(calls("ahung", "fast")))
+    assert time.perf_counter() - start < 1
+    assert "did not answer within" in output["messages"][0].content
+    # Cancelar la colgada libera el lugar justo cuando vence la espera de la otra: puede llegar a correr.
+    assert output["messages"][1].content in ("fast 1", TIMEOUT.format(requested_tool="fast", timeout=0.3))
+
+
+def test_call_with_a_free_worker_is_not_affected_by_a_hung_one():
+    output = node(max_concurrency=2, timeout=0.3).invoke(calls("hung", "fast"))
+    assert "did not answer within" in output["messages"][0].content
+    assert output["messages"][1].content == "fast 1"
@@ -0,0 +1,51 @@
+from types import SimpleNamespace
+
+from anthropic.types import (Message, MessageDeltaUsage, RawContentBlockDeltaEvent, RawMessageDeltaEvent,
+                             RawMessageStartEvent, TextDelta, Usage)
+from langchain_core.messages import HumanMessage, SystemMessage
+
+from agent.prompt_cache import CACHE_CONTROL, CachingChatAnthropic
+
+USAGE = Usage(input_tokens=12, output_tokens=0, cache_read_input_tokens=900, cache_creation_input_tokens=40)
+
+
+def events():
+    message = Message(id="msg_1", type="message", role="assistant", model="claude", content=[],
+                      stop_reason=None, stop_sequence=None, usage=USAGE)
+    return [
+        RawMessageStartEvent(type="message_start", message=message),
+        RawContentBlockDeltaEvent(type="content_block_delta", index=0, delta=TextDelta(type="text_delta", text="Hola.")),
+        RawMessageDeltaEvent(type="message_delta", delta={"stop_reason": "end_turn", "stop_sequence": None},
+                             usage=MessageDeltaUsage(output_tokens=3)),
+    ]
+
+
+def model():
+    llm = CachingChatAnthropic(model_name="claude", api_key="test")
+    # Cliente falso: la API contesta siempre con el mismo stream de eventos.
+    object.__setattr__(llm, "_client", SimpleNamespace(messages=SimpleNamespace(create=lambda **payload: iter(events()))))
+    return llm
+
+
+def test_payload_marks_the_stable_prefix():
+    payload = model()._get_request_payload([SystemMessage("personalidad"), SystemMessage("resumen"),
+                                            HumanMessage("hola")])
+    assert payload["system"][0]["cache_control"] == CACHE_CONTROL
+    assert "cache_control" not in payload["system"][1]
+    assert payload["messages"][-1]["content"][-1]["cache_control"] == CACHE_CONTROL
+
+
+def test_payload_without_cache_joins_the_system_messages():
+    llm = model()
+    llm.prompt_cache = False
+    payload = llm._get_request_payload([SystemMessage("personalidad"), SystemMessage("resumen"), HumanMessage("hola")])
+    assert payload["system"] == "personalidad\n\nresumen"
+    assert payload["messages"][-1]["content"] == "hola"
+
+
+def test_stream_reports_cache_usage():
+    chunks = list(model().stream([HumanMessage("hola")]))
+    message = sum(chunks[1:], chunks[0])
+    assert message.content == "Hola."
+    assert message.response_metadata["cache_read_input_tokens"] == 900
+    assert message.response_metadata["cache_creation_input_tokens"] == 40
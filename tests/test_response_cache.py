@@ -0,0 +1,89 @@
+import asyncio
+
+from langchain_core.messages import HumanMessage
+
+from agent.agentHandler import AgentHandler
+from agent.metrics import MetricsRegistry
+from agent.response_cache import ResponseCache
+from tests.fakes import StreamingChatModel
+
+
+class CountingModel(StreamingChatModel):
+    calls: int = 0
+
+    def _message(self, messages):
+        self.calls += 1
+        return super()._message(messages)
+
+
+def make_agent(tmp_path):
+    metrics = MetricsRegistry()
+    agent = AgentHandler(api_key=None, tools=[], model_name="fake", thread_id="voz", metrics=metrics,
+                         llm=CountingModel(word_delay=0), checkpoint_path=str(tmp_path / "checkpoints.sqlite"),
+                         response_cache=ResponseCache(metrics=metrics))
+    agent.speak = lambda text: None
+    return agent
+
+
+def cache_results(agent, result):
+    return agent.metrics.get("agent_response_cache_total", result=result)
+
+
+def test_lookup_hits_equivalent_questions_and_ignores_short_ones():
+    cache = ResponseCache(metrics=MetricsRegistry())
+    assert cache.store("¿Cuál es la capital de Francia?", "París.")
+    assert cache.lookup("cual es la capital de francia") == "París."
+    assert cache.lookup("¿Cuál es la capital de Alemania?") is None
+    assert not cache.store("¿y mañana?", "Nublado.")
+
+
+def test_answers_that_used_changing_tools_are_not_stored():
+    cache = ResponseCache(metrics=MetricsRegistry(), cacheable_tools=["get_time_zone"])
+    assert not cache.store("¿qué temperatura hace hoy?", "20 grados.", ["get_temperature"])
+    assert cache.store("¿en qué zona horaria estamos?", "UTC-3.", ["get_time_zone"])
+    assert len(cache) == 1
+
+
+def test_fresh_thread_uses_the_cache(tmp_path):
+    agent = make_agent(tmp_path)
+    agent.response("¿quién eres tú robot?")
+    agent.config = agent.get_config("otro")
+    agent.response("¿quién eres tú robot?")
+    assert agent.llm.calls == 1
+    assert cache_results(agent, "hit") == 1
+    agent.checkpointer.close()
+
+
+def test_thread_with_history_skips_the_cache_on_lookup(tmp_path):
+    agent = make_agent(tmp_path)
+    agent.response("¿quién eres tú robot?")
+    agent.config = agent.get_config("otro")
+    agent.response("hola me llamo Ana")
+    agent.response("¿quién eres tú robot?")
+    assert agent.llm.calls == 3
+    assert not cache_results(agent, "hit")
+    # Una vez al buscar y otra al no guardar la respuesta.
+    assert cache_results(agent, "skip_context") == 2
+    messages = agent.graph.get_state(agent.config).values["messages"]
+    assert [message.content for message in messages if isinstance(message, HumanMessage)] == [
+        "hola me llamo Ana", "¿quién eres tú robot?"]
+    agent.checkpointer.close()
+
+
+def test_async_lookup_skips_threads_with_history(tmp_path):
+    agent = make_agent(tmp_path)
+
+    async def run():
+        await agent.aprompt("¿quién eres tú robot?", thread_id="a")
+        await agent.asettle()
+        await agent.aprompt("hola me llamo Ana", thread_id="b")
+        await agent.aprompt("¿quién eres tú robot?", thread_id="b")
+        await agent.asettle()
+        await agent.aprompt("¿quién eres tú robot?", thread_id="c")
+        await agent.asettle()
+
+    asyncio.run(run())
+    assert agent.llm.calls == 3
+    assert cache_results(agent, "hit") == 1
+    assert cache_results(agent, "skip_context") >= 1
+    agent.checkpointer.close()
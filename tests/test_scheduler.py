@@ -0,0 +1,96 @@
+import asyncio
+import threading
+
+import pytest
+
+from agent.metrics import MetricsRegistry
+from agent.scheduler import TurnScheduler
+
+
+def scheduler(max_concurrency=1, aging=None):
+    return TurnScheduler(max_concurrency, aging=aging, metrics=MetricsRegistry())
+
+
+def test_same_thread_turns_run_one_at_a_time_in_arrival_order():
+    turns = scheduler(max_concurrency=4)
+    log = []
+
+    async def turn(name):
+        async with turns.slot("hilo"):
+            log.append(f"{name} start")
+            await asyncio.sleep(0.01)
+            log.append(f"{name} end")
+
+    async def run():
+        await asyncio.gather(*(turn(name) for name in "abc"))
+
+    asyncio.run(run())
+    assert log == ["a start", "a end", "b start", "b end", "c start", "c end"]
+
+
+def test_voice_passes_before_web_when_a_slot_frees():
+    turns = scheduler()
+    order = []
+
+    async def turn(thread_id, priority):
+        async with turns.slot(thread_id, priority):
+            order.append(thread_id)
+            await asyncio.sleep(0.01)
+
+    async def run():
+        first = asyncio.create_task(turn("primero", "web"))
+        await asyncio.sleep(0)
+        await asyncio.gather(first, turn("web", "web"), turn("batch", "batch"), turn("voz", "voice"))
+
+    asyncio.run(run())
+    assert order == ["primero", "voz", "web", "batch"]
+
+
+def test_cancelled_waiter_gives_its_place_back():
+    turns = scheduler()
+
+    async def run():
+        async with turns.slot("a"):
+            waiter = asyncio.create_task(turns.slot("b").__aenter__())
+            await asyncio.sleep(0.01)
+            waiter.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await waiter
+        async with turns.slot("c"):
+            return set(turns.running)
+
+    assert asyncio.run(run()) == {"c"}
+    assert turns.waiting == [] and turns.running == set()
+
+
+def test_sync_and_async_turns_share_the_thread():
+    turns = scheduler(max_concurrency=4)
+    log = []
+    holding = threading.Event()
+    release = threading.Event()
+
+    def voice():
+        with turns.sync_slot("hilo"):
+            log.append("voz")
+            holding.set()
+            release.wait()
+            log.append("voz fin")
+
+    thread = threading.Thread(target=voice)
+    thread.start()
+    holding.wait()
+
+    async def web():
+        threading.Timer(0.05, release.set).start()
+        async with turns.slot("hilo"):
+            log.append("web")
+
+    asyncio.run(web())
+    thread.join()
+    assert log == ["voz", "voz fin", "web"]
+
+
+def test_unknown_priority_is_rejected():
+    with pytest.raises(ValueError):
+        with scheduler().sync_slot("hilo", "urgente"):
+            pass
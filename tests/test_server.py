@@ -0,0 +1,54 @@
+import asyncio
+
+from aiohttp.test_utils import TestClient, TestServer
+
+from agent.agentHandler import AgentHandler
+from agent.metrics import MetricsRegistry
+from agent.server import AgentServer
+from tests.fakes import StreamingChatModel
+
+
+def serve(tmp_path, scenario):
+    agent = AgentHandler(api_key=None, tools=[], model_name="fake", thread_id="voz", metrics=MetricsRegistry(),
+                         llm=StreamingChatModel(word_delay=0), checkpoint_path=str(tmp_path / "checkpoints.sqlite"))
+
+    async def run():
+        async with TestClient(TestServer(AgentServer(agent).app())) as client:
+            return await scenario(client, agent)
+
+    return asyncio.run(run())
+
+
+def test_requests_without_thread_get_their_own(tmp_path):
+    async def scenario(client, agent):
+        replies = []
+        for _ in range(2):
+            response = await client.post("/chat", json={"message": "hola robot", "stream": False})
+            assert response.status == 200
+            replies.append(await response.json())
+        return replies, agent.graph.get_state(agent.config).values
+
+    replies, default_thread = serve(tmp_path, scenario)
+    assert replies[0]["thread_id"] != replies[1]["thread_id"]
+    assert "voz" not in {reply["thread_id"] for reply in replies}
+    assert not default_thread.get("messages")
+
+
+def test_thread_id_comes_back_in_the_done_event(tmp_path):
+    async def scenario(client, agent):
+        response = await client.post("/chat", json={"message": "hola robot"}, headers={"X-Thread-Id": "web-1"})
+        return await response.text()
+
+    body = serve(tmp_path, scenario)
+    assert "event: token" in body
+    assert 'event: done' in body and '"thread_id": "web-1"' in body
+
+
+def test_invalid_requests_are_rejected(tmp_path):
+    async def scenario(client, agent):
+        statuses = []
+        for body in ({"message": "hola", "stream": "false"}, {"message": " "}, {"message": "hola", "priority": "vip"}):
+            statuses.append((await client.post("/chat", json=body)).status)
+        return statuses
+
+    assert serve(tmp_path, scenario) == [400, 400, 400]
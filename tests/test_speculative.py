@@ -0,0 +1,47 @@
+from langchain_core.messages import HumanMessage
+
+from agent.agentHandler import AgentHandler
+from agent.metrics import MetricsRegistry
+from agent.response_cache import ResponseCache
+from agent.speculative import SpeculativeRunner
+from tests.fakes import StreamingChatModel
+
+
+def make_agent(tmp_path):
+    metrics = MetricsRegistry()
+    agent = AgentHandler(api_key=None, tools=[], model_name="fake", thread_id="voz", metrics=metrics,
+                         llm=StreamingChatModel(word_delay=0), checkpoint_path=str(tmp_path / "checkpoints.sqlite"),
+                         response_cache=ResponseCache(metrics=metrics))
+    spoken = []
+    agent.speak = spoken.append
+    return agent, spoken
+
+
+def questions(agent):
+    messages = agent.graph.get_state(agent.config).values["messages"]
+    return [message.content for message in messages if isinstance(message, HumanMessage)]
+
+
+def test_hit_speaks_by_sentence_commits_and_caches(tmp_path):
+    agent, spoken = make_agent(tmp_path)
+    runner = SpeculativeRunner(agent)
+    runner.start("¿quién eres tú robot?")
+    runner.finish("quién eres tú robot")
+    assert runner.stats == {"started": 1, "hits": 1, "misses": 0}
+    assert spoken == ["Primera oración de la respuesta.", "Segunda oración un poco más larga.", "Fin."]
+    assert questions(agent) == ["¿quién eres tú robot?"]
+    assert len(agent.response_cache) == 1
+    agent.checkpointer.close()
+
+
+def test_turn_written_after_the_fork_discards_the_speculation(tmp_path):
+    agent, spoken = make_agent(tmp_path)
+    runner = SpeculativeRunner(agent)
+    runner.start("¿qué hora es ahora?")
+    runner.run.forked.wait()
+    # Otro cliente escribe en el mismo hilo antes de la transcripción final.
+    agent.response("hola desde la web")
+    runner.finish("¿qué hora es ahora?")
+    assert runner.stats["misses"] == 1
+    assert questions(agent) == ["hola desde la web", "¿qué hora es ahora?"]
+    agent.checkpointer.close()
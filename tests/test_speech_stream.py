@@ -0,0 +1,88 @@
+from time import perf_counter
+
+from langchain_core.tools import tool
+
+from agent.agentHandler import AgentHandler
+from agent.metrics import MetricsRegistry
+from agent.speech_stream import SentenceChunker, SpeechStream
+from tests.fakes import StreamingChatModel
+
+
+@tool
+def get_temperature() -> str:
+    """Temperatura actual."""
+    return "20 grados"
+
+
+@tool
+def say_joke() -> str:
+    """Cuenta un chiste."""
+    return "chiste"
+
+
+def make_agent():
+    agent = AgentHandler(api_key=None, tools=[get_temperature, say_joke], model_name="fake", thread_id="t",
+                         memory=False, metrics=MetricsRegistry(), llm=StreamingChatModel(),
+                         tool_groups={"weather": {"tools": ["get_temperature"], "keywords": ["clima"]}})
+    spoken = []
+    start = perf_counter()
+    agent.speak = lambda text: spoken.append((perf_counter() - start, text))
+    return agent, spoken
+
+
+def test_chunker_splits_sentences_and_keeps_decimals():
+    chunker = SentenceChunker()
+    assert chunker.feed("Hace 3.5 grados. Y ") == ["Hace 3.5 grados."]
+    assert chunker.flush() == "Y"
+
+
+def test_live_message_is_spoken_as_it_streams():
+    spoken = []
+    stream = SpeechStream(spoken.append)
+    stream.begin(hold=False)
+    stream.token("Hola. Que ")
+    assert spoken == ["Hola."]
+    stream.end()
+    assert spoken == ["Hola.", "Que"]
+
+
+def test_held_message_is_dropped_on_tool_call_and_released_otherwise():
+    spoken = []
+    stream = SpeechStream(spoken.append)
+    stream.begin(hold=True)
+    stream.token("Voy a revisar. Un momento ")
+    stream.tool_call()
+    stream.end()
+    assert spoken == []
+    stream.begin(hold=True)
+    stream.token("Hoy hace sol. ")
+    assert spoken == []
+    stream.end()
+    assert spoken == ["Hoy hace sol."]
+
+
+def test_tool_call_in_live_message_drops_what_follows():
+    spoken = []
+    stream = SpeechStream(spoken.append)
+    stream.begin(hold=False)
+    stream.token("Claro. ")
+    stream.tool_call()
+    stream.token("resto ")
+    stream.end()
+    assert spoken == ["Claro."]
+
+
+def test_small_talk_first_sentence_arrives_before_generation_ends():
+    agent, spoken = make_agent()
+    agent.prompt("hola, ¿cómo estás?")
+    times = [elapsed for elapsed, _ in spoken]
+    assert [text for _, text in spoken] == ["Primera oración de la respuesta.", "Segunda oración un poco más larga.", "Fin."]
+    # Cinco palabras hasta la primera oración, doce en total (0.05 s cada una).
+    assert times[0] < 0.45
+    assert times[-1] - times[0] > 0.2
+
+
+def test_text_before_a_tool_call_is_not_spoken():
+    agent, spoken = make_agent()
+    agent.prompt("¿qué clima hace?")
+    assert [text for _, text in spoken] == ["Primera oración de la respuesta.", "Segunda oración un poco más larga.", "Fin."]
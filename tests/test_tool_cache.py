@@ -0,0 +1,89 @@
+import threading
+import time
+
+from agent.metrics import MetricsRegistry
+from agent.tool_cache import ToolResultCache, cached_tool, invalidates
+
+
+def test_equivalent_arguments_share_an_entry():
+    cache = ToolResultCache(metrics=MetricsRegistry())
+    calls = []
+
+    @cached_tool(ttl=60, cache=cache, round_floats=2)
+    def weather(latitude: float, longitude: float, units: str = "metric"):
+        calls.append((latitude, longitude))
+        return {"temperature": 20}
+
+    assert weather(-34.6037, -58.3816) == weather(longitude=-58.3801, latitude=-34.6012, units=" metric ")
+    assert len(calls) == 1
+    weather(-34.6037, -58.3816)["temperature"] = 99
+    assert weather(-34.6037, -58.3816) == {"temperature": 20}
+
+
+def test_entries_expire_and_errors_are_not_cached():
+    cache = ToolResultCache(metrics=MetricsRegistry())
+    calls = []
+
+    @cached_tool(ttl=0.05, cache=cache, cache_if=lambda value: not value.startswith("Error"))
+    def lookup(city: str):
+        calls.append(city)
+        return "Error: timeout" if len(calls) == 1 else f"ok {city}"
+
+    assert lookup("Lima") == "Error: timeout"
+    assert lookup("Lima") == "ok Lima"
+    assert lookup("Lima") == "ok Lima"
+    time.sleep(0.06)
+    lookup("Lima")
+    assert len(calls) == 3
+
+
+def test_concurrent_identical_calls_run_once():
+    cache = ToolResultCache(metrics=MetricsRegistry())
+    calls = []
+    start = threading.Barrier(5)
+
+    @cached_tool(ttl=60, cache=cache)
+    def slow(city: str):
+        calls.append(city)
+        time.sleep(0.1)
+        return f"ok {city}"
+
+    results = []
+
+    def worker():
+        start.wait()
+        results.append(slow("Quito"))
+
+    workers = [threading.Thread(target=worker) for _ in range(5)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    assert calls == ["Quito"] and results == ["ok Quito"] * 5
+    assert cache.stats()["slow"]["coalesced"] == 4
+
+
+def test_writes_invalidate_and_in_flight_reads_are_not_stored():
+    cache = ToolResultCache(metrics=MetricsRegistry())
+    tasks = ["comprar pan"]
+    reading = threading.Event()
+
+    @cached_tool(ttl=60, cache=cache)
+    def get_tasks():
+        value = list(tasks)
+        reading.set()
+        time.sleep(0.05)
+        return value
+
+    @invalidates("get_tasks", cache=cache)
+    def create_task(title: str):
+        tasks.append(title)
+
+    reader = threading.Thread(target=get_tasks)
+    reader.start()
+    reading.wait()
+    # Se escribe mientras la lectura anterior sigue en curso: su resultado ya es viejo.
+    create_task("llamar a Ana")
+    reader.join()
+    assert get_tasks() == ["comprar pan", "llamar a Ana"]
+    assert cache.stats()["get_tasks"]["invalidations"] == 1
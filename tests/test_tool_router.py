@@ -0,0 +1,42 @@
+from types import SimpleNamespace
+
+from langchain_core.messages import AIMessage, HumanMessage
+
+from agent.metrics import MetricsRegistry
+from agent.text import normalize_prompt, normalize_text
+from agent.tool_router import ToolRouter
+
+TOOLS = [SimpleNamespace(name=name) for name in ("get_temperature", "createTask", "send_message", "say_joke")]
+GROUPS = {
+    "weather": {"tools": ["get_temperature"], "keywords": ["clima", "llov*", "frio", "cold"]},
+    "tasks": {"tools": ["createTask"], "keywords": ["tarea*", "mi lista", "my list"]},
+    "gmail": {"tools": ["send_message"], "keywords": ["correo*", "send"]},
+}
+
+
+def router():
+    return ToolRouter(TOOLS, GROUPS, metrics=MetricsRegistry())
+
+
+def test_normalization_drops_case_punctuation_and_accents():
+    assert normalize_prompt("¿Qué  hora es?") == "qué hora es"
+    assert normalize_text("¿Está LLOVIENDO?") == " esta lloviendo "
+
+
+def test_keywords_match_whole_words_or_prefixes():
+    cases = {
+        "ya estoy listo": [], "hola, ¿cómo estás?": [], "me gusta coldplay": [], "escolar": [],
+        "¿va a llover mañana?": ["weather"], "¿hace frío?": ["weather"], "is it cold outside": ["weather"],
+        "agrega una tarea a mi lista": ["tasks"], "envíale un correo": ["gmail"],
+    }
+    for text, expected in cases.items():
+        assert router().groups_for([HumanMessage(text)]) == expected, text
+
+
+def test_follow_up_keeps_the_previous_groups_and_called_tools():
+    messages = [HumanMessage("¿qué clima hace?"),
+                AIMessage("", tool_calls=[{"name": "get_temperature", "args": {}, "id": "c1"}]),
+                HumanMessage("¿y mañana?")]
+    assert router().select(messages) == ("get_temperature", "say_joke")
+    assert router().select([HumanMessage("cuéntame algo"), HumanMessage("otro más"), HumanMessage("¿y mañana?")]) == ("say_joke",)
+    assert router().select(messages[1:2] + [HumanMessage("gracias")]) == ("get_temperature", "say_joke")
@@ -10,6 +10,8 @@ from nltk import flatten
 from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
 from utils.tasks import getCredentials
+from agent.tool_cache import cached_tool, invalidates
+from agent.registry import LazyResource
 
 from datetime import datetime, timezone
 
@@ -26,15 +28,17 @@ load_dotenv()
 
 tavily_api_key = os.getenv('TAVILY_API_KEY')
 
-search = TavilySearchResults(tavily_api_key=tavily_api_key)
+# Los clientes y las credenciales se crean en el primer uso: importar este módulo no abre el navegador ni la red.
+search = LazyResource("tavily search", lambda: TavilySearchResults(tavily_api_key=tavily_api_key))
 
-CREDS = getCredentials()
+CREDS = LazyResource("google tasks credentials", getCredentials)
 
 #GOOGLE TASK API
 from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
 
 @tool
+@cached_tool(ttl=60, cache_if=lambda result: "error" not in result)
 def getTaskInfo(lists=True, tasks=True):
     """
     A function that retrieves task information from Google Tasks and returns it as a JSON-like object.
@@ -46,7 +50,7 @@ def getTaskInfo(lists=True, tasks=True):
     task_data = {"taskLists": []}
 
     try:
-        service = build("tasks", "v1", credentials=CREDS)
+        service = build("tasks", "v1", credentials=CREDS.get())
 
         # Call the Tasks API to get the list of task lists
         results = service.tasklists().list(maxResults=10).execute()
@@ -85,6 +89,7 @@ def getTaskInfo(lists=True, tasks=True):
 
   
 @tool
+@invalidates("getTaskInfo")
 def createTask(tasklist_id,title,notes,due,parent_task_id=0,previous_task_id=0,status="needsAction",kind="tasks#task"):
   """
     Creates a new task in Google Tasks.
@@ -141,7 +146,7 @@ def createTask(tasklist_id,title,notes,due,parent_task_id=0,previous_task_id=0,s
 
   }
   try:
-    service = build("tasks", "v1", credentials=CREDS)
+    service = build("tasks", "v1", credentials=CREDS.get())
 
     # Call the Tasks API
     result = service.tasks().insert(
@@ -210,11 +215,36 @@ tools = [
 
 tools = flatten(tools)
 
+# Grupos para el ToolRouter del agente: cada grupo se enlaza al modelo solo en los turnos que
+# mencionan alguna de sus palabras (prefijos, sin tildes). El resto de las herramientas va siempre.
+tool_groups = {
+  # Palabras enteras; las que terminan en "*" se buscan como prefijo (ver agent/tool_router.py).
+  "weather": {
+    "tools": ["get_temperature", "get_apparent_temperature", "get_day_or_night", "get_full_weather_report", "get_precipitation",
+              "get_rain", "get_relative_humidity", "get_showers", "get_snowfall"],
+    "keywords": ["clima", "tiempo hace", "que tiempo", "temperatura*", "calor", "frio", "fria", "lluv*", "llov*", "llueve",
+                 "nieve", "nieva", "nevar*", "nevad*", "nevando", "humedad", "precipitacion*", "chubasco*", "aguacero*",
+                 "sensacion termica", "pronostico*", "es de dia", "es de noche",
+                 "weather", "temperature*", "hot", "cold", "rain", "rainy", "raining", "snow*", "shower", "showers",
+                 "humid", "humidity", "precipitation", "forecast*", "daytime", "night"],
+  },
+  "tasks": {
+    "tools": ["getTaskInfo", "createTask"],
+    "keywords": ["tarea*", "pendiente*", "recordatorio*", "recuerdame", "agenda*", "lista de", "mi lista", "la lista",
+                 "task*", "to do list", "todo list", "remind*", "my list", "the list", "list of"],
+  },
+  "gmail": {
+    "tools": [tool.name for tool in gmailToolkit],
+    "keywords": ["correo*", "mail*", "gmail", "email*", "mensaje*", "borrador*", "bandeja", "envia*", "envie", "hilo",
+                 "message*", "draft*", "inbox", "send", "thread"],
+  },
+}
+
 
 if __name__ == "__main__":   
     #print(tools)
     #postureNao("Crouch")
-    #print(search.invoke({"query": "What happened in the latest burning man floods"}))
+    #print(search.get().invoke({"query": "What happened in the latest burning man floods"}))
     print(getTaskInfo.invoke({}))
     """ print(createTask.invoke({
     "tasklist_id": "MTY4ODI3Mjk3NjgxNjMwOTI4OTE6MDow",